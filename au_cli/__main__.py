@@ -1,30 +1,44 @@
 """
 au_cli/__main__.py
 
-The AutoUmpire command line interface
+The AutoUmpire command line interface.
+
+Run with no arguments, this starts an interactive shell.
+Run with --batch, it instead runs the commands in a script (or stdin), one per line, without asking for confirmation.
+Run with --profile (or after the `profile on` command), it prints the number, time and slowest of the database queries
+run by each command.
 """
 
+# parse command line arguments first so that --help doesn't boot up au_core
+import argparse
+
+parser = argparse.ArgumentParser(prog="au_cli")
+parser.add_argument("-g", "--game", help="The name or id of the game to load.", type=str)
+parser.add_argument("-b", "--batch", metavar="FILE",
+                    help="Run the commands in FILE (or stdin, if FILE is -), one per line, then exit. "
+                         "Every confirmation is answered Y, and the commands are committed together at the end. "
+                         "Stops at the first command that fails.",
+                    type=str)
+parser.add_argument("-n", "--commit-every", metavar="N",
+                    help="In batch mode, commit after every N commands rather than only at the end.",
+                    type=int)
+parser.add_argument("-p", "--profile", action="store_true",
+                    help="Print a summary of the database queries run by each command (see `profile`).")
+args = parser.parse_args()
+
 import pathlib
 import sys
-from warnings import warn
+import traceback
+from typing import Iterable, Optional, Tuple
 
 import au_core as au
+from au_core.profiling import QueryProfiler
 
 import commands
 # command files
 # TODO: move these into a seperate folder
+# only `help` is imported here; the other command modules are imported on first use (see `commands.MANIFEST`)
 import help
-import load_csv
-import search_player
-import view_player
-import start_game
-import delete_game
-import add_event
-import add_death
-import view_headlines
-import view_reports
-import add_report
-import generate_headlines
 
 @commands.register(aliases=["exit"], description="Exit this program.")
 def quit(*args):
@@ -61,7 +75,7 @@ def load_game(arg: str = ""):
         # then ask the user to select a game
         print("Enter the numerical id of the game you wish to load, or enter a name for a new game.")
         print("To cancel, enter nothing.")
-        arg = input(":").strip()
+        arg = commands.ask(":").strip()
         # cancel condn
         if arg == "":
             return
@@ -87,23 +101,157 @@ def load_game(arg: str = ""):
             print(f"No game found with name {name}")
             game = au.Game(name=name)
             session.add(game)
-            session.commit()
+            commands.commit(session)
             print(f"Created a NEW game, with id {game.id}, called {game.name}")
         # announce loading of game in either case.
         print(f"Loaded game {game.name}.")
     # put the loaded game in the state dict
     commands.state['game'] = game
 
+@commands.register(primary_name="profile",
+                   description="Turns profiling of the database queries run by each command on or off.",
+                   help_text="""With profiling on, each command is followed by the number of queries it ran,
+the time they took, the slowest of them, and any that were repeated with only their parameters changing
+(a query repeated once per player, say, is usually a sign that something should be loaded in one go).
+Usage: profile [on | off]""")
+def profile(arg: str = ""):
+    arg = arg.strip().lower()
+    if arg in ("on", "off"):
+        commands.state['profile'] = arg == "on"
+    elif arg != "":
+        raise commands.CommandError(f"Expected `profile on` or `profile off`, not `profile {arg}`.")
+    print(f"Profiling is {'on' if commands.state.get('profile', False) else 'off'}.")
+
+def run_command(cmd_head: str, cmd_args: str):
+    """
+    Runs a command, followed by a summary of the queries it ran if profiling is on (see `profile`).
+    The summary is printed even if the command fails.
+    """
+    cmd = commands.lookup(cmd_head)
+    if not commands.state.get('profile', False) or cmd.f is profile:
+        cmd.f(cmd_args)
+        return
+    profiler = QueryProfiler(cmd.primary_name).start()
+    try:
+        cmd.f(cmd_args)
+    finally:
+        print(profiler.stop().report())
+
+def find_game(session, arg: str) -> au.Game:
+    """
+    Finds a game by its id or name, without offering to create it.
+    """
+    game = session.get(au.Game, int(arg)) if arg.isdigit() else None
+    if game is None:
+        game = session.scalar(au.Game.select().filter_by(name=arg))
+    if game is None:
+        raise au.GameNotFoundError(f"No game with id or name {arg}")
+    return game
+
+def split_command(whole_cmd: str) -> Tuple[str, str]:
+    """
+    :return: The name of the command, and the raw arguments to pass it.
+    """
+    # we look for the first space in order to extract the command name
+    i = whole_cmd.find(" ")
+    # how to extract the name depends on whether the input has a space in or not
+    if i != -1:
+        return whole_cmd[:i], whole_cmd[i:].lstrip()
+    return whole_cmd, ""
+
+def commit_batch(session):
+    """
+    Runs the work deferred by the batch's commands (see `commands.defer`), then commits the batch.
+    """
+    if commands.state.get('profile', False):
+        with QueryProfiler("commit") as commit_profile:
+            n = commands.run_deferred()
+            session.commit()
+        print(commit_profile.report())
+    else:
+        n = commands.run_deferred()
+        session.commit()
+    print(f"Committed{f' (after {n} deferred update(s))' if n else ''}.")
+
+def run_batch(lines: Iterable[str], commit_every: Optional[int] = None) -> int:
+    """
+    Runs a script of commands in the current session, one per line, as if every confirmation was answered Y.
+    Blank lines and lines starting with # are skipped, and `quit` ends the script early.
+    The commands are committed together at the end, or every `commit_every` commands,
+    and the game-state updates they defer (e.g. target reassignment) are only done just before each commit.
+    Note that this means kills are judged licit or illicit by the targets as they were at the last commit,
+    so mark kills explicitly as `licit` or `illicit` where that matters.
+    Stops at the first command that fails, rolling back the commands since the last commit.
+    :return: The exit status: 0 if every command succeeded, 1 otherwise.
+    """
+    session = commands.state['session']
+    commands.state['batch'] = True
+    n_run = n_uncommitted = 0
+    lineno, line = 0, ""
+    try:
+        for lineno, line in enumerate(lines, start=1):
+            line = line.strip()
+            if line == "" or line.startswith("#"):
+                continue
+            cmd_head, cmd_args = split_command(line)
+            cmd = commands.lookup(cmd_head)
+            if cmd.f is quit:
+                break
+            print(f"[{lineno}] {line}")
+            run_command(cmd_head, cmd_args)
+            n_run += 1
+            n_uncommitted += 1
+            if commit_every and n_uncommitted >= commit_every:
+                commit_batch(session)
+                n_uncommitted = 0
+        line = "(end of batch)"
+        commit_batch(session)
+    except Exception as e:
+        if not isinstance(e, (commands.CommandError, commands.InvalidCommandError, au.GameNotFoundError)):
+            traceback.print_exc()
+        session.rollback()
+        commands.discard_deferred()
+        print(f"Error on line {lineno}: {line}", file=sys.stderr)
+        print(f"    {type(e).__name__}: {e}", file=sys.stderr)
+        print(f"Rolled back the {n_uncommitted} command(s) since the last commit.", file=sys.stderr)
+        return 1
+    finally:
+        commands.state['batch'] = False
+    print(f"Ran {n_run} command(s).")
+    return 0
+
 def load_game_or_quit():
     load_game()
     if 'game' not in commands.state:
         print("Quitting...")
         sys.exit(0)
 
+# offer to migrate an outdated database before anything tries to use it
+if not au.schema_up_to_date:
+    if args.batch:
+        print("The database needs migrating. Run the `migrate` command before running a batch.", file=sys.stderr)
+        sys.exit(1)
+    import migrate
+    migrate.main()
+
 with au.db.Session() as session:
     commands.state['session'] = session
+    commands.state['profile'] = args.profile
 
-    load_game_or_quit()
+    if args.game:
+        commands.state['game'] = find_game(session, args.game)
+        print(f"Loaded game {commands.state['game'].name}.")
+
+    if args.batch:
+        if args.batch == "-":
+            status = run_batch(sys.stdin, args.commit_every)
+        else:
+            with open(args.batch) as f:
+                status = run_batch(f, args.commit_every)
+        sys.exit(status)
+
+    if 'game' not in commands.state:
+        load_game_or_quit()
 
     # print welcome text once loaded a game
     dir = pathlib.Path(__file__).parent;
@@ -120,15 +268,7 @@ with au.db.Session() as session:
         emoji = u'\U0001F195' if (game.started is None) else u' \U0001F5E1' if game.live else u'\U0001F3C1'
         # displays a dagger emoji where the user inputs their command
         whole_cmd = str(input(f"{game.name} {emoji} "))
-        # we look for the first space in order to extract the command name
-        i = whole_cmd.find(" ")
-        # how to extract the name depends on whether the input has a space in or not
-        if i != -1:
-            cmd_head = whole_cmd[:i]
-            cmd_args = whole_cmd[i:].lstrip()
-        else:
-            cmd_head = whole_cmd
-            cmd_args = ""
+        cmd_head, cmd_args = split_command(whole_cmd)
         # throw error if command doesn't exist
         if cmd_head not in commands.COMMANDS:
             #warn(commands.InvalidCommandError(f'No command exists called `{cmd_head}`'))
@@ -136,7 +276,8 @@ with au.db.Session() as session:
             continue
         # we execute the named command with the subsequent text and the state dict passed as arguments
         try:
-            commands.COMMANDS[cmd_head].f(cmd_args)
-        except Exception as e:
-            raise
+            run_command(cmd_head, cmd_args)
+        except commands.CommandError as e:
+            session.rollback()
+            print(f"Error: {e}")
 
@@ -34,7 +34,11 @@ from os import path
 sys.path.append( path.dirname( path.dirname( path.abspath(__file__) ) ) )
 
 import au_core as au
+from au_core.static_site import affected_pages
 from typing import Optional
+from sqlalchemy.orm import Session
+import commands
+import reassign
 
 
 def same_game(obj1, obj2):
@@ -43,70 +47,77 @@ def same_game(obj1, obj2):
 def main(event_id: Optional[int] = None,
          killer_id: Optional[int] = None,
          victim_id: Optional[int] = None,
-         licit: Optional[bool] = None):
-    with au.db.Session() as session:
-        # get event
-        if event_id is None:
-            event_id = int(input("Enter the id of the event where this death happened: ").strip())
-        event = session.get(au.Event, event_id)
-        if event is None:
-            print(f"Error - no event exists with id {event_id}")
-            return
-
-        # get victim
-        if victim_id is None:
-            victim_id = int(input("Enter the id of the VICTIM: ").strip())
-            return
-        victim = session.get(au.Player, victim_id)
-        if not same_game(victim, event):
-            print(f"Error - no player with id {victim_id} exists in game {event.game.name}")
-            return
-
-        # get killer
-        if killer_id is None:
-            killer_id = int(input("Enter the id of the KILLER: ").strip())
-            return
-        killer = session.get(au.Player, killer_id)
-        if not same_game(killer, event):
-            print(f"Error - no player with id {killer_id} exists in game {event.game.name}")
-            return
-
-        # determine licitness
-        if licit is None:
-            licit, reason = victim.licit_for(killer)
-            if not licit:
-                print(f"This kill is illicit {reason}.")
-                print("Enter Y below if it was licit anyway,"
-                             " for example because the victim was bearing, "
-                             "otherwise just press enter")
-                resp = input(":").strip().upper()
-                if resp == "Y":
-                    licit = True
-
-
-        new_death = au.Death(event_id=event.id, victim_id=victim.id, killer_id=killer.id, licit=licit)
-
-        print(f"Enter Y to confirm the {'licit' if licit else 'illicit'} death of {victim.reg.realname} at the hands of "
-              f"{killer.reg.realname}, during the following event:")
-        print(event.plaintext_headline())
-        resp = input().upper()
-        if resp == "Y":
-            session.add(new_death)
-            session.commit()
-            print("Successfuly added death.")
-            event.game.assign_targets()
-        else:
-            session.rollback()
-            print("Did not add the death.")
+         licit: Optional[bool] = None,
+         session: Optional[Session] = None):
+    if session is None:
+        with au.db.Session() as session:
+            return main(event_id, killer_id, victim_id, licit, session)
+
+    # get event
+    if event_id is None:
+        event_id = int(commands.ask("Enter the id of the event where this death happened: ").strip())
+    event = session.get(au.Event, event_id)
+    if event is None:
+        raise commands.CommandError(f"No event exists with id {event_id}")
+
+    # get victim
+    if victim_id is None:
+        victim_id = int(commands.ask("Enter the id of the VICTIM: ").strip())
+    victim = session.get(au.Player, victim_id)
+    if not same_game(victim, event):
+        raise commands.CommandError(f"No player with id {victim_id} exists in game {event.game.name}")
+
+    # get killer
+    if killer_id is None:
+        killer_id = int(commands.ask("Enter the id of the KILLER: ").strip())
+    killer = session.get(au.Player, killer_id)
+    if not same_game(killer, event):
+        raise commands.CommandError(f"No player with id {killer_id} exists in game {event.game.name}")
+
+    # determine licitness
+    if licit is None:
+        licit, reason = victim.licit_for(killer)
+        if not licit:
+            print(f"This kill is illicit {reason}.")
+            print("Enter Y below if it was licit anyway,"
+                         " for example because the victim was bearing, "
+                         "otherwise just press enter")
+            resp = commands.ask(":", default="").strip().upper()
+            if resp == "Y":
+                licit = True
+
+
+    new_death = au.Death(event_id=event.id, victim_id=victim.id, killer_id=killer.id, licit=licit)
+
+    print(f"Enter Y to confirm the {'licit' if licit else 'illicit'} death of {victim.reg.realname} at the hands of "
+          f"{killer.reg.realname}, during the following event:")
+    print(event.plaintext_headline())
+    if commands.confirm():
+        session.add(new_death)
+        # targets are reassigned on demand, so that several kills cost one reassignment
+        event.game.mark_dead(victim)
+        if commands.in_batch():
+            commands.defer(lambda: reassign.main(event.game), key="reassign")
+        commands.commit(session)
+        print("Successfuly added death.")
+        pages = affected_pages(event.game, victim.id, since=event.datetimestamp)
+        if pages:
+            print(f"This death changes how {victim.reg.realname} appears on {', '.join(pages)}. "
+                  f"Use `buildsite` to rebuild them.")
+        if event.game.targets_dirty and not commands.in_batch():
+            print("Use `reassign` to reassign targets once you have recorded every kill. "
+                  "(This is also done before update emails are queued.)")
+    else:
+        session.rollback()
+        print("Did not add the death.")
 
 if __name__ == "__main__":
     main(event_id=args.event, killer_id=args.killer, victim_id=args.victim, licit=(True if args.licit else None))
 else:
     import re
-    keyword_pattern = re.compile(r"(at|by|on|licitl|illicit)")
+    keyword_pattern = re.compile(r"(at|by|on|licit|illicit)")
 
-    import commands
-    from load_csv import chunk
+    from utils import chunk
     # command used by the main cli program
     # TODO: add help info about using cli command to search events, once this is created!
     # TODO: add help info about using the links on the headline pages to find event ids.
@@ -123,38 +134,19 @@ addkill [licit | illicit] [at <event id>] [by <killer id>] [on <victim id>]""")
             args[kw] = arg.strip()
 
         if "licit" in args and "illicit" in args:
-            print("Error - you have tried to mark the kill as both licit and illicit!")
-            return
-        with au.db.Session() as session:
-            if "at" in args:
-                event_id = int(args['at'])
-            else:
-                event_id = None
-            if "by" in args:
-                killer_id = int(args['by'])
-            else:
-                killer_id = None
-            if "on" in args:
-                victim_id = int(args['on'])
-            else:
-                victim_id = None
-            if "licit" in args:
-                if "illicit" in args:
-                    print("Error - a kill cannot be both licit and illicit!")
-                    return
-                licit = True
-            elif "illicit" in args:
-                licit = False
-            else:
-                licit = None
-
-            main(event_id=event_id,
-                 killer_id=killer_id,
-                 victim_id=victim_id,
-                 licit=licit)
-
-
-
-
-
+            raise commands.CommandError("You have tried to mark the kill as both licit and illicit!")
+        event_id = int(args['at']) if "at" in args else None
+        killer_id = int(args['by']) if "by" in args else None
+        victim_id = int(args['on']) if "on" in args else None
+        if "licit" in args:
+            licit = True
+        elif "illicit" in args:
+            licit = False
+        else:
+            licit = None
 
+        main(event_id=event_id,
+             killer_id=killer_id,
+             victim_id=victim_id,
+             licit=licit,
+             session=commands.state['session'])
@@ -40,13 +40,14 @@ sys.path.append( path.dirname( path.dirname( path.abspath(__file__) ) ) )
 
 import au_core as au
 from typing import Optional
+import commands
 
 # TODO: consider whether should refer to 'events' as 'headlines'
 #  to make clearer what role they play in what the end user sees.
 def main(game: au.Game, datetimestamp: Optional[datetime] = None, headline: Optional[str] = None, deaths = False):
     # request datetimestamp if not specified
     while datetimestamp == None:
-        dtstr = input('Please enter the date and time of the event, in the format YYYY-MM-DD HH:MM (24-hour clock): ').strip()
+        dtstr = commands.ask('Please enter the date and time of the event, in the format YYYY-MM-DD HH:MM (24-hour clock): ').strip()
         # exit condn
         if dtstr == '':
             return
@@ -66,7 +67,7 @@ def main(game: au.Game, datetimestamp: Optional[datetime] = None, headline: Opti
     if headline is None or headline.strip() == "":
         print("Please the 'headline' for the event below (or nothing to abort the command):")
         print(datetimestamp.strftime("%A, %d %B"))
-        headline = input(datetimestamp.strftime("[%I:%M %p] ")).strip()
+        headline = commands.ask(datetimestamp.strftime("[%I:%M %p] ")).strip()
 
     # exit condn
     if headline == "":
@@ -78,9 +79,8 @@ def main(game: au.Game, datetimestamp: Optional[datetime] = None, headline: Opti
 
     print("Type Y to confirm adding the following event:")
     print(new_event.plaintext_headline(with_ts=True))
-    resp = input().upper()
-    if resp == "Y":
-        game.session.commit()
+    if commands.confirm():
+        commands.commit(game.session)
         print(f"Successfully added event. Event id is {new_event.id}.")
         # TODO: link to recording deaths
         #print(f"To record a death in this event, run `adddeath {new_event.id}`")
@@ -97,7 +97,6 @@ if __name__ == "__main__":
         main(game, datetimestamp, args.headline)
 
 else:
-    import commands
     # command used by the main cli program
     @commands.register(primary_name="addevent", aliases=['addheadline'],
                        description="Record an event in the game.")
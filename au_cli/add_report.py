@@ -27,6 +27,7 @@ sys.path.append( path.dirname( path.dirname( path.abspath(__file__) ) ) )
 import au_core as au
 from typing import Optional
 from view_reports import EventNotFoundError
+import commands
 
 # TODO: handle non-id parameters
 def main(game: Optional[au.Game] = None,
@@ -34,7 +35,7 @@ def main(game: Optional[au.Game] = None,
          author_id: Optional[int] = None,
          body: Optional[str] = None):
     if event_id is None:
-        event_id = int(input("Enter the ID of the event to attach the report to: "))
+        event_id = int(commands.ask("Enter the ID of the event to attach the report to: "))
     if game is None:
         session = au.db.Session()
         need_to_close_session = True
@@ -54,20 +55,21 @@ def main(game: Optional[au.Game] = None,
     print(f"(Raw headline: {event.headline})")
 
     if author_id is None:
-        author_id = int(input("Enter the ID of pseudonym for the author of the report: "))
+        author_id = int(commands.ask("Enter the ID of pseudonym for the author of the report: "))
     author = session.get(au.Pseudonym, author_id)
+    if author is None or author.game_id != event.game_id:
+        raise commands.CommandError(f"No pseudonym with id {author_id} exists in game {event.game.name}")
 
     if body is None or body.strip() == "":
         print("Enter the text of the report:")
-        body = input().strip()
+        body = commands.ask().strip()
     new_report = au.Report(author=author, body=body)
     event.reports.append(new_report)
 
     print(f"Updated event {event_id} now as follows:")
     print(event.plaintext_full())
-    resp = input("Enter Y to confirm addition of report: ").upper()
-    if resp == "Y":
-        session.commit()
+    if commands.confirm("Enter Y to confirm addition of report: "):
+        commands.commit(session)
         print(f"Successfully added report (id={new_report.id})")
     else:
         print("Did not add report.")
@@ -79,10 +81,19 @@ def main(game: Optional[au.Game] = None,
 if __name__ == "__main__":
     main(None, args.event, args.author, args.body)
 else:
-    import commands
     # command used by the main cli program
     @commands.register(primary_name="addreport", aliases=['add_report'],
-                       description="Add a report to an event")
+                       description="Add a report to an event",
+                       help_text="""Adds a report to an existing event, asking for anything not given as an argument.
+Usage: addreport <event id> [<author pseudonym id> [report text]]""")
     def cmd_add_event(argsraw: str = ""):
+        if 'game' not in commands.state:
+            raise(commands.GameNotLoadedError())
         game = commands.state['game']
-        main(game, int(argsraw))
+        args = argsraw.split(maxsplit=2)
+        if not args:
+            raise commands.CommandError("Give the id of the event to add the report to.")
+        main(game,
+             int(args[0]),
+             int(args[1]) if len(args) > 1 else None,
+             args[2] if len(args) > 2 else None)
@@ -0,0 +1,65 @@
+"""
+build_site.py
+
+A command line script to build the static site (headlines page and weekly news pages) for a game.
+Only the pages whose events have changed since the last build are rewritten.
+"""
+
+# parse command line arguments first so that --help doesn't boot up au_core
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("-g", "--game", help="The name of the game to build the site for.",
+                        type=str, required=True)
+    parser.add_argument("path", help="The directory to write the site to.",
+                        type=str)
+    parser.add_argument("-f", "--force", action="store_true", help="Include to rebuild every page.")
+    args = parser.parse_args()
+
+# some nonsense to allow us to import from the above directory
+import sys
+import os
+sys.path.append( os.path.dirname( os.path.dirname( os.path.abspath(__file__) ) ) )
+
+import au_core as au
+import commands
+
+def main(game: au.Game, path: str, force: bool = False):
+    if path is None or path.strip() == "":
+        path = str(commands.ask(f"Enter the directory to build the site in (current directory is {os.getcwd()}): "))
+
+    if path.strip() == "":
+        print("Did not build the site.")
+        return
+
+    report = game.build_site(path.strip(), force=force)
+    for name in report.written:
+        print(f"Wrote {name}")
+    for name in report.removed:
+        print(f"Removed {name}")
+    print(f"Built site in {path} in {report.elapsed * 1000:.0f} ms: "
+          f"{len(report.written)} page(s) written, {len(report.unchanged)} unchanged, "
+          f"{report.events_rendered} headline(s) rendered.")
+
+
+if __name__ == "__main__":
+    with au.db.Session() as session:
+        game = session.scalar(au.Game.select().filter_by(name=args.game))
+        if game is None:
+            raise au.GameNotFoundError(f"No game with name {args.game}")
+        main(game, args.path, args.force)
+else:
+    # command used by the main cli program
+    @commands.register(primary_name="buildsite",
+                       description="Builds the headlines and news pages, rewriting only those that have changed.",
+                       help_text="""Writes the headlines page and one news page per week to a directory.
+A manifest in the directory records what each page was built from, so that only changed pages are rewritten.
+Usage: buildsite <directory> [--force]""")
+    def cmd_build_site(argsraw: str = ""):
+        if 'game' not in commands.state:
+            raise(commands.GameNotLoadedError())
+        force = "--force" in argsraw.split()
+        path = " ".join(a for a in argsraw.split() if a != "--force")
+        main(commands.state["game"], path, force)
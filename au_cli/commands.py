@@ -3,8 +3,17 @@ commands.py
 
 Defines a decorator that registers a function as a command,
 and a registry for the main program to look up commands.
+
+So that the CLI starts quickly, the modules defining most commands are not imported up front.
+Instead they are listed in `MANIFEST`, and each is only imported the first time one of its commands is looked up
+(see `lookup`), at which point its `register` calls replace the placeholders.
+The manifest holds the names and descriptions, so `help` can list every command without importing any of them.
+
+Commands ask for input and confirmation through `ask` and `confirm`, and commit through `commit`,
+so that the same commands can be run non-interactively from a script in batch mode (see `__main__.run_batch`).
 """
 
+import importlib
 from typing import Optional, List, Callable
 from dataclasses import dataclass, field
 
@@ -18,14 +27,91 @@ COMMANDS = {}
 #  Though, actually, this should be implemented by allowing a command to be 'hidden' and having that as a separate command...)
 state = {}
 
+def in_batch() -> bool:
+    """
+    :return: Whether commands are being run non-interactively from a script.
+    """
+    return state.get('batch', False)
+
+def ask(prompt: str = "", default: Optional[str] = None) -> str:
+    """
+    Asks the user for input.
+    In batch mode there is nobody to ask, so `default` is returned instead,
+    or a BatchInputError raised if there is no default.
+    """
+    if in_batch():
+        if default is None:
+            raise BatchInputError(f"Cannot ask for input in batch mode ({prompt.strip()!r}). "
+                                  f"Give it as an argument to the command instead.")
+        return default
+    return input(prompt)
+
+def confirm(prompt: str = "") -> bool:
+    """
+    Asks the user to confirm an action by entering Y.
+    In batch mode every action is confirmed without asking.
+    """
+    if in_batch():
+        print(prompt + "Y")
+        return True
+    return input(prompt).strip().upper() == "Y"
+
+def commit(session):
+    """
+    Commits the changes made by a command.
+    In batch mode the changes are only flushed, so that they are committed along with the rest of the batch.
+    """
+    if in_batch():
+        session.flush()
+    else:
+        session.commit()
+
+def defer(task: Callable[[], None], key: Optional[str] = None):
+    """
+    Runs `task`, which recomputes game state after a change (e.g. reassigning targets after a death).
+    In batch mode the task is instead run at the end of the batch, just before it is committed,
+    so that the batch's commands are not slowed down by recomputing the game after each one.
+    :param key: If given, a task deferred with the same key is only run once per batch,
+    so that e.g. recording ten kills costs one reassignment of targets.
+    """
+    if in_batch():
+        deferred = state.setdefault('deferred', {})
+        deferred.setdefault(key if key is not None else object(), task)
+    else:
+        task()
+
+def run_deferred() -> int:
+    """
+    Runs the tasks deferred by `defer`, in the order they were deferred.
+    :return: The number of tasks run.
+    """
+    tasks = state.pop('deferred', {})
+    for task in tasks.values():
+        task()
+    return len(tasks)
+
+def discard_deferred():
+    """
+    Discards the tasks deferred by `defer` without running them, e.g. when their changes are rolled back.
+    """
+    state.pop('deferred', None)
+
 @dataclass
 class Command:
-    """Class for all the information about a command"""
-    f: Callable[[str], None]
+    """
+    Class for all the information about a command.
+    A command whose module has not yet been imported has no function `f`, but has the `module` to import to get it.
+    """
+    f: Optional[Callable[[str], None]]
     primary_name: str
     description: str = ""
     help_text: str = ""
     aliases: List[str] = field(default_factory=lambda: [])
+    module: Optional[str] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self.f is not None
 
 def register(aliases: Optional[List[str]] = None, **kwargs):
     """
@@ -45,7 +131,8 @@ def register(aliases: Optional[List[str]] = None, **kwargs):
         has_space = [f'`{n}`' for n in aliases if " " in n]
         if len(has_space) > 0:
             raise IllegalCommandNameError(', '.join(has_space) + " are not a valid command names they contain spaces.")
-        duplicate = [f'`{n}`' for n in aliases if n in COMMANDS]
+        # names may only be registered once, except that a command may replace its own placeholder from the manifest
+        duplicate = [f'`{n}`' for n in aliases if n in COMMANDS and COMMANDS[n].loaded]
         if len(duplicate) > 0:
             raise DuplicateCommandError("Commands are already registered with the names " + ', '.join(duplicate))
 
@@ -56,6 +143,43 @@ def register(aliases: Optional[List[str]] = None, **kwargs):
         return func
     return register_decorator
 
+def register_lazy(module: str, primary_name: str, aliases: Optional[List[str]] = None, description: str = ""):
+    """
+    Registers a placeholder for a command defined in `module`, which is imported when the command is first looked up.
+    The module must register the command under the same names when imported.
+    """
+    aliases = list(aliases) if aliases else list()
+    aliases.append(primary_name)
+    cmd = Command(f=None, primary_name=primary_name, description=description, aliases=tuple(aliases), module=module)
+    for name in aliases:
+        COMMANDS.setdefault(name, cmd)
+
+def lookup(name: str) -> Command:
+    """
+    Looks up a command by any of its names, importing the module that defines it if it has not been imported yet.
+    :return: The Command, with its function.
+    """
+    if name not in COMMANDS:
+        raise InvalidCommandError(f"No command exists called `{name}`")
+    cmd = COMMANDS[name]
+    if not cmd.loaded:
+        importlib.import_module(cmd.module)
+        cmd = COMMANDS[name]
+        if not cmd.loaded:
+            raise InvalidCommandError(f"Module {cmd.module} did not register the command `{name}`")
+    return cmd
+
+class CommandError(Exception):
+    """
+    Exception raised when a command cannot be carried out, e.g. because of invalid arguments.
+    The message is shown to the user.
+    """
+
+class BatchInputError(CommandError):
+    """
+    Exception raised when a command needs input that cannot be given in batch mode.
+    """
+
 class InvalidCommandError(Exception):
     """
     Exception to raise when the user tries to call a command that doesn't exist.
@@ -71,7 +195,39 @@ class DuplicateCommandError(IllegalCommandNameError):
     Exception raised if we try to register a command under a name which already has a command registered to it
     """
 
-class GameNotLoadedError(Exception):
+class GameNotLoadedError(CommandError):
     """
     Exception raised if somehow a command is called without a loaded game.
-    """
\ No newline at end of file
+    """
+    def __init__(self, message: str = "You need to load a game first!"):
+        super().__init__(message)
+
+# the manifest of commands to import on first use, as (module, primary name, aliases, description)
+# keep this in sync with the `register` calls in each module
+MANIFEST = [
+    ("load_csv", "loadcsv", [], "Loads players from a CSV file."),
+    ("load_csv", "cd", ["chdir"], "Changes the current working directory. (Used for finding csv files)"),
+    ("load_csv", "ls", ["dir"], "Lists the files in the current working directory. (Used for finding csv files)"),
+    ("search_player", "searchplayer", ["searchplayers"], "Searches for a player by real name or email address."),
+    ("view_player", "viewplayer", [], "Fetches information on a player, including their pseudonyms, using their id"),
+    ("start_game", "start", [], "Starts the current game."),
+    ("reassign", "reassign", [], "Reassigns the targets of dead assassins, and queues emails about the new targets."),
+    ("delete_game", "deletegame", [], "Deletes the current game."),
+    ("delete_game", "endgame", [], "Ends the current game, so that it can be deleted."),
+    ("add_event", "addevent", ["addheadline"], "Record an event in the game."),
+    ("add_death", "addkill", ["add_kill"], "Record a kill"),
+    ("view_headlines", "viewheadlines", ["viewevents"], "Gives the headlines and IDs of events on a given date."),
+    ("view_reports", "viewreports", ["view_reports", "eventinfo", "event_info"],
+     "Fetches information on a player, including their pseudonyms, using their id"),
+    ("add_report", "addreport", ["add_report"], "Add a report to an event"),
+    ("generate_headlines", "generateheadlines", [], "Generates the headline page"),
+    ("build_site", "buildsite", [],
+     "Builds the headlines and news pages, rewriting only those that have changed."),
+    ("send_updates", "sendupdates", [], "Queues an update email for every alive assassin."),
+    ("send_updates", "dispatchmail", [], "Sends the emails waiting in the outbox."),
+    ("migrate", "migrate", [], "Brings the database up to the current schema version."),
+    ("generate_game", "generategame", [], "Populates the current game with synthetic players, events, deaths and reports."),
+]
+
+for _module, _primary_name, _aliases, _description in MANIFEST:
+    register_lazy(_module, _primary_name, _aliases, _description)
@@ -21,20 +21,22 @@ from os import path
 sys.path.append( path.dirname( path.dirname( path.abspath(__file__) ) ) )
 
 import au_core as au
+import commands
+from tabulate import tabulate
 
 def main(game: au.Game, confirm=True) -> bool:
     if game.live:
-        print("Cannot delete this game as it is live! End the game first to delete it.")
-        return False
+        raise commands.CommandError("Cannot delete this game as it is live! End the game first to delete it.")
     if confirm:
         # TODO: Add more info. about what starting the game does.
         print(f"About to delete game {game.name}.")
-        resp = input("Enter Y to confirm: ").upper()
-        if resp != "Y":
+        if not commands.confirm("Enter Y to confirm: "):
             return False
     session = game.session
-    game.delete()
-    session.commit()
+    counts = game.delete()
+    commands.commit(session)
+    print(f"Deleted game {game.name}:")
+    print(tabulate(((table, n) for table, n in counts.items() if n), headers=("Table", "Rows deleted")))
     return True
 
 if __name__ == "__main__":
@@ -44,8 +46,6 @@ if __name__ == "__main__":
             raise au.GameNotFoundError(f"No game with name {args.game}")
         main(game, not args.force)
 else:
-    import commands
-
     # command used by the main cli program
     @commands.register(primary_name="deletegame", description="Deletes the current game.")
     def cmd_startgame(argsraw: str = ""):
@@ -55,7 +55,7 @@ else:
             del commands.state['game']
 
     # temporary command to end a game so that it can be deleted
-    @commands.register(primary_name="endgame")
+    @commands.register(primary_name="endgame", description="Ends the current game, so that it can be deleted.")
     def cmd_endgame(argsraw: str=""):
         if 'game' not in commands.state:
             raise(commands.GameNotLoadedError())
@@ -0,0 +1,97 @@
+"""
+generate_game.py
+
+A command line script to populate an assassins game with synthetic data, for load-testing and trying things out.
+The game is created if it does not exist.
+"""
+
+# parse command line arguments first so that --help doesn't boot up au_core
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("game", help="The name of the game to populate. It is created if it does not exist.",
+                        type=str)
+    parser.add_argument("-s", "--seed", help="The seed to generate from.", type=int, default=0)
+    parser.add_argument("--players", help="The number of full players.", type=int)
+    parser.add_argument("--police", help="The number of police.", type=int)
+    parser.add_argument("--events", help="The number of events.", type=int)
+    parser.add_argument("--refs", help="The number of references in each headline.", type=int)
+    parser.add_argument("--deaths", help="The number of deaths.", type=int)
+    parser.add_argument("--reports", help="The number of reports.", type=int)
+    parser.add_argument("--weeks", help="The number of weeks to spread the events over.", type=int)
+    parser.add_argument("--no-start", help="Include to leave the game unstarted.", action="store_true")
+    parser.add_argument("-f", "--force", action="store_true", help="Include to skip confirmation.")
+    args = parser.parse_args()
+
+# some nonsense to allow us to import from the above directory
+import sys
+import time
+from dataclasses import fields
+from os import path
+sys.path.append( path.dirname( path.dirname( path.abspath(__file__) ) ) )
+
+import au_core as au
+from au_core.generator import GeneratorSizes, generate_game
+from tabulate import tabulate
+import commands
+
+def parse_sizes(argsraw: str) -> (int, GeneratorSizes):
+    """
+    Parses arguments of the form `key=value`, e.g. `seed=3 players=2000 events=1000`.
+    :return: The seed, and the sizes to generate.
+    """
+    seed = 0
+    sizes = GeneratorSizes()
+    names = {f.name for f in fields(GeneratorSizes)}
+    for arg in argsraw.split():
+        key, _, value = arg.partition("=")
+        if key != "seed" and key not in names:
+            raise commands.CommandError(f"Unknown argument {arg!r}. The arguments are seed and {', '.join(sorted(names))}.")
+        try:
+            value = int(value)
+        except ValueError:
+            raise commands.CommandError(f"{key} must be a whole number, not {value!r}.")
+        if value < 0:
+            raise commands.CommandError(f"{key} cannot be negative.")
+        if key == "seed":
+            seed = value
+        else:
+            setattr(sizes, key, value)
+    return seed, sizes
+
+def main(game: au.Game, seed: int, sizes: GeneratorSizes, start: bool = True, confirm: bool = True):
+    if confirm:
+        print(f"About to add {sizes.players} players, {sizes.police} police, {sizes.events} events, "
+              f"{sizes.deaths} deaths and {sizes.reports} reports of synthetic data to the game {game.name}"
+              + (", and start it." if start and not game.live else "."))
+        if not commands.confirm("Enter Y to confirm: "):
+            return
+    t = time.perf_counter()
+    counts = generate_game(game, seed, sizes, start)
+    commands.commit(game.session)
+    print(tabulate(counts.items(), headers=["table", "rows added"]))
+    print(f"Generated in {time.perf_counter() - t:.1f} s.")
+
+if __name__ == "__main__":
+    with au.db.Session() as session:
+        game = session.scalar(au.Game.select().filter_by(name=args.game))
+        if game is None:
+            game = au.create_game_w_session(session, args.game)
+        sizes = GeneratorSizes(**{f.name: getattr(args, f.name) for f in fields(GeneratorSizes)
+                                  if getattr(args, f.name) is not None})
+        main(game, args.seed, sizes, not args.no_start, not args.force)
+else:
+    # command used by the main cli program
+    @commands.register(primary_name="generategame",
+                       description="Populates the current game with synthetic players, events, deaths and reports.",
+                       help_text="""Adds reproducible synthetic data to the current game, for load-testing.
+Players and police are registered, the game is started (if it has not been), and events, deaths and reports added.
+The same seed and sizes always give the same data.
+Usage: generategame [seed=N] [players=N] [police=N] [events=N] [refs=N] [deaths=N] [reports=N] [weeks=N]""")
+    def cmd_generate_game(argsraw: str = ""):
+        if 'game' not in commands.state:
+            raise(commands.GameNotLoadedError())
+        seed, sizes = parse_sizes(argsraw)
+        main(commands.state['game'], seed, sizes)
@@ -22,13 +22,14 @@ import os
 sys.path.append( os.path.dirname( os.path.dirname( os.path.abspath(__file__) ) ) )
 
 import au_core as au
+import commands
 
 def main(game: au.Game, path: str):
     page = game.generate_headlines()
     print("Headlines page HTML: ")
     print(page)
     if path is None or path.strip() == "":
-        path = str(input(f"Enter save path (current directory is {os.getcwd()}): "))
+        path = str(commands.ask(f"Enter save path (current directory is {os.getcwd()}): "))
 
     if path.strip() == "":
         print("Did not save.")
@@ -47,7 +48,6 @@ if __name__ == "__main__":
             raise au.GameNotFoundError(f"No game with name {args.game}")
         main(game, args.path)
 else:
-    import commands
     # command used by the main cli program
     @commands.register(primary_name="generateheadlines", description="Generates the headline page")
     def cmd_gen_headlines(argsraw: str):
@@ -22,7 +22,8 @@ def clihelp(command_name: str = ""):
     elif command_name not in commands.COMMANDS:
         raise commands.InvalidCommandError(f"No command exists of the name {command_name}")
     else:
-        cmd = commands.COMMANDS[command_name]
+        # this imports the command's module, if it hasn't been already, for the full help text
+        cmd = commands.lookup(command_name)
         print(f"{cmd.primary_name}: {cmd.description}")
         print(f"Aliases: " + ", ".join(cmd.aliases))
         print(cmd.help_text)
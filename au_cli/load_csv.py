@@ -19,6 +19,16 @@ if __name__ == '__main__':
                         action='store_true')
     parser.add_argument("-g", "--game", help="The name of the game to load the CSV into.",
                         type=str, required=True)
+    parser.add_argument("--stream", help="Include this flag to read the file in chunks, "
+                                         "showing progress counts rather than a table of every registration. "
+                                         "Use this for very large files.",
+                        action='store_true')
+    parser.add_argument("-d", "--check-deliverability",
+                        help="Include this flag to reject rows whose email domain cannot receive email. "
+                             "This needs DNS lookups, which are batched by domain.",
+                        action='store_true')
+    parser.add_argument("-c", "--chunk-size", help="The number of rows per chunk in --stream mode.",
+                        type=int, default=500)
     args = parser.parse_args()
 
 # some nonsense to allow us to import from the above directory
@@ -27,10 +37,13 @@ import os
 sys.path.append( os.path.dirname( os.path.dirname( os.path.abspath(__file__) ) ) )
 
 import csv
+from itertools import islice
+from pathlib import Path
 import au_core as au
-from typing import List, Optional
-from warnings import warn
+from au_core.bulk_import import RegistrationImporter, ImportResult
+from typing import Optional
 from tabulate import tabulate
+import commands
 
 required_headings = ["realname", "email", "initial_pseudonym", "college", "address", "water", "notes", "type"]
 blank_allowed = ["notes"]
@@ -43,63 +56,103 @@ class MissingHeadingsError(Exception):
         self.missing_headings = kwargs["missing_headings"]
         super().__init__(*args)
 
-# TODO: Return failed rows as well, and display these in another table
-def parse_csv(filepath: str, game: au.Game) -> List[au.Registration]:
+def parse_csv(filepath: str, game: au.Game, check_deliverability: bool = False) -> ImportResult:
     """
+    Reads and validates the registrations in a CSV file, without adding them to the game.
+    Duplicates are checked for within the file and against the game with a few set-based queries
+    (see `au_core.bulk_import.RegistrationImporter`).
     :param filepath: Path of the csv file to load registrations from.
     :param game: au_core.Game object to add the registrations to
-    :return: A list of au_core.Registration objects corresponding to the rows of the CSV file.
+    :param check_deliverability: Whether to reject rows whose email domain cannot receive email.
+    :return: An ImportResult holding a Registration for each valid row of the CSV file, and the rejected rows.
+    The index of a rejected row counts from 0 for the first row after the headings.
+    """
+    with open(filepath, newline="") as csvfile:
+        reader = dict_reader(csvfile)
+        return RegistrationImporter(game, check_deliverability=check_deliverability).validate(reader)
+
+def dict_reader(csvfile) -> csv.DictReader:
+    """
+    :param csvfile: An open CSV file.
+    :return: A csv.DictReader over the file, once the headings have been checked.
     """
+    reader = csv.DictReader(csvfile)
 
-    registrations = []
-
-    with open(filepath) as csvfile:
-        reader = csv.reader(csvfile)
-        initial = True # gives special treatment to first row
-        for row in reader:
-            # first row is headings
-            if initial:
-                # save the initial row as the 'headings' row
-                head = row
-                initial = False
-
-                # verify all required headings present
-                missing_headings = [h for h in required_headings if h not in head]
-                if len(missing_headings) > 0:
-                    raise MissingHeadingsError(f"CSV file is missing the following headings: {', '.join(missing_headings)}",
-                                               missing_headings=missing_headings)
-            # rest of rows are entries
-            else:
-                # set Registration attributes based on the head row
-                newreg = au.Registration(game=game)
-                for i in range(len(row)):
-                    setattr(newreg, head[i], row[i])
-
-                # validate the registration
-                # TODO: add to session to validate!fff
-                try:
-                    newreg.validate(enforce_unique_email=True)
-                    registrations.append(newreg)
-                except Exception as e:
-                    warn(e)
-
-    return registrations
+    # verify all required headings present
+    missing_headings = [h for h in required_headings if h not in (reader.fieldnames or [])]
+    if len(missing_headings) > 0:
+        raise MissingHeadingsError(f"CSV file is missing the following headings: {', '.join(missing_headings)}",
+                                   missing_headings=missing_headings)
+    return reader
+
+def rejected_path(filepath: str) -> Path:
+    """
+    :return: The path of the CSV file that rejected rows are written to in streaming mode,
+    which is alongside the file being loaded.
+    """
+    path = Path(filepath)
+    return path.with_name(f"{path.stem}.rejected.csv")
+
+def stream_csv(game: au.Game, filepath: str, save: Optional[bool] = False, chunk_size: int = 500,
+               check_deliverability: bool = False):
+    """
+    Loads the registrations in a CSV file a chunk at a time, so that memory use does not grow with the file.
+    Each chunk is validated (with duplicates checked against the game and the earlier chunks) and inserted,
+    and progress counts are printed as it goes.
+    Rejected rows are written, along with their line numbers and the reasons, to a CSV file alongside the loaded file.
+    Nothing is committed until every chunk has been loaded, and then only if confirmed (or `save` is set).
+    """
+    session = game.session
+    importer = RegistrationImporter(game, check_deliverability=check_deliverability)
+    out_path = rejected_path(filepath)
+    n_accepted = n_rejected = 0
+
+    with open(filepath, newline="") as csvfile, open(out_path, "w", newline="") as rejectedfile:
+        reader = dict_reader(csvfile)
+        writer = csv.writer(rejectedfile)
+        writer.writerow(["line", "reason"] + reader.fieldnames)
+
+        first_index = 0
+        while True:
+            rows = list(islice(reader, chunk_size))
+            if not rows:
+                break
+            result = importer.import_rows(rows, first_index)
+            first_index += len(rows)
+            n_accepted += len(result.accepted)
+            n_rejected += len(result.rejected)
+            for r in result.rejected:
+                # line numbers count the headings as line 1
+                writer.writerow([r.index + 2, r.reason] + [r.row.get(h) for h in reader.fieldnames])
+            print(f"Processed {first_index} rows: {n_accepted} accepted, {n_rejected} rejected.")
+
+    if n_rejected > 0:
+        print(f"Wrote the rejected rows to {out_path}")
+    else:
+        out_path.unlink()
+
+    if save or commands.confirm(f"Enter Y to add {n_accepted} registrations to game {game.name}? "):
+        commands.commit(session)
+        print(f"Successfully added {n_accepted} registrations to the game.")
+    else:
+        session.rollback()
+        print("Aborted adding registrations frome the CSV file.")
 
 # originally function to run as a callback once loaded a game when this run as an os terminal command
 # but also works for the main cli program
 
-def main(game: au.Game, filepath: str, save: Optional[bool] = False):
-    regs = parse_csv(filepath=filepath, game=game)
+def main(game: au.Game, filepath: str, save: Optional[bool] = False, check_deliverability: bool = False):
+    result = parse_csv(filepath=filepath, game=game, check_deliverability=check_deliverability)
     print("Successfully loaded the following registrations:")
-    tab = tabulate( [ [getattr(r, a) for a in required_headings] for r in regs] , headers=required_headings )
+    tab = tabulate( [ [getattr(r, a) for a in required_headings] for r in result.accepted] , headers=required_headings )
     print(tab)
-    if not save:
-        resp = input(f"Enter Y to add these registrations to game {game.name}? ").upper()
-
-    if save or resp == "Y":
-        for reg in regs:
-            game.add_player_from_reg(reg)
-        game.session.commit()
+    if result.rejected:
+        print("The following rows were rejected:")
+        # line numbers count the headings as line 1
+        print(tabulate([[r.index + 2, r.reason] for r in result.rejected], headers=["line", "reason"]))
+    if save or commands.confirm(f"Enter Y to add these registrations to game {game.name}? "):
+        RegistrationImporter(game).insert(result.accepted)
+        commands.commit(game.session)
         print("Successfully added all registrations to the game.")
     else:
         print("Aborted adding registrations frome the CSV file.")
@@ -111,16 +164,33 @@ if __name__ == '__main__':
         game = session.scalar(au.Game.select().filter_by(name=args.game))
         if game is None:
             raise au.GameNotFoundError(f"No game with name {args.game}")
-        main(game, args.filepath, save=args.save)
+        if args.stream:
+            stream_csv(game, args.filepath, save=args.save, chunk_size=args.chunk_size,
+                       check_deliverability=args.check_deliverability)
+        else:
+            main(game, args.filepath, save=args.save, check_deliverability=args.check_deliverability)
 else:
-    import commands
+    from utils import chunk
     # command used by the main cli program
-    @commands.register(primary_name="loadcsv", description="Loads players from a CSV file.")
+    @commands.register(primary_name="loadcsv", description="Loads players from a CSV file.",
+                       help_text="""Loads player registrations from a CSV file, asking for confirmation before adding them.
+With --stream, the file is read in chunks and only progress counts are shown,
+and rejected rows are written to a CSV file alongside the loaded one. Use this for very large files.
+With --check-deliverability (or -d), rows whose email domain cannot receive email are rejected too.
+This needs DNS lookups, which are batched by domain.
+Usage: loadcsv <path> [--stream] [--check-deliverability]""")
     def cmd_loadcsv(argsraw: str = ""):
         if 'game' not in commands.state:
             raise(commands.GameNotLoadedError())
 
-        main(commands.state['game'], argsraw)
+        words = argsraw.split()
+        stream = "--stream" in words
+        check_deliverability = "--check-deliverability" in words or "-d" in words
+        path = " ".join(a for a in words if a not in ("--stream", "--check-deliverability", "-d"))
+        if stream:
+            stream_csv(commands.state['game'], path, check_deliverability=check_deliverability)
+        else:
+            main(commands.state['game'], path, check_deliverability=check_deliverability)
 
 
     # helper commands for finding files
@@ -130,27 +200,11 @@ else:
         os.chdir(argsraw)
         print(f"Changed working directory to {os.getcwd()}")
 
-    # util to iterate in 'chunks'
-    # TODO: put this in its own file since it's also used by add_death.py for parsing
-    from itertools import islice
-    def chunk(it, size):
-        """
-        Util for iterating 'in chunks' over an iterator.
-        Used in the `ls` command.
-        :param it: Iterator to 'chunk'
-        :param size: Size of the chunks.
-        The last chunk will be smaller than this if the iterator's length does not divide by this.
-        :return: An iterator returning tuples of `size` elements at a time from `it`.
-        """
-        it = iter(it)
-        return iter(lambda: tuple(islice(it, size)), ())
-
     @commands.register(aliases=['dir'],
                        description="Lists the files in the current working directory. (Used for finding csv files)")
     def ls(argsraw: str = ""):
         if argsraw == "":
             argsraw = os.getcwd()
-        print(args)
         contents = os.listdir(argsraw)
         print(f"Files and folders in {argsraw}")
         tab = tabulate(chunk(contents, 3))
@@ -0,0 +1,48 @@
+"""
+migrate.py
+
+A command line script to bring the database up to the current schema version.
+"""
+
+# parse command line arguments first so that --help doesn't boot up au_core
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("-f", "--force", action="store_true", help="Include to skip confirmation.")
+    args = parser.parse_args()
+
+# some nonsense to allow us to import from the above directory
+import sys
+from os import path
+sys.path.append( path.dirname( path.dirname( path.abspath(__file__) ) ) )
+
+import au_core as au
+from au_core import migrations
+import commands
+
+def main(confirm=True):
+    with au.db.engine.connect() as conn:
+        version = migrations.get_version(conn)
+    if version == migrations.CURRENT_VERSION:
+        print(f"The database is already at the current schema version ({version}).")
+        return
+    if confirm:
+        print(f"About to migrate the database from schema version {version or migrations.BASELINE_VERSION} "
+              f"to {migrations.CURRENT_VERSION}. Back up the database first!")
+        if not commands.confirm("Enter Y to confirm: "):
+            return
+    applied = migrations.migrate(au.db.engine)
+    for m in applied:
+        print(f"Applied migration {m.version}: {m.description}")
+    au.schema_up_to_date = True
+    print(f"The database is at schema version {migrations.CURRENT_VERSION}.")
+
+if __name__ == "__main__":
+    main(not args.force)
+else:
+    # command used by the main cli program
+    @commands.register(primary_name="migrate", description="Brings the database up to the current schema version.")
+    def cmd_migrate(argsraw: str = ""):
+        main()
@@ -0,0 +1,55 @@
+"""
+reassign.py
+
+A command line script to reassign the targets of assassins who have died in an assassins game.
+"""
+
+# parse command line arguments first so that --help doesn't boot up au_core
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("game", help="The name of the game to reassign targets in.",
+                        type=str)
+    args = parser.parse_args()
+
+# some nonsense to allow us to import from the above directory
+import sys
+from os import path
+sys.path.append( path.dirname( path.dirname( path.abspath(__file__) ) ) )
+
+import au_core as au
+import commands
+
+def main(game: au.Game):
+    if not game.targets_dirty:
+        print("No targets need reassigning.")
+        return
+    report = game.reassign_targets()
+    queued = []
+    if report.new_edges:
+        queued = game.queue_updates("You have new targets.", assassin_ids=report.affected)
+    commands.commit(game.session)
+    print(f"Reassigned targets for {len(report.affected)} assassin(s) ({report.rerolls} re-rolls needed), "
+          f"and queued {len(queued)} update email(s). Use `dispatchmail` to send them.")
+
+if __name__ == "__main__":
+    with au.db.Session() as session:
+        game = session.scalar(au.Game.select().filter_by(name=args.game))
+        if game is None:
+            raise au.GameNotFoundError(f"No game with name {args.game}")
+        main(game)
+else:
+    # command used by the main cli program
+    @commands.register(primary_name="reassign",
+                       description="Reassigns the targets of dead assassins, and queues emails about the new targets.",
+                       help_text="""Recording a kill does not reassign targets straight away,
+so that recording several kills costs only one reassignment, which also sees every death at once.
+This command does the reassignment, handing out the dead assassins' targets to their assassins.
+It is also done automatically before update emails are queued, and at the end of a batch.
+Usage: reassign""")
+    def cmd_reassign(argsraw: str = ""):
+        if 'game' not in commands.state:
+            raise(commands.GameNotLoadedError())
+        main(commands.state['game'])
@@ -0,0 +1,82 @@
+"""
+send_updates.py
+
+A command line script to queue update emails for the assassins in a game, and to send the emails in the outbox.
+"""
+
+# parse command line arguments first so that --help doesn't boot up au_core
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("-g", "--game", help="The name of the game.",
+                        type=str, required=True)
+    parser.add_argument("-m", "--message", help="A message to queue an update email with, for every alive assassin.",
+                        type=str)
+    parser.add_argument("-d", "--dispatch", action="store_true",
+                        help="Include to send the emails in the outbox (after queueing any update).")
+    parser.add_argument("-r", "--rate", help="The maximum number of emails to send per second.",
+                        type=float)
+    args = parser.parse_args()
+
+# some nonsense to allow us to import from the above directory
+import sys
+from os import path
+sys.path.append( path.dirname( path.dirname( path.abspath(__file__) ) ) )
+
+import au_core as au
+from typing import Optional
+import commands
+
+
+def queue(game: au.Game, message: str = ""):
+    queued = game.queue_updates(message)
+    commands.commit(game.session)
+    print(f"Queued {len(queued)} update email(s).")
+
+
+def dispatch(game: au.Game, rate: Optional[float] = None):
+    report = game.dispatch_updates(rate_limit=rate)
+    print(f"Sent {report.sent} email(s) in {report.elapsed:.1f} s ({report.throughput:.1f} per second).")
+    if report.retried:
+        print(f"{report.retried} email(s) failed to send and will be retried later.")
+    if report.failed:
+        print(f"{report.failed} email(s) failed too many times and have been given up on.")
+    print(f"{report.backlog} email(s) are waiting in the outbox.")
+
+
+if __name__ == "__main__":
+    with au.db.Session() as session:
+        game = session.scalar(au.Game.select().filter_by(name=args.game))
+        if game is None:
+            raise au.GameNotFoundError(f"No game with name {args.game}")
+        if args.message is not None:
+            queue(game, args.message)
+        if args.dispatch:
+            dispatch(game, args.rate)
+else:
+    # commands used by the main cli program
+    @commands.register(primary_name="sendupdates",
+                       description="Queues an update email for every alive assassin.",
+                       help_text="""Queues an email for every alive assassin giving their targets and competence deadline,
+along with an optional message. The emails are sent by `dispatchmail`.
+Usage: sendupdates [message]""")
+    def cmd_send_updates(argsraw: str = ""):
+        if 'game' not in commands.state:
+            raise(commands.GameNotLoadedError())
+        queue(commands.state["game"], argsraw.strip())
+
+    @commands.register(primary_name="dispatchmail",
+                       description="Sends the emails waiting in the outbox.",
+                       help_text="""Sends the current game's emails waiting in the outbox.
+Emails which fail to send are retried on a later run.
+Usage: dispatchmail [max emails per second]""")
+    def cmd_dispatch_mail(argsraw: str = ""):
+        if 'game' not in commands.state:
+            raise(commands.GameNotLoadedError())
+        if commands.in_batch():
+            # sending commits the session as it goes, which would commit the batch part-way through
+            raise commands.CommandError("Emails cannot be sent in batch mode. Run `dispatchmail` after the batch.")
+        rate = float(argsraw) if argsraw.strip() else None
+        dispatch(commands.state["game"], rate)
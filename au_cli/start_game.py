@@ -21,16 +21,18 @@ from os import path
 sys.path.append( path.dirname( path.dirname( path.abspath(__file__) ) ) )
 
 import au_core as au
+import commands
 
 def main(game: au.Game, confirm=True):
     if confirm:
         # TODO: Add more info. about what starting the game does.
         print(f"About to start the game {game.name}.")
-        resp = input("Enter Y to confirm: ").upper()
-        if resp != "Y":
+        if not commands.confirm("Enter Y to confirm: "):
             return
     game.start()
-    game.session.commit()
+    queued = game.queue_updates("The game has begun!", cause="start")
+    commands.commit(game.session)
+    print(f"Queued {len(queued)} update email(s). Use `dispatchmail` to send them.")
 
 if __name__ == "__main__":
     with au.db.Session() as session:
@@ -39,8 +41,6 @@ if __name__ == "__main__":
             raise au.GameNotFoundError(f"No game with name {args.game}")
         main(game, not args.force)
 else:
-    import commands
-
     # command used by the main cli program
     @commands.register(primary_name="start", description="Starts the current game.")
     def cmd_startgame(argsraw: str = ""):
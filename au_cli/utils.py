@@ -0,0 +1,20 @@
+"""
+au_cli/utils.py
+
+Small utilities shared between command modules.
+"""
+
+from itertools import islice
+
+# util to iterate in 'chunks'
+def chunk(it, size):
+    """
+    Util for iterating 'in chunks' over an iterator.
+    Used in the `ls` command, and for parsing the arguments of `addkill`.
+    :param it: Iterator to 'chunk'
+    :param size: Size of the chunks.
+    The last chunk will be smaller than this if the iterator's length does not divide by this.
+    :return: An iterator returning tuples of `size` elements at a time from `it`.
+    """
+    it = iter(it)
+    return iter(lambda: tuple(islice(it, size)), ())
@@ -21,6 +21,8 @@ from os import path
 sys.path.append( path.dirname( path.dirname( path.abspath(__file__) ) ) )
 
 import au_core as au
+from au_core.Event import preload_references
+from au_core.EventReference import mentions_of
 from typing import Optional
 from search_player import info_headers, player_info_tuple
 from tabulate import tabulate
@@ -36,7 +38,8 @@ def main(id: int, game: Optional[au.Game] = None):
         need_to_close_session = True
         player = session.get(au.Player, id)
     else:
-        player = game.session.scalar(game.players.select().filter_by(id=id))
+        session = game.session
+        player = session.scalar(game.players.select().filter_by(id=id))
         need_to_close_session = False
 
     if player is None:
@@ -56,8 +59,9 @@ def main(id: int, game: Optional[au.Game] = None):
 
     # if the player is an assassin, display their targets and assassins
     if isinstance(player, au.Assassin):
-        print("Competence deadline: " + player.competence_deadline.strftime("%a %d %b, %H:%M"))
-        print()
+        if player.competence_deadline is not None:
+            print("Competence deadline: " + player.competence_deadline.strftime("%a %d %b, %H:%M"))
+            print()
 
         targtab = tabulate((player_info_tuple(t) for t in player.targets), headers=info_headers)
         print(f"{player.reg.realname}'s Targets:")
@@ -69,6 +73,17 @@ def main(id: int, game: Optional[au.Game] = None):
         print(asstab)
         print()
 
+    # display the events which mention the player, found with one query on the index of references
+    mentions = mentions_of(session, player.id)
+    preload_references(session, [e for e, kinds, n in mentions], with_reports=False)
+    histtab = tabulate(((e.id, e.datetimestamp.strftime("%a %d %b, %H:%M"), e.plaintext_headline(),
+                         ", ".join(sorted(k.name.lower() for k in kinds)))
+                        for e, kinds, n in mentions),
+                       headers=('Event id', 'Time', 'Headline', 'Mentioned as'))
+    print(f"Events mentioning {player.reg.realname}:")
+    print(histtab)
+    print()
+
     if need_to_close_session:
         session.close()
 
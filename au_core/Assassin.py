@@ -50,16 +50,26 @@ class Assassin(Player):
                 return (True, f'because {self.id} is targetting {killer.id}')
             return (False, f'because {self.id} is neither a target of nor targetting {killer.id}')
 
-    def send_update(self, body: str = ""):
-        from .templates import env
+    def render_update(self, body: str = "") -> "OutgoingMessage":
+        """
+        Renders the update email for this assassin, giving their details, (alive) targets and competence deadline.
+        :param body: The message to put at the top of the email.
+        :return: The rendered email, as a plain OutgoingMessage which can be sent from any thread.
+        """
+        from .templates import templates
+        from .mail import OutgoingMessage
         from babel.dates import format_datetime
-        template = env.get_template("update-email.jinja")
+        template = templates["update-email.jinja"]
         message = template.render(player=self.reg,
                                   message=body,
-                                  targets=[t.reg for t in self.targets],
+                                  targets=[t.reg for t in self.targets if t.alive],
                                   competence_deadline=format_datetime(self.competence_deadline,
                                                                       locale=self.game.locale,
                                                                       tzinfo=self.competence_deadline.tzinfo
                                                                       )
                                   )
-        self.reg.send_email(body=message)
\ No newline at end of file
+        return OutgoingMessage(to=self.reg.email, body=message)
+
+    def send_update(self, body: str = ""):
+        from .mail import get_transport
+        get_transport().send_message(self.render_update(body))
\ No newline at end of file
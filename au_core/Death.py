@@ -14,9 +14,9 @@ from datetime import datetime
 class Death(Base):
     __tablename__ = "deaths"
     id: Mapped[int] = mapped_column(primary_key=True)
-    event_id: Mapped[int] = mapped_column(ForeignKey("events.id", ondelete="CASCADE"))
+    event_id: Mapped[int] = mapped_column(ForeignKey("events.id", ondelete="CASCADE"), index=True)
     killer_id: Mapped[int] = mapped_column(ForeignKey("players.id"))
-    victim_id: Mapped[int] = mapped_column(ForeignKey("players.id"))
+    victim_id: Mapped[int] = mapped_column(ForeignKey("players.id"), index=True)
     expires: Mapped[Optional[datetime]] = mapped_column(DateTime)
     licit: Mapped[bool] # for the purpose of counting score
 
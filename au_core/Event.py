@@ -4,18 +4,28 @@ Event.py
 Defines the `Event` class.
 """
 
-import re
-from typing import List, Union
-from sqlalchemy import ForeignKey, DateTime, and_
-from sqlalchemy.orm import Mapped, mapped_column, relationship, Session
+from typing import List, Union, Dict, Iterable, Set, NamedTuple
+from sqlalchemy import ForeignKey, DateTime, Index, select, event
+from sqlalchemy.orm import Mapped, mapped_column, relationship, Session, selectinload
 from .Base import Base
 from .Pseudonym import Pseudonym
 from .Player import Player
+from .timeline import DeathTimeline
+from .references import Reference, render, referenced_ids, tokenise
 from datetime import datetime
 
-# TODO: allow escaping?
-# regex pattern for extracting the id of the pseudonym/player from a reference
-parsing_pattern = re.compile(r"<([@#])(\d+)>")
+
+class ResolvedReference(NamedTuple):
+    """
+    A reference in a headline or report body, resolved for rendering at the time of its event.
+        kind        -   "@" to render the pseudonym itself, "#" to render its owner, revealing who they are.
+        pseudonym   -   The referenced Pseudonym.
+        css_class   -   The CSS class to render it with, e.g. `colourdead1` if its owner was dead at the time.
+    """
+    kind: str
+    pseudonym: Pseudonym
+    css_class: str
+
 
 class Event(Base):
     """
@@ -31,9 +41,12 @@ class Event(Base):
 
     In the headline, players should be represented in the format <@xxxxxxxx>,
     where xxxxxxxx is replaced by the id of the **pseudonym** to use for them.
+    Headlines are parsed once and cached (see `references`), so rendering one does not re-run the regex.
     """
 
     __tablename__ = "events"
+    # for selecting a game's events in date order, or in a date range (e.g. `Game.events_in_week`)
+    __table_args__ = (Index("ix_events_game_id_datetimestamp", "game_id", "datetimestamp"),)
 
     id: Mapped[int] = mapped_column(primary_key=True)
     headline: Mapped[str]
@@ -43,21 +56,33 @@ class Event(Base):
     game: Mapped["Game"] = relationship(back_populates="events")
     reports: Mapped[List["Report"]] = relationship(back_populates="event", order_by="Report.datetimestamp")
 
-    def _HTML_repl_ref(self, m: re.Match) -> str:
-        id = int(m[2])
-        p = self.session.get(Pseudonym, id)
-        if m[1] == "@":
-            # TODO: move rendering code here!
-            return p.HTML_render(css_class=p.css_class(self.datetimestamp))
-        elif m[1] == "#":
-            return p.owner.HTML_render(css_class=p.css_class(self.datetimestamp))
-
-    def _plaintext_repl_ref(self, m: re.Match) -> str:
-        id = int(m[2])
-        p = self.session.get(Pseudonym, id)
-        if m[1] == "@":
+    def HTML_parts(self, text: str) -> List[Union[str, ResolvedReference]]:
+        """
+        Splits `text` (this event's headline, or the body of one of its reports) into the parts that the page templates
+        render with the `parts` macro in `macros.jinja`: literal text, and references resolved to their pseudonyms.
+        :param text: The text to split.
+        :return: A list of parts, each either a str or a ResolvedReference.
+        """
+        session = self.session
+        parts = []
+        for token in tokenise(text):
+            if isinstance(token, Reference):
+                p = session.get(Pseudonym, token.pseudonym_id)
+                token = ResolvedReference(token.kind, p, p.css_class(self.datetimestamp))
+            parts.append(token)
+        return parts
+
+    def headline_parts(self) -> List[Union[str, ResolvedReference]]:
+        """
+        :return: The parts of the headline, for rendering in a template (see `HTML_parts`).
+        """
+        return self.HTML_parts(self.headline)
+
+    def _plaintext_render_ref(self, ref: Reference) -> str:
+        p = self.session.get(Pseudonym, ref.pseudonym_id)
+        if ref.kind == "@":
             return p.text
-        elif m[1] == "#":
+        elif ref.kind == "#":
             return p.owner.plaintext_render()
         else:
             return
@@ -66,39 +91,80 @@ class Event(Base):
         """
         :return: The week number in which this event occurred
         """
-        return 1 + (self.datetimestamp.date() - self.game.started.date()).days // 7
+        return self.game.week_of(self.datetimestamp)
 
     def HTML_headline(self) -> str:
         """
         :return: The HTML formatted headline of the event. (Not including datetimestamp)
         """
-        return parsing_pattern.sub(lambda m: self._HTML_repl_ref(m), self.headline)
+        from .templates import templates
+        return str(templates.macros().parts(self.headline_parts()))
 
     def plaintext_headline(self, with_ts: bool = False) -> str:
         """
         :param with_ts: Whether to include the timestamp in the headline. Defaults to False.
         :return: The parsed plaintext headline of the event.
         """
-        return ((self.datetimestamp.strftime("[%I:%M %p] ") if with_ts else "") +
-                parsing_pattern.sub(lambda m: self._plaintext_repl_ref(m), self.headline))
+        headline = render(self.headline, self._plaintext_render_ref)
+        return self.datetimestamp.strftime("[%I:%M %p] ") + headline if with_ts else headline
 
     def plaintext_full(self) -> str:
         """
         :return: A plaintext form of the whole event including timestamp and reports.
         """
-        return  "---\n"\
-                + f"[{datetime.strftime(self.datetimestamp, '%I:%M %p')}] {self.plaintext_headline()}\n"\
-                + "---\n"\
-                + "\n\n\n".join([f"{x.author.text} writes\n{x.plaintext_body()}" for x in self.reports]) \
-                + "\n---"
+        reports = "\n\n\n".join(f"{x.author.text} writes\n{x.plaintext_body()}" for x in self.reports)
+        return f"---\n[{self.datetimestamp.strftime('%I:%M %p')}] {self.plaintext_headline()}\n---\n{reports}\n---"
 
     def raw_full(self) -> str:
         """
         :return: The "raw" form of plaintext_full, i.e. the whole event & reports with <@xxx> references
         rather than parsed pseudonyms
         """
-        return "---\n" \
-               + f"[{datetime.strftime(self.datetimestamp, '%H:%M')}] {self.headline}\n" \
-               + "---\n" \
-               + "\n\n\n".join([f"{x.author.reference()} writes\n{x.body}" for x in self.reports]) \
-               + "\n---"
\ No newline at end of file
+        reports = "\n\n\n".join(f"{x.author.reference()} writes\n{x.body}" for x in self.reports)
+        return f"---\n[{self.datetimestamp.strftime('%H:%M')}] {self.headline}\n---\n{reports}\n---"
+
+    def referenced_ids(self, with_reports: bool = True) -> Set[int]:
+        """
+        :param with_reports: Whether to include the references in the event's reports, and their authors.
+        Defaults to True.
+        :return: The ids of the pseudonyms referenced by this event.
+        """
+        ids = set(referenced_ids(self.headline))
+        if with_reports:
+            for r in self.reports:
+                ids.add(r.author_id)
+                ids.update(referenced_ids(r.body))
+        return ids
+
+
+# deaths start at the datetimestamp of their event, so moving an event invalidates the death timelines
+@event.listens_for(Event.datetimestamp, "set")
+def _on_datetimestamp_set(target: Event, value, oldvalue, initiator):
+    DeathTimeline.invalidate(Session.object_session(target))
+
+
+def preload_references(session: Session, events: Iterable[Event], with_reports: bool = True) -> Dict[int, Pseudonym]:
+    """
+    Scans the headlines and reports of `events` for pseudonym references (and report authors),
+    then loads all the referenced Pseudonyms, their owners, the owners' registrations and the owners' other pseudonyms
+    with a fixed number of queries (one per table, using selectinload), independent of the number of references.
+    After this, the `session.get` calls made when substituting references are answered from the identity map,
+    so rendering a page of events does not make a query per reference.
+    The reports of `events` should already be loaded (e.g. with `selectinload(Event.reports)`), unless `with_reports` is False.
+    :param session: The sqlalchemy.orm.Session the events belong to.
+    :param events: The events that are about to be rendered.
+    :param with_reports: Whether the events' reports are to be rendered too. Defaults to True.
+    :return: A dict of the loaded Pseudonyms by id.
+    """
+    ids = set()
+    for e in events:
+        ids.update(e.referenced_ids(with_reports))
+    if not ids:
+        return {}
+
+    pseudonyms = session.scalars(select(Pseudonym)
+                                 .where(Pseudonym.id.in_(ids))
+                                 .options(selectinload(Pseudonym.owner)
+                                          .options(selectinload(Player.reg), selectinload(Player.pseudonyms)))
+                                 )
+    return {p.id: p for p in pseudonyms}
\ No newline at end of file
@@ -0,0 +1,130 @@
+"""
+EventReference.py
+
+Defines the `EventReference` class, a reverse index from pseudonyms and players to the events that mention them.
+"""
+
+from itertools import chain, groupby
+from typing import Optional, Iterable, Set, List, Tuple
+from sqlalchemy import ForeignKey, Connection, select, insert, delete, inspect, event
+from sqlalchemy.orm import Mapped, mapped_column, Session
+from .Base import Base
+from .enums import ReferenceKind
+from .Event import Event
+from .Report import Report
+from .Pseudonym import Pseudonym
+from .references import tokenise, Reference
+
+
+class EventReference(Base):
+    """
+    EventReference class
+
+    An entry in the reverse index from pseudonyms and players to the events that mention them.
+    There is a row for each distinct reference in an event's headline or in one of its reports,
+    and for the author of each report, recording both the pseudonym and the player who owns it.
+    This makes "every event mentioning player X" a single indexed query, rather than a scan of every headline and report.
+
+    The rows of an event are rebuilt automatically whenever it or one of its reports is added, changed or deleted
+    through the ORM (see `_index_references`),
+    but `rebuild_references` must be called by hand after bulk statements that touch events or reports.
+    """
+
+    __tablename__ = "event_references"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    event_id: Mapped[int] = mapped_column(ForeignKey(Event.id, ondelete="CASCADE"), index=True)
+    # None for references in the event's headline
+    report_id: Mapped[Optional[int]] = mapped_column(ForeignKey(Report.id, ondelete="CASCADE"), index=True)
+    kind: Mapped[ReferenceKind]
+    pseudonym_id: Mapped[int] = mapped_column(ForeignKey(Pseudonym.id, ondelete="CASCADE"), index=True)
+    player_id: Mapped[int] = mapped_column(ForeignKey("players.id", ondelete="CASCADE"), index=True)
+
+
+def rebuild_references(conn: Connection, event_ids: Iterable[int]) -> int:
+    """
+    Rebuilds the EventReference rows of some events from their headlines and reports, using five queries.
+    References to pseudonyms that do not exist are left out.
+    :param conn: The connection to use, e.g. `session.connection()`.
+    :param event_ids: The ids of the events to rebuild the references of. Events which no longer exist just lose theirs.
+    :return: The number of rows written.
+    """
+    event_ids = set(event_ids)
+    if not event_ids:
+        return 0
+    conn.execute(delete(EventReference).where(EventReference.event_id.in_(event_ids)))
+
+    # (event_id, report_id, kind, pseudonym_id)
+    refs = set()
+
+    def add_tokens(event_id: int, report_id: Optional[int], text: str):
+        for t in tokenise(text):
+            if isinstance(t, Reference):
+                refs.add((event_id, report_id, ReferenceKind(t.kind), t.pseudonym_id))
+
+    for event_id, headline in conn.execute(select(Event.id, Event.headline).where(Event.id.in_(event_ids))):
+        add_tokens(event_id, None, headline)
+    for event_id, report_id, author_id, body in conn.execute(select(Report.event_id, Report.id, Report.author_id, Report.body)
+                                                             .where(Report.event_id.in_(event_ids))):
+        add_tokens(event_id, report_id, body)
+        if author_id is not None:
+            refs.add((event_id, report_id, ReferenceKind.AUTHOR, author_id))
+    if not refs:
+        return 0
+
+    owners = dict(conn.execute(select(Pseudonym.id, Pseudonym.owner_id)
+                               .where(Pseudonym.id.in_({pseudonym_id for *_, pseudonym_id in refs}))).all())
+    rows = [{"event_id": event_id, "report_id": report_id, "kind": kind,
+             "pseudonym_id": pseudonym_id, "player_id": owners[pseudonym_id]}
+            for event_id, report_id, kind, pseudonym_id in refs if pseudonym_id in owners]
+    if rows:
+        conn.execute(insert(EventReference), rows)
+    return len(rows)
+
+
+def mentions_of(session: Session, player_id: int) -> List[Tuple[Event, Set[ReferenceKind], int]]:
+    """
+    Finds every event mentioning a player (by any of their pseudonyms), with a single query on the index.
+    :param session: The sqlalchemy.orm.Session to query with.
+    :param player_id: The id of the player.
+    :return: A list, in date order, of (event, the kinds of reference made to the player, the number of references).
+    """
+    rows = session.execute(select(Event, EventReference.kind)
+                           .join(EventReference, EventReference.event_id == Event.id)
+                           .where(EventReference.player_id == player_id)
+                           .order_by(Event.datetimestamp, Event.id))
+    mentions = []
+    for e, group in groupby(rows, key=lambda row: row[0]):
+        kinds = [kind for _, kind in group]
+        mentions.append((e, set(kinds), len(kinds)))
+    return mentions
+
+
+def _changed(obj, *attrs: str) -> bool:
+    state = inspect(obj)
+    return any(state.attrs[a].history.has_changes() for a in attrs)
+
+
+@event.listens_for(Session, "after_flush")
+def _index_references(session: Session, flush_context):
+    """
+    Rebuilds the references of every event whose headline, or one of whose reports, was just flushed as changed.
+    """
+    event_ids: Set[int] = set()
+    moved_report_ids: Set[int] = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Event):
+            if obj in session.new or obj in session.deleted or _changed(obj, "headline"):
+                event_ids.add(obj.id)
+        elif isinstance(obj, Report):
+            if obj in session.new or obj in session.deleted or _changed(obj, "body", "author", "author_id", "event", "event_id"):
+                event_ids.add(obj.event_id)
+                if obj not in session.new and _changed(obj, "event", "event_id"):
+                    moved_report_ids.add(obj.id)
+    if moved_report_ids:
+        # the event a report was moved from is not known if it was never loaded, but its index rows still point to it
+        event_ids.update(session.connection().scalars(select(EventReference.event_id)
+                                                      .where(EventReference.report_id.in_(moved_report_ids))))
+    event_ids.discard(None)
+    if event_ids:
+        rebuild_references(session.connection(), event_ids)
@@ -5,11 +5,9 @@ Defines the ORM model `Game` representing a game of assassins.
 Also implements most of the game logic as methods of this class.
 """
 
-import random
-import concurrent.futures
-from typing import List, Optional
-from sqlalchemy.orm import Mapped, mapped_column, relationship, WriteOnlyMapped
-from sqlalchemy import select, func, and_, or_, ScalarResult
+from typing import List, Optional, Iterable, Dict, Tuple
+from sqlalchemy.orm import Mapped, mapped_column, relationship, WriteOnlyMapped, selectinload, attributes
+from sqlalchemy import select, delete, update, and_, ScalarResult, Select
 from .enums import RegType
 from .Base import Base
 from .Registration import Registration
@@ -18,10 +16,17 @@ from .Assassin import Assassin
 from .Police import Police
 from .Pseudonym import Pseudonym
 from .TargRel import TargRel
-from .Event import Event
+from .targetting import TargettingGraph, AssignmentReport
+from .Event import Event, preload_references
+from .Report import Report
+from .Death import Death
+from .EventReference import EventReference
+from .timeline import DeathTimeline
 from .config import config
+from .Outbox import Outbox, dispatch_outbox
 from datetime import datetime, timezone, timedelta
 from warnings import warn
+import random
 
 # setup for news pages generation from template
 
@@ -35,6 +40,10 @@ class Game(Base):
     """
     Settings are:
         n_targs             -   The number of targets each assassin should be assigned. Defaults to 3.
+        min_girth           -   The minimum length of a cycle in the targetting graph,
+                                e.g. 3 forbids two assassins from targetting each other. Defaults to 3.
+                                Before this setting existed only self-targetting and duplicate targets were forbidden,
+                                i.e. a girth of 2, so games from then are migrated with a girth of 2 (see `migrations`).
         initial_competence  -   The length of time until assassins go incompetent from the start of the game.
                                 Defaults to 7 days.
         locale              -   The locale that should be used for generating emails.
@@ -50,9 +59,12 @@ class Game(Base):
     # game state
     live: Mapped[bool] = mapped_column(default=False)
     started: Mapped[Optional[datetime]]
+    # whether assassins have died since targets were last reassigned (see `reassign_targets`)
+    targets_dirty: Mapped[bool] = mapped_column(default=False)
 
     # settings
     n_targs: Mapped[int] = mapped_column(default=config["n_targs"])
+    min_girth: Mapped[int] = mapped_column(default=config["min_girth"])
     initial_competence: Mapped[timedelta] = mapped_column(default=timedelta(days=config["initial_competence"]))
     locale: Mapped[str] = mapped_column(default=config["locale"])
 
@@ -61,26 +73,54 @@ class Game(Base):
     players: WriteOnlyMapped[List["Player"]] = relationship(back_populates="game", passive_deletes=True)
     assassins: WriteOnlyMapped[List["Assassin"]] = relationship(back_populates="game", overlaps="players", passive_deletes=True)
     events: WriteOnlyMapped[List["Event"]] = relationship(back_populates="game", passive_deletes=True)
+    outbox: WriteOnlyMapped[List["Outbox"]] = relationship(back_populates="game", passive_deletes=True)
 
     # TODO: `Game.has` method for verifying that an object is the child of a given game?
 
     #### game logic
     
-    def delete(self):
+    def delete(self) -> Dict[str, int]:
         """
         Delete this game. Only allowed if game is not live!
+        Everything in the game is deleted with one bulk DELETE statement per table, children first,
+        rather than by loading every row into the session.
+        Every table is deleted from explicitly, so this does not rely on the database enforcing the ON DELETE CASCADE
+        foreign keys (which SQLite does not do by default).
+        Any of the game's players, registrations, etc. already loaded in the session are expunged from it.
+        Nothing is committed.
+        :return: The number of rows deleted from each table, in the order they were deleted.
         """
-        session = self.session
-
-        if not self.live:
-            session.delete(self)
-            [session.delete(reg) for reg in session.scalars(self.registrations.select())]
-            [session.delete(player) for player in session.scalars(self.players.select())]
-            [session.delete(event) for event in session.scalars(self.events.select())]
-
-            #session.commit()
-        else:
+        if self.live:
             raise LiveGameError(f"Cannot delete game {self} as it is live.")
+        session = self.session
+        session.flush()
+
+        event_ids = select(Event.id).where(Event.game_id == self.id)
+        player_ids = select(Player.id).where(Player.game_id == self.id)
+        # children before parents
+        statements = [
+            (EventReference.__table__, EventReference.event_id.in_(event_ids)),
+            (Report.__table__, Report.event_id.in_(event_ids)),
+            (Death.__table__, Death.event_id.in_(event_ids)),
+            (Event.__table__, Event.game_id == self.id),
+            (TargRel.__table__, TargRel.assassin_id.in_(player_ids) | TargRel.target_id.in_(player_ids)),
+            (Pseudonym.__table__, Pseudonym.game_id == self.id),
+            (Assassin.__table__, Assassin.__table__.c.id.in_(player_ids)),
+            (Police.__table__, Police.__table__.c.id.in_(player_ids)),
+            (Player.__table__, Player.game_id == self.id),
+            (Registration.__table__, Registration.game_id == self.id),
+            (Outbox.__table__, Outbox.game_id == self.id),
+            (Game.__table__, Game.id == self.id),
+        ]
+        counts = {}
+        for table, criterion in statements:
+            counts[table.name] = session.execute(delete(table).where(criterion)).rowcount
+
+        for obj in list(session.identity_map.values()):
+            if obj is self or attributes.instance_dict(obj).get("game_id") == self.id:
+                session.expunge(obj)
+        DeathTimeline.invalidate(session)
+        return counts
 
     # TODO: when Registration and Player merged, replace with add_player
     def add_player_from_reg(self, registration: Registration) -> Player:
@@ -102,146 +142,255 @@ class Game(Base):
 
         return newplayer
 
-    def _assign_targets_one_pass(self) -> bool:
+    def import_registrations(self, rows: Iterable[Dict[str, str]], enforce_unique_email: bool = True) -> "ImportResult":
         """
-        One pass of the target-assignment algorithm. This will be repeated until it returns `False`
-        :return: bool value of whether this function should be called again.
+        Validates many rows of registration data at once and adds the valid ones to the game as players,
+        using a handful of set-based queries and bulk inserts rather than several queries per row
+        (see `bulk_import.RegistrationImporter`). Nothing is committed.
+        :param rows: Dicts mapping Registration field names (e.g. "realname", "email") to values,
+        such as the rows of a csv.DictReader.
+        :param enforce_unique_email: Whether to reject rows whose email is already registered. Defaults to `True`.
+        :return: An ImportResult of the accepted and rejected rows.
         """
-        session = self.session # only fetch this once...
+        from .bulk_import import RegistrationImporter
+        return RegistrationImporter(self, enforce_unique_email).import_rows(rows)
 
-        # subquery which counts the number of targets a given assassin has
-        count_targs = (
-            select(func.count(TargRel.assassin_id))
-                .where(TargRel.assassin_id == Assassin.id)
-                .scalar_subquery()
-        )
-        # subquery which counts the number of assassins a given assassin has
-        count_asses = (
-            select(func.count(TargRel.assassin_id))
-                .where(TargRel.target_id == Assassin.id)
-                .scalar_subquery()
-        )
-
-        # fetch all alive assassins in this game with fewer than `n_targs` targets
-        need_targs = session.scalars(select(Assassin.id)
-                                     .filter_by(alive=True, game_id=self.id)
-                                     .where(count_targs < self.n_targs)
-                                     )
-        # queries all alive assassins in this game with fewer than `n_targs` assassins,
-        # then turns this into a list so that we can call random.choice on it
-        need_asses = list(session.scalars(select(Assassin.id)
-                                          .filter_by(alive=True)
-                                          .where(count_asses < self.n_targs)
-                                          ).fetchall())
-
-        #cont = False # whether to continue - will be set to True later iff need_targs is nonempty
-        # TODO: make this require girth-3
-        # TODO: also, have temporary store of problematic choices so that we don't keep picking them,
-        #  and if we run out of choices we can 're-roll'
-        to_add = []
-        for a in need_targs:
-            print(f"Finding a target for {a}... ", end="")
-            #cont = True
-            ok = False
-            while not ok:
-                # choose a target from the assassins who have an insufficient number targetting them
-                t = random.choice(need_asses)
-                # disallow self-targetting
-                if t == a:
-                    continue
-                # check if `a` and `t` already have a targetting relation, in either direction
-                # in which case disallow `t` as a choice of target
-                res = session.scalars(select(TargRel)
-                                      .where(
-                    or_(
-                        and_(TargRel.assassin_id == a, TargRel.target_id == t),
-                        #and_(TargRel.assassin_id == t, TargRel.target_id == a)
-                    )
-                                        )
-                ).one_or_none()
-                if res is not None:
-                    continue
-                ok = True
-                break
-            print(f"chose {t}.")
-            # set `a` to target `t` now that it has been verified as ok
-            to_add.append(TargRel(assassin_id=a, target_id=t))
-            need_asses.remove(t)
-
-        session.add_all(to_add)
-        return (len(to_add) > 0)
-
-    def assign_targets(self):
+    def assign_targets(self, rng: Optional[random.Random] = None) -> AssignmentReport:
         """
         Assigns targets to assassins in this game who have fewer than the number of targets required by the game settings (`n_targs`),
         choosing randomly from the assassins who have fewer than the requisite number of people targetting them.
-        Currently, reflexive and symmetric targetting relations are forbidden,
-        but the "girth > 3" requirement of the original AutoUmpire is not yet implemented.
+        The whole targetting graph is loaded once and solved in memory (see `targetting.TargettingGraph`),
+        then the new targetting relations are written back with a single bulk insert.
+        Reflexive and duplicate targetting relations are forbidden,
+        as are any that would create a targetting cycle shorter than the game's `min_girth`.
+        :param rng: The random.Random instance to choose targets with. Defaults to the `random` module's global instance.
+        :return: An AssignmentReport listing the targetting relations added and the number of re-rolls needed.
+        """
+        session = self.session
+        graph = TargettingGraph.load(session, self.id, self.min_girth)
+        report = graph.assign(self.n_targs, rng=rng)
+        graph.write(session)
+        if report.unfilled > 0:
+            warn(f"Could not assign {report.unfilled} target(s) without breaking the targetting constraints.")
+        return report
+
+    def mark_dead(self, victim: Player):
+        """
+        Marks `victim` as dead, and marks the game's targets as needing reassignment,
+        without reassigning anything yet. Call `reassign_targets` once every death has been recorded,
+        so that several deaths cost a single reassignment.
+        :param victim: The Player who died. Nothing is done unless they are an Assassin.
         """
-        # TODO: store which players got new targets
-        while self._assign_targets_one_pass():
-            pass
+        if isinstance(victim, Assassin):
+            victim.alive = False
+            self.targets_dirty = True
 
-    def start(self):
+    def reassign_targets(self, rng: Optional[random.Random] = None) -> AssignmentReport:
+        """
+        Incrementally repairs the targetting graph after the deaths recorded by `mark_dead` since the last reassignment,
+        rather than re-running the whole target-assignment algorithm.
+        The victims are all removed from the targetting graph at once,
+        then their former targets are handed out to their former assassins, respecting the usual constraints.
+        Only the victims' neighbourhoods in the targetting graph are loaded, so the cost does not grow with the game.
+        If the constraints cannot be satisfied locally (e.g. the only way to fill a hole would close a short cycle),
+        every assassin's targets are reassigned from scratch instead (see `reassign_all_targets`).
+        Nothing is done unless the game's targets are marked as needing reassignment (`targets_dirty`).
+        :param rng: The random.Random instance to choose targets with. Defaults to the `random` module's global instance.
+        :return: An AssignmentReport listing the targetting relations added.
+        """
+        if not self.targets_dirty:
+            return AssignmentReport()
+        session = self.session
+        session.flush()
+
+        # the dead assassins still in the targetting graph
+        dead = select(Assassin.id).filter_by(game_id=self.id, alive=False)
+        victim_ids = session.scalars(select(TargRel.assassin_id).where(TargRel.assassin_id.in_(dead))
+                                     .union(select(TargRel.target_id).where(TargRel.target_id.in_(dead))))
+        graph, former_assassins, former_targets = TargettingGraph.detach(session, victim_ids, self.min_girth)
+        report = graph.assign(self.n_targs, hunters=former_assassins, hunted=former_targets, rng=rng)
+        graph.write(session)
+
+        if report.unfilled > 0:
+            rerolls = report.rerolls
+            report = self.reassign_all_targets(rng)
+            report.rerolls += rerolls
+        self.targets_dirty = False
+        return report
+
+    def reassign_all_targets(self, rng: Optional[random.Random] = None) -> AssignmentReport:
+        """
+        Deletes every targetting relation in this game and assigns targets from scratch (see `assign_targets`).
+        Starting from an empty targetting graph, every alive assassin is given `n_targs` targets whenever that is possible
+        (see `targetting.TargettingGraph.can_fill`).
+        :param rng: The random.Random instance to choose targets with. Defaults to the `random` module's global instance.
+        :return: An AssignmentReport listing the targetting relations added.
+        """
+        session = self.session
+        session.execute(delete(TargRel).where(TargRel.assassin_id.in_(select(Assassin.id).filter_by(game_id=self.id))))
+        for obj in list(session.identity_map.values()):
+            if isinstance(obj, Assassin) and attributes.instance_dict(obj).get("game_id") == self.id:
+                session.expire(obj, ["targets", "assassins"])
+        return self.assign_targets(rng)
+
+    def repair_targets_after(self, victim: Player) -> AssignmentReport:
+        """
+        Marks `victim` as dead and reassigns targets straight away.
+        This is `mark_dead` followed by `reassign_targets`.
+        :param victim: The Player who died. Nothing is done unless they are an Assassin.
+        :return: An AssignmentReport listing the targetting relations added.
+        """
+        self.mark_dead(victim)
+        return self.reassign_targets()
+
+    def start(self, rng: Optional[random.Random] = None):
         """
         Starts the game of assassins -- i.e. gives initial competence, and assigns initial targets.
+        Every assassin's competence deadline is set with a single UPDATE, without loading the assassins,
+        then the targets are assigned in memory and written back with a single bulk insert (see `assign_targets`).
         Does not email players, in case of mistake -- the Game.send_updates method should be invoked seperately for this.
+        Nothing is committed.
+        :param rng: The random.Random instance to choose targets with. Defaults to the `random` module's global instance.
         """
         session = self.session
-        assassins = session.scalars(select(Assassin).filter_by(game_id=self.id))
+        session.flush()
 
-        # CONCURRENTLY set initial competence
-        # TODO: use sqlalchemy insert?
+        # set initial competence
         inital_deadline = datetime.now(timezone.utc) + self.initial_competence
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            executor.map(lambda a: setattr(a, "competence_deadline", inital_deadline), assassins)
+        assassins = Assassin.__table__
+        session.execute(update(assassins)
+                        .where(assassins.c.id.in_(select(Player.id).where(Player.game_id == self.id)))
+                        .values(competence_deadline=inital_deadline))
+        for obj in list(session.identity_map.values()):
+            if isinstance(obj, Assassin) and attributes.instance_dict(obj).get("game_id") == self.id:
+                session.expire(obj, ["competence_deadline"])
 
         # assign initial targets
-        self.assign_targets()
-        print("Targets assigned.")
+        report = self.assign_targets(rng)
+        print(f"Targets assigned ({report.rerolls} re-rolls needed).")
 
         # mark as live
         self.live = True
         self.started = datetime.now(timezone.utc)
 
-    def send_updates(self, message: str = ""):
+    def queue_updates(self, message: str = "", cause: Optional[str] = None,
+                      assassin_ids: Optional[Iterable[int]] = None) -> List[Outbox]:
         """
+        Renders an update email for every alive assassin, giving their details, targets and competence deadline,
+        and adds them to the outbox (see `Outbox`) to be sent later by `dispatch_updates`.
+        The emails are rendered from one eager query for the assassins, their targets and registrations.
+        Any pending target reassignment (see `reassign_targets`) is done first, so that the emails are up to date.
+        Nothing is committed, so the emails are only recorded if the change that caused them is committed too.
         :param message: The message body to send along with the updates.
+        :param cause: What caused the updates, e.g. "start". An update which has already been enqueued
+        for the same cause is not enqueued again. Defaults to a fresh cause, so that the updates are always enqueued.
+        :param assassin_ids: If given, only update the assassins with these ids.
+        :return: The newly-enqueued outbox entries.
         """
         session = self.session
+        self.reassign_targets()
+        if cause is None:
+            cause = f"update:{datetime.now(timezone.utc).isoformat()}"
+
+        stmt = (self.assassins.select().filter_by(alive=True)
+                .options(selectinload(Assassin.reg), selectinload(Assassin.targets).selectinload(Assassin.reg)))
+        if assassin_ids is not None:
+            stmt = stmt.where(Assassin.id.in_(list(assassin_ids)))
+        messages = [a.render_update(message) for a in session.scalars(stmt)]
+        return Outbox.enqueue(session, self.id, messages, cause)
+
+    def dispatch_updates(self, **kwargs) -> "DispatchReport":
+        """
+        Sends this game's pending emails from the outbox, committing the session as it goes.
+        Keyword arguments are passed to `Outbox.dispatch_outbox`.
+        :return: A DispatchReport of what was sent.
+        """
+        return dispatch_outbox(self.session, game_id=self.id, **kwargs)
 
-        # fetch alive assassins in the game
-        assassins = session.scalars(self.assassins.select().filter_by(alive=True))
+    def send_updates(self, message: str = "") -> "DispatchReport":
+        """
+        Emails every alive assassin their details, targets and competence deadline, straight away.
+        This is `queue_updates` followed by `dispatch_updates`, so it commits the session.
+        :param message: The message body to send along with the updates.
+        :return: A DispatchReport of what was sent.
+        """
+        self.queue_updates(message)
+        return self.dispatch_updates()
 
-        # concurrently call the send_update method of each live assassin
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            executor.map(lambda a: a.send_update(message), assassins)
+    def _load_events_for_render(self, stmt: Select) -> List[Event]:
+        """
+        Runs a select of this game's events, eager-loading their reports,
+        then batch-loads every pseudonym they reference (see `Event.preload_references`),
+        so that rendering the events does not query the database once per reference.
+        :param stmt: A select of Event objects.
+        :return: The list of selected events.
+        """
+        session = self.session
+        events = session.scalars(stmt.options(selectinload(Event.reports))).all()
+        preload_references(session, events)
+        return events
 
     def generate_headlines(self) -> str:
-        from .templates import env
-        template = env.get_template("headlines.jinja")
+        from .templates import templates
+        template = templates["headlines.jinja"]
 
-        events = self.session.scalars(self.events.select().order_by(Event.datetimestamp))
+        events = self._load_events_for_render(self.events.select().order_by(Event.datetimestamp))
         return template.render(events=events)
 
-    def events_in_week(self, week_n: int) -> ScalarResult[Event]:
+    def week_of(self, t: datetime) -> int:
         """
-        :param week_n: The week number to query events in.
-        :return: The result of querying Event objects whose datetimestamp falls in week_n
+        Weeks of the game run from midnight on the day the game started, and are numbered from 1.
+        Anything before the game started (e.g. events recorded during signups) counts as week 1.
+        :param t: The datetime to find the week of. The game must have started.
+        :return: The number of the week of the game in which `t` falls.
+        """
+        return max(1, 1 + (t.date() - self.started.date()).days // 7)
+
+    def week_bounds(self, week_n: int) -> Tuple[datetime, datetime]:
+        """
+        :param week_n: The week number. The game must have started.
+        :return: (start, end) of week `week_n`, such that `week_of(t) == week_n` for every `t` with `start <= t < end`.
+        Week 1 starts at `datetime.min`, since it includes everything before the game started.
         """
         d = self.started
-        upper_bound = datetime(year=d.year, month=d.month, day=d.day) + timedelta(weeks=week_n)
-        lower_bound = upper_bound - timedelta(weeks=1)
+        lower_bound = datetime(year=d.year, month=d.month, day=d.day) + timedelta(weeks=week_n - 1)
+        return (datetime.min if week_n == 1 else lower_bound), lower_bound + timedelta(weeks=1)
 
-        return self.session.scalars( self.events.select().where(
+    def _select_events_in_week(self, week_n: int) -> Select:
+        """
+        :param week_n: The week number to query events in.
+        :return: A select of the Event objects whose datetimestamp falls in week_n
+        """
+        lower_bound, upper_bound = self.week_bounds(week_n)
+
+        return self.events.select().where(
             and_(lower_bound <= Event.datetimestamp, Event.datetimestamp < upper_bound)
-        ))
+        )
+
+    def events_in_week(self, week_n: int) -> ScalarResult[Event]:
+        """
+        :param week_n: The week number to query events in.
+        :return: The result of querying Event objects whose datetimestamp falls in week_n
+        """
+        return self.session.scalars(self._select_events_in_week(week_n))
 
     def generate_news_page(self, week_n) -> str:
-        from .templates import env
-        template = env.get_template("news.jinja")
+        from .templates import templates
+        template = templates["news.jinja"]
 
-        return template.render(events=self.events_in_week(week_n), week_n=week_n)
+        events = self._load_events_for_render(self._select_events_in_week(week_n).order_by(Event.datetimestamp))
+        return template.render(events=events, week_n=week_n)
+
+    def build_site(self, out_dir: str, force: bool = False) -> "BuildReport":
+        """
+        Writes the headlines page and the weekly news pages to `out_dir`,
+        only re-rendering the pages whose events have changed since the last build (see `static_site.build_site`).
+        :param out_dir: The directory to write the site to.
+        :param force: Whether to rebuild every page regardless of what has changed.
+        :return: A BuildReport listing the pages written.
+        """
+        from .static_site import build_site
+        return build_site(self, out_dir, force)
 
     def is_kill_licit(self, killer: Player, victim: Player):
         """
@@ -0,0 +1,205 @@
+"""
+Outbox.py
+
+Defines the Outbox class, a durable queue of rendered emails, and `dispatch_outbox`, which drains it.
+
+Emails are enqueued in the same transaction as the game change that caused them (e.g. starting the game or a kill),
+so they are recorded if and only if the change is committed.
+They are then sent by `dispatch_outbox`, which records the outcome of every send,
+so a dispatch that is interrupted partway can simply be run again without re-sending what was already sent.
+Delivery is at-least-once: an interruption between a send and the commit of its batch may cause that batch to be re-sent.
+Only one dispatcher should be run at a time.
+"""
+
+import concurrent.futures
+import hashlib
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone, timedelta
+from typing import Optional, Iterable, List
+from sqlalchemy import ForeignKey, DateTime, Index, select, func, or_
+from sqlalchemy.orm import Mapped, mapped_column, relationship, Session
+from .Base import Base
+from .enums import OutboxStatus
+from .config import config
+from .mail import OutgoingMessage, SMTPPool, RateLimiter, get_transport
+
+
+def idempotency_key(game_id: int, cause: str, message: OutgoingMessage) -> str:
+    """
+    :param game_id: The id of the game the message belongs to.
+    :param cause: What caused the message to be sent, e.g. "start".
+    :param message: The message.
+    :return: A key identifying the message, so that the same message for the same cause is only ever enqueued once.
+    """
+    parts = [str(game_id), cause, message.to, message.subject, message.mimetype, message.body]
+    return hashlib.sha256("\0".join(parts).encode()).hexdigest()
+
+
+class Outbox(Base):
+    """
+    Outbox class
+
+    An email waiting in (or sent from) the outbox. An entry has
+    - The rendered message (recipient, subject, body and MIME type)
+    - An idempotency key (see `idempotency_key`), which is unique
+    - A status, as an enums.OutboxStatus
+    - The number of attempts made to send it, the last error raised while sending, and when to next try to send it
+    """
+    __tablename__ = "outbox"
+    # for finding the pending messages to dispatch
+    __table_args__ = (Index("ix_outbox_status_game_id", "status", "game_id"),)
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    game_id: Mapped[int] = mapped_column(ForeignKey("games.id", ondelete="CASCADE"))
+    idempotency_key: Mapped[str] = mapped_column(unique=True)
+
+    recipient: Mapped[str]
+    subject: Mapped[str]
+    body: Mapped[str]
+    mimetype: Mapped[str] = mapped_column(default="text")
+
+    status: Mapped[OutboxStatus] = mapped_column(default=OutboxStatus.PENDING)
+    attempts: Mapped[int] = mapped_column(default=0)
+    last_error: Mapped[Optional[str]]
+    created: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    next_attempt: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    sent_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+
+    game: Mapped["Game"] = relationship(back_populates="outbox")
+
+    @classmethod
+    def enqueue(cls, session: Session, game_id: int, messages: Iterable[OutgoingMessage], cause: str) -> List["Outbox"]:
+        """
+        Adds messages to the outbox, skipping any that have already been enqueued for the same cause.
+        Nothing is sent, and nothing is committed -- the messages are committed along with the rest of the session.
+        :param session: The sqlalchemy.orm.Session to add the messages to.
+        :param game_id: The id of the game the messages belong to.
+        :param messages: The messages to enqueue.
+        :param cause: What caused the messages to be sent, e.g. "start" or "event:12".
+        :return: The newly-enqueued entries.
+        """
+        keyed = {}
+        for m in messages:
+            keyed.setdefault(idempotency_key(game_id, cause, m), m)
+        if not keyed:
+            return []
+        existing = set(session.scalars(select(cls.idempotency_key).where(cls.idempotency_key.in_(keyed))))
+
+        entries = [cls(game_id=game_id, idempotency_key=k, recipient=m.to, subject=m.subject, body=m.body,
+                       mimetype=m.mimetype)
+                   for k, m in keyed.items() if k not in existing]
+        session.add_all(entries)
+        return entries
+
+    def message(self) -> OutgoingMessage:
+        """
+        :return: This entry as a plain OutgoingMessage, which can be sent from any thread.
+        """
+        return OutgoingMessage(to=self.recipient, body=self.body, subject=self.subject, mimetype=self.mimetype)
+
+
+@dataclass
+class DispatchReport:
+    """
+    Summary of a run of `dispatch_outbox`.
+        sent        -   The number of messages sent.
+        retried     -   The number of failed sends that will be retried later.
+        failed      -   The number of messages given up on after `max_attempts` failed sends.
+        backlog     -   The number of messages still waiting to be sent after the run.
+        elapsed     -   Time taken, in seconds.
+    """
+    sent: int = 0
+    retried: int = 0
+    failed: int = 0
+    backlog: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def throughput(self) -> float:
+        """
+        :return: The number of messages sent per second.
+        """
+        return self.sent / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def _try_send(transport: SMTPPool, limiter: RateLimiter, message: OutgoingMessage) -> Optional[Exception]:
+    limiter.wait()
+    try:
+        transport.send_message(message)
+    except Exception as e:
+        return e
+    return None
+
+
+def dispatch_outbox(session: Session, game_id: Optional[int] = None, transport: Optional[SMTPPool] = None,
+                    rate_limit: Optional[float] = None, max_attempts: Optional[int] = None,
+                    retry_delay: timedelta = timedelta(minutes=1), batch_size: int = 50,
+                    limit: Optional[int] = None) -> DispatchReport:
+    """
+    Sends the pending messages in the outbox which are due, in batches,
+    committing the session after each batch so that progress is never lost.
+    Sends within a batch happen concurrently through the SMTP pool, but only the calling thread uses the session.
+    A failed send is retried on a later run, after a delay which doubles with every attempt,
+    until `max_attempts` attempts have been made, after which the message is marked as failed.
+    :param session: The sqlalchemy.orm.Session to use. It is committed after every batch.
+    :param game_id: If given, only send messages belonging to this game.
+    :param transport: The SMTPPool to send through. Defaults to the pool configured in `config.json`.
+    :param rate_limit: The maximum number of messages to send per second.
+    Defaults to the email `rate_limit` config value, or no limit.
+    :param max_attempts: The number of attempts after which to give up on a message.
+    Defaults to the email `max_attempts` config value, or 5.
+    :param retry_delay: How long to wait before retrying a message after its first failed attempt.
+    :param batch_size: The number of messages to send between commits.
+    :param limit: The maximum number of messages to attempt to send. Defaults to no limit.
+    :return: A DispatchReport of what was done.
+    """
+    start = time.perf_counter()
+    email_config = config.get("email", {})
+    if transport is None:
+        transport = get_transport()
+    if rate_limit is None:
+        rate_limit = email_config.get("rate_limit")
+    if max_attempts is None:
+        max_attempts = email_config.get("max_attempts", 5)
+    limiter = RateLimiter(rate_limit)
+    report = DispatchReport()
+
+    pending = select(Outbox).where(Outbox.status == OutboxStatus.PENDING)
+    if game_id is not None:
+        pending = pending.where(Outbox.game_id == game_id)
+
+    attempted = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=transport.size) as executor:
+        while limit is None or attempted < limit:
+            now = datetime.now(timezone.utc)
+            n = batch_size if limit is None else min(batch_size, limit - attempted)
+            batch = session.scalars(pending.where(or_(Outbox.next_attempt.is_(None), Outbox.next_attempt <= now))
+                                    .order_by(Outbox.id).limit(n)).all()
+            if not batch:
+                break
+            attempted += len(batch)
+
+            errors = executor.map(lambda m: _try_send(transport, limiter, m), [e.message() for e in batch])
+
+            now = datetime.now(timezone.utc)
+            for entry, error in zip(batch, errors):
+                entry.attempts += 1
+                if error is None:
+                    entry.status = OutboxStatus.SENT
+                    entry.sent_at = now
+                    entry.last_error = None
+                    report.sent += 1
+                    continue
+                entry.last_error = f"{type(error).__name__}: {error}"
+                if entry.attempts >= max_attempts:
+                    entry.status = OutboxStatus.FAILED
+                    report.failed += 1
+                else:
+                    entry.next_attempt = now + retry_delay * 2 ** (entry.attempts - 1)
+                    report.retried += 1
+            session.commit()
+
+    report.backlog = session.scalar(select(func.count()).select_from(pending.subquery()))
+    report.elapsed = time.perf_counter() - start
+    return report
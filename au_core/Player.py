@@ -8,10 +8,10 @@ and which the Assassin and Police classes inherit from as "types" of players.
 from typing import List, Tuple
 from .Base import Base
 from .Registration import Registration
-from sqlalchemy.orm import Mapped, mapped_column, relationship, load_only
-from sqlalchemy import ForeignKeyConstraint, ForeignKey, select
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy import ForeignKeyConstraint, ForeignKey
 from datetime import datetime
-from .Death import Death
+from .timeline import DeathTimeline
 
 # TODO: uniqueness constraint on reg_id + type? I.e. only one instance of each TYPE of player per person
 class Player(Base):
@@ -35,7 +35,7 @@ class Player(Base):
     reg_id: Mapped[int] = mapped_column(ForeignKey(Registration.id))
     reg: Mapped[Registration] = relationship(foreign_keys=[reg_id])
 
-    game_id: Mapped[int] = mapped_column(ForeignKey("games.id", ondelete="CASCADE"))
+    game_id: Mapped[int] = mapped_column(ForeignKey("games.id", ondelete="CASCADE"), index=True)
     game: Mapped["Game"] = relationship(back_populates="players")
 
     pseudonyms: Mapped[List["Pseudonym"]] = relationship(back_populates="owner", foreign_keys="[Pseudonym.owner_id]",
@@ -48,34 +48,27 @@ class Player(Base):
 
     def dead_at(self, t: datetime) -> bool:
         """
-        Queries deaths to determine whether a player was dead at a given time.
+        Determines whether a player was dead at a given time, using the game's DeathTimeline.
         This is important for correctly rendering Pseudonyms.
+        The timeline is built with one query and then cached on the session until a Death changes,
+        so this does not query the database on every call.
         :param t: The datetime that we are interested in.
         :return: Whether the Player was dead at time t
         """
-        session = self.session
-        res = session.scalars(select(Death).options(load_only(Death.expires, Death.event_id))
-                              .filter_by(victim_id=self.id)
-                              .where((Death.expires.is_(None)) | (Death.expires > t))
-                              )
-        for d in res:
-            if d.event.datetimestamp <= t and (d.expires is None or d.expires > t):
-                return True
-        return False
+        return DeathTimeline.for_game(self.session, self.game_id).dead_at(self.id, t)
 
     def licit_for(self, killer) -> Tuple[bool, str]:
         return (False, "by default")
 
     def HTML_render(self, css_class: str) -> str:
         """
-        Uses the `player.jinja` template to create the HTML rendering of this player,
+        Uses the `player` macro in `macros.jinja` to create the HTML rendering of this player,
         to be used in headlines when they die,
         which reveals all their real name, and all their pseudonyms separated by AKA
         :return: The HTML code for the player to be used in headlines when they die.
         """
-        from .templates import env
-        template = env.get_template("player.jinja")
-        return template.render(player=self, css_class=css_class)
+        from .templates import templates
+        return str(templates.macros().player(self, css_class))
 
     def plaintext_render(self) -> str:
         return " AKA ".join( (p.text for p in self.pseudonyms) ) + f" ({self.reg.realname})"
@@ -34,7 +34,7 @@ class Pseudonym(Base):
     # TODO: change to name to 'css_class' and type to to str
     colour: Mapped[PseudonymColour] = mapped_column(default=PseudonymColour.DEFAULT)
 
-    owner_id: Mapped[int] = mapped_column(ForeignKey(Player.id, ondelete="CASCADE"))
+    owner_id: Mapped[int] = mapped_column(ForeignKey(Player.id, ondelete="CASCADE"), index=True)
     owner: Mapped[Player] = relationship(back_populates="pseudonyms",foreign_keys="[Pseudonym.owner_id,Pseudonym.game_id]")
 
     def reference(self) -> str:
@@ -63,12 +63,11 @@ class Pseudonym(Base):
     # TODO: move rendering to Event class
     def HTML_render(self, css_class: Optional[str] = None) -> str:
         """
-        Uses the `pseudonym.jinja` template to create the HTML rendering of this pseudonym.
+        Uses the `pseudonym` macro in `macros.jinja` to create the HTML rendering of this pseudonym.
         :return: The HTML code for the pseudonym
         """
         if css_class is None:
             css_class = self.colour.value
 
-        from .templates import env
-        template = env.get_template("pseudonym.jinja")
-        return template.render(pseudonym=self, css_class=css_class)
\ No newline at end of file
+        from .templates import templates
+        return str(templates.macros().pseudonym(self, css_class))
\ No newline at end of file
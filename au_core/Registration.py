@@ -4,18 +4,16 @@ Registration.py
 Defines the ORM model `Registration` representing initial player registrations.
 """
 
+from typing import Optional
 from sqlalchemy.orm import Mapped, mapped_column, relationship, deferred, Session
-from sqlalchemy import ForeignKey, select, UniqueConstraint
+from sqlalchemy import ForeignKey, select, UniqueConstraint, Index
 from .Base import Base
 from .enums import RegType, College, WaterStatus
-from .config import config
-from email_validator import validate_email, EmailNotValidError
+from .emails import normalise_email
 from warnings import warn
 
 # imports for sending emails
-from smtplib import SMTP
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from .mail import SMTPPool, OutgoingMessage, get_transport
 
 class DuplicateWarning(Warning):
     """
@@ -49,7 +47,10 @@ class Registration(Base):
         (may want to add `seed` for more intelligent targetting, and `discord_id` for discord integration)
     """
     __tablename__ = "registrations"
-    __table_args__ = (UniqueConstraint("game_id", "initial_pseudonym"),)
+    __table_args__ = (UniqueConstraint("game_id", "initial_pseudonym"),
+                      # for the duplicate checks in validation
+                      Index("ix_registrations_game_id_email", "game_id", "email"),
+                      Index("ix_registrations_game_id_realname", "game_id", "realname"))
 
     id: Mapped[int] = mapped_column(primary_key=True)
     game_id = mapped_column(ForeignKey("games.id", ondelete="CASCADE"))
@@ -71,27 +72,20 @@ class Registration(Base):
 
     # TODO: separate default subject into a config option & game setting
     # TODO: (much much later...) discord integration
-    def send_email(self, body: str, subject: str = "Assassins' Guild Update", mimetype: str = "text"):
+    def send_email(self, body: str, subject: str = "Assassins' Guild Update", mimetype: str = "text",
+                   transport: Optional[SMTPPool] = None):
         """
         Sends an email to this registration.
         :param body: Body of the email to send
         :param subject: Subject of the email to send (defaults to `Assassins Update`)
         :param mimetype: MIME type of the body (defaults to `text`)
+        :param transport: The SMTPPool to send through. Defaults to the pool configured in `config.json`.
         :return:
         """
-        # prepare the email
-        message = MIMEMultipart()
-        message['Subject'] = subject
-        message['From'] = config["email"]["from"]
-        message['To'] = self.email
-        message.attach(MIMEText(body, mimetype))
-        msg = message.as_string()
-
-        # send the email with SMTP
-        with SMTP(host=config["email"]["host"], port=config["email"]["port"]) as server:
-            server.starttls()
-            server.login(config["email"]["username"], config["email"]["password"])
-            server.sendmail(config["email"]["from"], self.email, msg)
+        # send the email through a pooled SMTP connection
+        if transport is None:
+            transport = get_transport()
+        transport.send_message(OutgoingMessage(to=self.email, body=body, subject=subject, mimetype=mimetype))
 
     def validate(self, enforce_unique_email: bool = True):
         """
@@ -101,25 +95,19 @@ class Registration(Base):
         """
         self.validate_w_session(self.game.session, enforce_unique_email)
 
-    # TODO: get Session from self.Game rather than passing into this method
-    def validate_w_session(self, session: Session, enforce_unique_email: bool = True):
+    def normalise(self):
         """
-        Function to validate the registration
-        Ensures `realname` is nonempty and normalises to title case.
-        Ensures `email` if valid and normalises
-        :param session: The sqlalchemy.orm.session to be used to check for duplicates
-        :param enforce_unique_email: Whether to require the email to be unique. Defaults to `True`. Setting to `False` is useful for testing purposes.
+        Validates and normalises the fields of the registration which can be checked without the database.
+        Ensures `realname`, `address` and `initial_pseudonym` are nonempty, and normalises `realname` to title case.
+        Ensures `email` is valid and normalises it, without checking deliverability (see `emails.check_deliverability`).
+        Converts `college`, `water` and `type` to their enum types.
+        Raises ValueError (or email_validator.EmailNotValidError, a subclass) if the registration is invalid.
         """
         # ensure realname nonempty
         if self.realname in (None, ""):
             raise ValueError("Empty realname")
         # normalise to title case
         self.realname = self.realname.title()
-        # check for duplication, and warn if duplicated
-        # TODO: rewrite using Game.registrations ?
-        res = session.scalars(select(Registration).filter_by(game_id=self.game_id, realname=self.realname)).fetchall()
-        if len(res) > 0:
-            warn(DuplicateWarning(f"{self.realname} is also the name of existing assassin(s) {', '.join(str(a) for a in res)}"))
 
         # ensure address nonempty
         if self.address in (None, ""):
@@ -135,10 +123,30 @@ class Registration(Base):
         self.water = WaterStatus(self.water)
         self.type = RegType(self.type)
 
-        # ensure email valid
-        emailinfo = validate_email(self.email, check_deliverability=False)
-        # normalise email
-        self.email = emailinfo.normalized
+        # ensure email valid and normalise (the result is cached, so re-validating is cheap)
+        self.email = normalise_email(self.email)
+
+        # ensure initial_pseudonym nonempty
+        if self.initial_pseudonym in (None, ""):
+            raise ValueError("Empty initial_pseudonym")
+
+    # TODO: get Session from self.Game rather than passing into this method
+    def validate_w_session(self, session: Session, enforce_unique_email: bool = True):
+        """
+        Function to validate the registration
+        Normalises the registration (see `normalise`), then checks for duplicates in the database.
+        For checking many registrations at once, `bulk_import.RegistrationImporter` is much faster.
+        :param session: The sqlalchemy.orm.session to be used to check for duplicates
+        :param enforce_unique_email: Whether to require the email to be unique. Defaults to `True`. Setting to `False` is useful for testing purposes.
+        """
+        self.normalise()
+
+        # check for duplication, and warn if duplicated
+        # TODO: rewrite using Game.registrations ?
+        res = session.scalars(select(Registration).filter_by(game_id=self.game_id, realname=self.realname)).fetchall()
+        if len(res) > 0:
+            warn(DuplicateWarning(f"{self.realname} is also the name of existing assassin(s) {', '.join(str(a) for a in res)}"))
+
         # check for duplication
         # TODO: rewrite using Game.registrations ?
         res = session.scalars(select(Registration).filter_by(game_id=self.game_id, email=self.email)).fetchall()
@@ -148,9 +156,6 @@ class Registration(Base):
             else:
                 warn(DuplicateWarning(f"{self.email} is also the email of existing assassin(s) {', '.join(str(a) for a in res)}"))
 
-        # ensure initial_pseudonym nonempty
-        if self.initial_pseudonym in (None, ""):
-            raise ValueError("Empty initial_pseudonym")
         # check for duplication and throw error if duplicate
         # TODO: rewrite using Game.registrations ?
         res = session.scalars(select(Registration).filter_by(game_id=self.game_id, initial_pseudonym=self.initial_pseudonym)).one_or_none()
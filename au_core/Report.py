@@ -8,7 +8,9 @@ from sqlalchemy import ForeignKey, DateTime, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from .Base import Base
 from .Pseudonym import Pseudonym
-from .Event import Event, parsing_pattern
+from .Event import Event, ResolvedReference
+from .references import render, referenced_ids
+from typing import FrozenSet, List, Union
 from datetime import datetime
 
 class Report(Base):
@@ -27,7 +29,7 @@ class Report(Base):
     __tablename__ = "reports"
 
     id: Mapped[int] = mapped_column(primary_key=True)
-    event_id = mapped_column(ForeignKey(Event.id, ondelete="CASCADE"))
+    event_id = mapped_column(ForeignKey(Event.id, ondelete="CASCADE"), index=True)
     author_id = mapped_column(ForeignKey(Pseudonym.id))
     body: Mapped[str]
 
@@ -44,14 +46,27 @@ class Report(Base):
         """
         return self.author.css_class(self.event.datetimestamp)
 
+    def body_parts(self) -> List[Union[str, ResolvedReference]]:
+        """
+        :return: The parts of the body, for rendering in a template (see `Event.HTML_parts`).
+        """
+        return self.event.HTML_parts(self.body)
+
     def HTML_body(self) -> str:
         """
         :return: The HTML-formatted body of this report.
         """
-        return parsing_pattern.sub(lambda m: self.event._HTML_repl_ref(m), self.body)
+        from .templates import templates
+        return str(templates.macros().parts(self.body_parts()))
 
     def plaintext_body(self):
         """
         :return: The parsed plaintext body of this report.
         """
-        return parsing_pattern.sub(lambda m: self.event._plaintext_repl_ref(m), self.body)
\ No newline at end of file
+        return render(self.body, self.event._plaintext_render_ref)
+
+    def referenced_ids(self) -> FrozenSet[int]:
+        """
+        :return: The ids of the pseudonyms referenced in the body of this report (not including the author).
+        """
+        return referenced_ids(self.body)
\ No newline at end of file
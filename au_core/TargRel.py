@@ -22,5 +22,7 @@ class TargRel(Base):
     target_id = mapped_column(ForeignKey("assassins.id", ondelete="CASCADE"), primary_key=True)
     target: Mapped["Assassin"] = deferred(relationship(foreign_keys=[target_id]))
 
-    assassin_id = mapped_column(ForeignKey("assassins.id", ondelete="CASCADE"), primary_key=True)
+    # the primary key (target_id, assassin_id) serves lookups by target,
+    # so assassin_id gets its own index for lookups by assassin (i.e. of an assassin's targets)
+    assassin_id = mapped_column(ForeignKey("assassins.id", ondelete="CASCADE"), primary_key=True, index=True)
     assassin: Mapped["Assassin"] = deferred(relationship(foreign_keys=[assassin_id]))
\ No newline at end of file
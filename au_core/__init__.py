@@ -18,9 +18,12 @@ from .Pseudonym import Pseudonym
 from .Event import Event
 from .Report import Report
 from .Death import Death
+from .EventReference import EventReference
+from .Outbox import Outbox, dispatch_outbox
 
-# registers tables for all the ORM models derived from Base
-Base.metadata.create_all(db.engine)
+# checks the database is at the current schema version (creating the schema in an empty database)
+from . import migrations
+schema_up_to_date = migrations.check_schema(db.engine)
 
 # module-level functions
 from typing import Optional, Union, Callable, Any, TYPE_CHECKING
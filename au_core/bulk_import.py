@@ -0,0 +1,196 @@
+"""
+bulk_import.py
+
+Set-based import of many registrations at once, e.g. from a signup sheet.
+
+Validating registrations one at a time (`Registration.validate_w_session`) costs three queries per registration,
+and `Game.add_player_from_reg` then inserts each Registration, Player and Pseudonym separately.
+The `RegistrationImporter` instead normalises every row in memory, checks for duplicates both within the rows
+and against the database with one `IN (...)` query per key, and inserts the accepted rows with one bulk insert per table.
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Set
+from warnings import warn
+from sqlalchemy import select, insert
+from .enums import RegType
+from .Registration import Registration, DuplicateWarning
+from .Player import Player
+from .Assassin import Assassin
+from .Police import Police
+from .Pseudonym import Pseudonym
+from .emails import check_deliverability
+
+# the fields of a Registration which are read from each row
+REGISTRATION_FIELDS = ("realname", "email", "initial_pseudonym", "college", "address", "water", "notes", "type")
+
+
+@dataclass
+class RejectedRow:
+    """
+    A row which could not be imported.
+        index   -   The position of the row in the rows passed to the importer.
+        row     -   The row, as it was passed to the importer.
+        reason  -   Why the row was rejected.
+    """
+    index: int
+    row: Dict[str, str]
+    reason: str
+
+
+@dataclass
+class ImportResult:
+    """
+    The outcome of validating (and possibly inserting) a batch of rows.
+        accepted    -   The normalised Registrations of the rows which passed validation.
+                        These are never added to the session; the rows are inserted in bulk instead.
+        rejected    -   The rows which failed validation, with the reasons.
+        player_ids  -   The ids of the Players created for the accepted rows, if they have been inserted.
+    """
+    accepted: List[Registration] = field(default_factory=list)
+    rejected: List[RejectedRow] = field(default_factory=list)
+    player_ids: List[int] = field(default_factory=list)
+
+
+class RegistrationImporter:
+    """
+    RegistrationImporter class
+
+    Validates and inserts rows of registration data into a game.
+    The importer remembers the emails, pseudonyms and names it has accepted,
+    so rows can be passed to it in several batches (e.g. chunks of a large file)
+    and duplicates between batches are still caught.
+    """
+
+    def __init__(self, game: "Game", enforce_unique_email: bool = True, check_deliverability: bool = False):
+        """
+        :param game: The Game to import registrations into.
+        :param enforce_unique_email: Whether to reject rows whose email is already registered. Defaults to `True`.
+        :param check_deliverability: Whether to reject rows whose email's domain cannot receive email.
+        This needs DNS lookups, which are done concurrently, once per distinct domain in each batch of rows.
+        Defaults to `False`.
+        """
+        self.game = game
+        self.session = game.session
+        self.enforce_unique_email = enforce_unique_email
+        self.check_deliverability = check_deliverability
+        # values accepted so far (whether or not they have been inserted yet)
+        self._emails: Set[str] = set()
+        self._pseudonyms: Set[str] = set()
+        self._realnames: Set[str] = set()
+
+    def _existing(self, column, values: Set[str]) -> Set[str]:
+        """
+        :return: The members of `values` already present in `column` for this game.
+        """
+        if not values:
+            return set()
+        entity = column.class_
+        return set(self.session.scalars(select(column).where(entity.game_id == self.game.id, column.in_(values))))
+
+    def validate(self, rows: Iterable[Dict[str, str]], first_index: int = 0) -> ImportResult:
+        """
+        Normalises and validates rows of registration data, without writing anything to the database.
+        Rows are rejected if they are invalid (see `Registration.normalise`), or undeliverable (if checked),
+        if their initial pseudonym is already taken, or if their email is already registered
+        (when `enforce_unique_email` is set), either in the game or by an earlier row.
+        A duplicated real name only gives a DuplicateWarning.
+        :param rows: Dicts mapping the names in `REGISTRATION_FIELDS` to values. Other keys are ignored.
+        :param first_index: The index to give the first row in any RejectedRows.
+        :return: An ImportResult of the accepted and rejected rows.
+        """
+        result = ImportResult()
+        candidates = []
+        for i, row in enumerate(rows, start=first_index):
+            reg = Registration(game_id=self.game.id, **{f: row.get(f) for f in REGISTRATION_FIELDS})
+            try:
+                reg.normalise()
+            except ValueError as e:
+                result.rejected.append(RejectedRow(i, row, str(e)))
+                continue
+            candidates.append((i, row, reg))
+
+        if self.check_deliverability:
+            undeliverable = check_deliverability(reg.email for i, row, reg in candidates)
+            for i, row, reg in candidates:
+                if reg.email in undeliverable:
+                    result.rejected.append(RejectedRow(i, row, undeliverable[reg.email]))
+            candidates = [c for c in candidates if c[2].email not in undeliverable]
+
+        # one query per key for the values already in the database
+        emails = {reg.email for i, row, reg in candidates}
+        pseudonyms = {reg.initial_pseudonym for i, row, reg in candidates}
+        taken_emails = self._existing(Registration.email, emails)
+        taken_pseudonyms = (self._existing(Registration.initial_pseudonym, pseudonyms)
+                            | self._existing(Pseudonym.text, pseudonyms))
+        taken_realnames = self._existing(Registration.realname, {reg.realname for i, row, reg in candidates})
+
+        for i, row, reg in candidates:
+            if reg.initial_pseudonym in self._pseudonyms or reg.initial_pseudonym in taken_pseudonyms:
+                result.rejected.append(RejectedRow(i, row, f"{reg.initial_pseudonym} is already an initial pseudonym"))
+                continue
+            if reg.email in self._emails or reg.email in taken_emails:
+                if self.enforce_unique_email:
+                    result.rejected.append(RejectedRow(i, row, f"{reg.email} is already registered"))
+                    continue
+                warn(DuplicateWarning(f"{reg.email} is also the email of another registration"))
+            if reg.realname in self._realnames or reg.realname in taken_realnames:
+                warn(DuplicateWarning(f"{reg.realname} is also the name of another registration"))
+
+            self._pseudonyms.add(reg.initial_pseudonym)
+            self._emails.add(reg.email)
+            self._realnames.add(reg.realname)
+            result.accepted.append(reg)
+        return result
+
+    def insert(self, registrations: List[Registration]) -> List[int]:
+        """
+        Inserts validated registrations into the game, along with a Player (an Assassin or Police, by type)
+        and an initial Pseudonym for each, using one bulk insert per table.
+        Nothing is committed.
+        :param registrations: Registrations accepted by `validate`.
+        :return: The ids of the created Players, in the same order as `registrations`.
+        """
+        if not registrations:
+            return []
+        session = self.session
+        game_id = self.game.id
+
+        # the order of RETURNING rows is not guaranteed (and asking for it makes SQLite insert one row at a time),
+        # so the generated ids are matched up by a unique column instead:
+        # initial_pseudonym for registrations, and reg_id for players
+        reg_ids = dict((pseudonym, reg_id) for reg_id, pseudonym in session.execute(
+            insert(Registration).returning(Registration.id, Registration.initial_pseudonym),
+            [{f: getattr(r, f) for f in REGISTRATION_FIELDS} | {"game_id": game_id} for r in registrations]
+        ))
+        reg_ids = [reg_ids[r.initial_pseudonym] for r in registrations]
+
+        # the ORM inserts joined-inheritance rows one at a time (to carry each new id over to the subclass table),
+        # so the players table and the subclass tables are inserted into directly
+        constructors = {RegType.FULL: Assassin, RegType.POLICE: Police}
+        player_ids = dict((reg_id, player_id) for player_id, reg_id in session.execute(
+            insert(Player.__table__).returning(Player.id, Player.reg_id),
+            [{"reg_id": reg_id, "game_id": game_id,
+              "type": constructors[r.type].__mapper__.polymorphic_identity}
+             for reg_id, r in zip(reg_ids, registrations)]
+        ))
+        player_ids = [player_ids[reg_id] for reg_id in reg_ids]
+        for reg_type, constructor in constructors.items():
+            values = [{"id": player_id} for player_id, r in zip(player_ids, registrations) if r.type == reg_type]
+            if values:
+                session.execute(insert(constructor.__table__), values)
+
+        session.execute(insert(Pseudonym),
+                        [{"owner_id": player_id, "game_id": game_id, "text": r.initial_pseudonym}
+                         for player_id, r in zip(player_ids, registrations)])
+        return player_ids
+
+    def import_rows(self, rows: Iterable[Dict[str, str]], first_index: int = 0) -> ImportResult:
+        """
+        Validates rows of registration data (see `validate`) and inserts the accepted ones (see `insert`).
+        Nothing is committed.
+        :return: An ImportResult of the accepted and rejected rows, and the ids of the created Players.
+        """
+        result = self.validate(rows, first_index)
+        result.player_ids = self.insert(result.accepted)
+        return result
@@ -6,6 +6,7 @@ Config values are imported from this module under `config`.
 """
 
 import json
+import os
 from pathlib import Path, PurePath
 
 config_path = ( Path(__file__).parent / PurePath("config.json") ).resolve()
@@ -14,8 +15,10 @@ config_path = ( Path(__file__).parent / PurePath("config.json") ).resolve()
 config = {
     "verbose": False,
     "n_targs": 3,
+    "min_girth": 3,
     "initial_competence": 7,
-    "locale": "en_GB"
+    "locale": "en_GB",
+    "template_cache_dir": None
 }
 
 class MissingConfigError(FileNotFoundError):
@@ -32,3 +35,10 @@ for k in _loaded_config:
     config[k] = _loaded_config[k]
 
 del _loaded_config # free up memory
+
+# allow the database (and verbosity) to be overridden without editing config.json,
+# e.g. to point benchmarks at a quiet scratch database
+if "AUTOUMPIRE_DB_ADDRESS" in os.environ:
+    config["db_address"] = os.environ["AUTOUMPIRE_DB_ADDRESS"]
+if "AUTOUMPIRE_VERBOSE" in os.environ:
+    config["verbose"] = os.environ["AUTOUMPIRE_VERBOSE"].lower() in ("1", "true", "yes")
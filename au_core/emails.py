@@ -0,0 +1,99 @@
+"""
+emails.py
+
+Memoised validation of email addresses.
+
+Validating an address with `email_validator` is comparatively slow, and the same addresses are validated again and again
+(e.g. when a signup sheet is re-imported, or a registration is validated by both the CSV loader and `add_player_from_reg`).
+`normalise_email` caches the outcome of validating each raw address, whether that is the normalised address or an error,
+in a bounded LRU cache.
+
+Checking that an address's domain can receive email needs DNS lookups, so it is never done by `normalise_email`.
+Instead `check_deliverability` checks a whole batch of addresses at once, looking up each distinct domain once,
+concurrently, and caching the results.
+"""
+
+import concurrent.futures
+from functools import lru_cache
+from typing import Dict, Iterable, Optional, Tuple, Type
+# email_validator is imported inside the functions below, since it is slow to import and only needed for new addresses
+
+# the maximum number of addresses (and, separately, of domains) whose validation results are cached
+CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _validate(address: str) -> Tuple[Optional[str], Optional[str], Optional[Tuple[Type[Exception], str]]]:
+    """
+    :return: (normalised address, ascii domain, None) if `address` is valid,
+    or (None, None, (exception type, message)) if it is not.
+    The error is cached rather than the exception itself, so that each caller raises a fresh exception.
+    """
+    from email_validator import validate_email, EmailNotValidError
+    try:
+        info = validate_email(address, check_deliverability=False)
+    except EmailNotValidError as e:
+        return None, None, (type(e), str(e))
+    return info.normalized, info.ascii_domain, None
+
+
+def normalise_email(address: str) -> str:
+    """
+    Validates the syntax of an email address (without any DNS lookups), using a cache keyed on the raw address.
+    :param address: The email address to validate.
+    :return: The normalised address.
+    Raises email_validator.EmailNotValidError (a subclass of ValueError) if the address is invalid.
+    """
+    normalised, domain, error = _validate(address)
+    if error is not None:
+        error_type, message = error
+        raise error_type(message)
+    return normalised
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _domain_error(ascii_domain: str, timeout: int) -> Optional[str]:
+    """
+    :return: Why email cannot be delivered to `ascii_domain`, or None if it can.
+    """
+    from email_validator import EmailUndeliverableError
+    from email_validator.deliverability import validate_email_deliverability
+    try:
+        validate_email_deliverability(ascii_domain, ascii_domain, timeout=timeout)
+    except EmailUndeliverableError as e:
+        return str(e)
+    return None
+
+
+def check_deliverability(addresses: Iterable[str], max_workers: int = 8, timeout: int = 15) -> Dict[str, str]:
+    """
+    Checks whether email can be delivered to a batch of addresses, by looking up the DNS records of their domains.
+    Each distinct domain is looked up once, concurrently, and the results are cached.
+    Addresses which are not valid at all are ignored; validate them with `normalise_email`.
+    :param addresses: The addresses to check.
+    :param max_workers: The maximum number of concurrent DNS lookups.
+    :param timeout: The timeout of each DNS lookup, in seconds.
+    :return: A dict mapping each undeliverable address to the reason it is undeliverable.
+    """
+    domains = {}
+    for address in addresses:
+        normalised, domain, error = _validate(address)
+        if error is None:
+            domains.setdefault(domain, []).append(address)
+    if not domains:
+        return {}
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(max_workers, len(domains))) as executor:
+        errors = executor.map(lambda d: _domain_error(d, timeout), domains)
+
+    return {address: error
+            for domain_addresses, error in zip(domains.values(), errors) if error is not None
+            for address in domain_addresses}
+
+
+def clear_cache():
+    """
+    Empties the caches of validation and deliverability results.
+    """
+    _validate.cache_clear()
+    _domain_error.cache_clear()
@@ -27,6 +27,19 @@ class RegType(NiceEnum):
     POLICE = "Police"
 
 
+class OutboxStatus(NiceEnum):
+    """
+    Outbox message status enum
+    Values are
+        PENDING - Waiting to be sent (possibly after a failed attempt)
+        SENT - Sent successfully
+        FAILED - Given up on after too many failed attempts
+    """
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+
+
 class PseudonymColour(NiceEnum):
     """
     Pseudonym colour enum
@@ -81,4 +94,16 @@ class College(NiceEnum):
     JOHNS = "St John's"
     TRIN = "Trinity"
     TIT_HALL = "Trinity Hall"
-    WOLFSON = "Wolfson"
\ No newline at end of file
+    WOLFSON = "Wolfson"
+
+class ReferenceKind(NiceEnum):
+    """
+    Event reference kind enum (see `EventReference`)
+    Values are
+        PSEUDONYM - A <@id> reference, to a pseudonym
+        PLAYER - A <#id> reference, to the player owning a pseudonym
+        AUTHOR - The author of a report
+    """
+    PSEUDONYM = "@"
+    PLAYER = "#"
+    AUTHOR = "author"
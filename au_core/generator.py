@@ -0,0 +1,228 @@
+"""
+generator.py
+
+Populates a game with synthetic players, events, deaths and reports, for load-testing, benchmarks and fixtures.
+
+Everything is generated from a seed, so the same seed and sizes always give the same game,
+and is written with one bulk insert per table rather than through the ORM,
+so that a game of thousands of players and events is generated in seconds.
+"""
+
+import random
+from dataclasses import dataclass
+from datetime import datetime, timezone, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import select, insert, update, func
+from .enums import College, WaterStatus, RegType
+from .Registration import Registration
+from .Player import Player
+from .Assassin import Assassin
+from .Police import Police
+from .Pseudonym import Pseudonym
+from .Event import Event
+from .Report import Report
+from .Death import Death
+from .EventReference import rebuild_references
+from .bulk_import import RegistrationImporter
+from .timeline import DeathTimeline
+
+# bump this whenever a given seed and sizes generate different data, so that benchmark results are not compared across it
+GENERATOR_VERSION = 1
+
+FIRST_NAMES = ["Alex", "Sam", "Charlie", "Jo", "Robin", "Kit", "Ash", "Max", "Frankie", "Morgan", "Jamie", "Rowan",
+               "Eden", "Rene", "Sasha", "Toni"]
+SURNAMES = ["Smith", "Jones", "Taylor", "Brown", "Williams", "Wilson", "Evans", "Patel", "Khan", "Murphy", "Chen", "Okafor"]
+ADJECTIVES = ["Silent", "Crimson", "Soggy", "Midnight", "Dapper", "Sneaky", "Furious", "Gentle", "Electric", "Velvet"]
+NOUNS = ["Otter", "Umbrella", "Punter", "Gargoyle", "Bicycle", "Heron", "Teapot", "Scholar", "Porter", "Duck"]
+
+# headlines, with one, two and more references ({0}, {1}, ... are replaced by references to pseudonyms)
+HEADLINES_1 = ["{0} was seen lurking by the Cam", "{0} staked out the UL tea room", "{0} went into hiding"]
+HEADLINES_2 = ["{0} ambushed {1} outside the library", "{0} attacked {1} with a water pistol",
+               "{0} and {1} fought a duel at dawn", "{0} chased {1} across Parker's Piece"]
+KILL_HEADLINES = ["{0} killed {1}", "{0} drowned {1} in a hail of water balloons", "{0} caught {1} unawares"]
+WITNESSED = " while {} looked on"
+REPORTS = ["Nobody expected that.", "I was there, and {0} was very brave.", "{0} ran past me screaming.",
+           "As {0} said to {1}: never trust a porter."]
+
+# how long a police death lasts before they respawn
+POLICE_DEATH_DURATION = timedelta(hours=24)
+# the proportion of references which reveal the player, rather than just their pseudonym
+REVEAL_PROBABILITY = 0.1
+# the number of events whose references are rebuilt at once
+REFERENCE_CHUNK_SIZE = 500
+
+
+@dataclass
+class GeneratorSizes:
+    """
+    The amount of data to generate.
+        players     -   The number of full players (assassins) to register.
+        police      -   The number of police to register.
+        events      -   The number of events, including those of deaths.
+        refs        -   The number of references to pseudonyms in each headline.
+        deaths      -   The number of deaths, each with its own event.
+                        Assassins die for good, and police deaths expire after `POLICE_DEATH_DURATION`.
+        reports     -   The number of reports, spread across the events.
+        weeks       -   The number of weeks the events are spread over.
+    """
+    players: int = 1000
+    police: int = 50
+    events: int = 500
+    refs: int = 3
+    deaths: int = 100
+    reports: int = 300
+    weeks: int = 3
+
+
+def registrations(rng: random.Random, n_players: int, n_police: int, first: int = 0) -> List[Registration]:
+    """
+    Generates distinct, valid registrations, without adding them to a session.
+    :param rng: The random.Random instance to generate with.
+    :param n_players: The number of full players.
+    :param n_police: The number of police.
+    :param first: The number to start counting from, so that emails and pseudonyms are distinct from earlier ones.
+    :return: The registrations, full players first.
+    """
+    colleges = list(College)
+    waters = list(WaterStatus)
+    regs = []
+    for i in range(first, first + n_players + n_police):
+        reg_type = RegType.FULL if i - first < n_players else RegType.POLICE
+        regs.append(Registration(realname=f"{rng.choice(FIRST_NAMES)} {rng.choice(SURNAMES)}",
+                                 email=f"player{i}@cam.ac.uk",
+                                 initial_pseudonym=f"The {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i}",
+                                 college=rng.choice(colleges),
+                                 address=f"{rng.randint(1, 99)} {rng.choice(SURNAMES)} Court",
+                                 water=rng.choice(waters),
+                                 notes="",
+                                 type=reg_type))
+    return regs
+
+
+def _reference(rng: random.Random, pseudonym_id: int, reveal: Optional[bool] = None) -> str:
+    if reveal is None:
+        reveal = rng.random() < REVEAL_PROBABILITY
+    return f"<{'#' if reveal else '@'}{pseudonym_id}>"
+
+
+def _headline(rng: random.Random, refs: List[str], kill: bool = False) -> str:
+    """
+    :return: A headline referencing each of `refs`, in order. For a kill, the first is the killer and the second the victim.
+    """
+    if kill:
+        template = rng.choice(KILL_HEADLINES)
+    elif len(refs) >= 2:
+        template = rng.choice(HEADLINES_2)
+    elif len(refs) == 1:
+        template = rng.choice(HEADLINES_1)
+    else:
+        return "A quiet day in Cambridge"
+    n = template.count("{")
+    return template.format(*refs[:n]) + "".join(WITNESSED.format(r) for r in refs[n:])
+
+
+def generate_game(game: "Game", seed: int = 0, sizes: Optional[GeneratorSizes] = None,
+                  start: bool = True) -> Dict[str, int]:
+    """
+    Populates a game with synthetic data.
+    Players and police are registered (with the colleges and water statuses spread across the enums), then the game is
+    started, then events are added across the game's first weeks, some of them deaths, along with reports on them.
+    Each table is written with a single bulk insert, then the index of references is rebuilt for the new events,
+    and the targets of the dead assassins reassigned.
+    Nothing is committed.
+    :param game: The Game to populate.
+    :param seed: The seed to generate from. The same seed and sizes give the same data, including targets.
+    :param sizes: How much to generate. Defaults to the GeneratorSizes defaults.
+    :param start: Whether to start the game, if it has not been started, before adding events. Defaults to `True`.
+    If the game is not started, events are dated from now.
+    :return: The number of rows added to each table.
+    """
+    sizes = sizes if sizes is not None else GeneratorSizes()
+    rng = random.Random(seed)
+    session = game.session
+    session.flush()
+    counts = {}
+
+    # players and police
+    first = session.scalar(select(func.count(Registration.id)).filter_by(game_id=game.id))
+    player_ids = RegistrationImporter(game).insert(registrations(rng, sizes.players, sizes.police, first))
+    counts["players"] = len(player_ids)
+
+    if start and not game.live:
+        game.start(rng)
+    started = game.started if game.started is not None else datetime.now(timezone.utc)
+
+    # every pseudonym in the game, with the type of its owner
+    pseudonyms: List[Tuple[int, int, str]] = session.execute(
+        select(Pseudonym.id, Pseudonym.owner_id, Player.type)
+        .join(Player, Pseudonym.owner_id == Player.id)
+        .where(Pseudonym.game_id == game.id).order_by(Pseudonym.id)).all()
+    if len(pseudonyms) < 2:
+        return counts
+
+    # events, with explicit ids so that deaths and reports can refer to them without reading the ids back
+    first_id = (session.scalar(select(func.max(Event.id))) or 0) + 1
+    n_events = max(sizes.events, sizes.deaths)
+    span = max(sizes.weeks, 1) * 7 * 24 * 60
+    times = sorted(started + timedelta(minutes=rng.randrange(span)) for _ in range(n_events))
+    victims = rng.sample(pseudonyms, min(sizes.deaths, len(pseudonyms)))
+    death_events = set(rng.sample(range(n_events), len(victims)))
+
+    events = []
+    deaths = []
+    for i, t in enumerate(times):
+        event_id = first_id + i
+        refs = [p_id for p_id, _, _ in rng.sample(pseudonyms, min(sizes.refs, len(pseudonyms)))]
+        if i in death_events:
+            victim_id, victim_owner, victim_type = victims.pop()
+            killer_id, killer_owner, _ = rng.choice(pseudonyms)
+            while killer_owner == victim_owner:
+                killer_id, killer_owner, _ = rng.choice(pseudonyms)
+            refs = [p_id for p_id in refs if p_id not in (victim_id, killer_id)][:max(sizes.refs - 2, 0)]
+            headline = _headline(rng, [_reference(rng, killer_id), _reference(rng, victim_id, reveal=True)]
+                                 + [_reference(rng, p_id) for p_id in refs], kill=True)
+            deaths.append({"event_id": event_id, "victim_id": victim_owner, "killer_id": killer_owner,
+                           "licit": rng.random() < 0.9,
+                           "expires": t + POLICE_DEATH_DURATION if victim_type == Police.__mapper__.polymorphic_identity
+                           else None})
+        else:
+            headline = _headline(rng, [_reference(rng, p_id) for p_id in refs])
+        events.append({"id": event_id, "game_id": game.id, "headline": headline, "datetimestamp": t})
+    if events:
+        session.execute(insert(Event), events)
+    if deaths:
+        session.execute(insert(Death), deaths)
+    counts["events"] = len(events)
+    counts["deaths"] = len(deaths)
+
+    reports = []
+    for i in range(sizes.reports if events else 0):
+        e = rng.choice(events)
+        template = rng.choice(REPORTS)
+        refs = [_reference(rng, p_id) for p_id, _, _ in rng.sample(pseudonyms, min(2, len(pseudonyms)))]
+        reports.append({"event_id": e["id"], "author_id": rng.choice(pseudonyms)[0],
+                        "body": template.format(*refs[:template.count("{")]),
+                        "datetimestamp": e["datetimestamp"] + timedelta(minutes=rng.randrange(1, 24 * 60))})
+    if reports:
+        session.execute(insert(Report), reports)
+    counts["reports"] = len(reports)
+
+    # the bulk inserts bypass the ORM, so the index and cached timeline are updated by hand
+    counts["event_references"] = 0
+    event_ids = [e["id"] for e in events]
+    for i in range(0, len(event_ids), REFERENCE_CHUNK_SIZE):
+        counts["event_references"] += rebuild_references(session.connection(),
+                                                         event_ids[i:i + REFERENCE_CHUNK_SIZE])
+    DeathTimeline.invalidate(session)
+
+    dead_assassins = {d["victim_id"] for d in deaths if d["expires"] is None}
+    if dead_assassins:
+        assassins = Assassin.__table__
+        session.execute(update(assassins).where(assassins.c.id.in_(dead_assassins)).values(alive=False))
+        for obj in list(session.identity_map.values()):
+            if isinstance(obj, Assassin) and obj.id in dead_assassins:
+                session.expire(obj, ["alive"])
+        game.targets_dirty = True
+        if game.live:
+            game.reassign_targets(rng)
+    return counts
@@ -0,0 +1,268 @@
+"""
+mail.py
+
+The mail transport layer.
+Rather than opening a new SMTP connection (and doing STARTTLS and logging in) for every email,
+emails are sent through an `SMTPPool`, which keeps a few authenticated connections open and reuses them.
+
+The transport is configured by the "email" section of `config.json`:
+    host, port                  -   The SMTP server to send through.
+    username, password          -   Login details. If `username` is not set, no login is attempted.
+    from                        -   The address emails are sent from.
+    starttls                    -   Whether to upgrade connections with STARTTLS. Defaults to true.
+    pool_size                   -   The maximum number of connections to keep open. Defaults to 4.
+    max_messages_per_connection -   How many messages to send before reconnecting, since servers often limit this.
+                                    Defaults to 100.
+    rate_limit                  -   The maximum number of messages per second sent when dispatching the outbox
+                                    (see `Outbox.dispatch_outbox`). Defaults to no limit.
+    max_attempts                -   How many times the outbox tries to send a message before giving up on it.
+                                    Defaults to 5.
+Setting `starttls` to false and leaving out `username` allows testing against a local debugging SMTP server,
+e.g. `python -m aiosmtpd -n -l localhost:8025`.
+"""
+
+import atexit
+import smtplib
+import threading
+import time
+from dataclasses import dataclass
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from typing import Optional, List
+from .config import config
+
+# errors after which a connection is assumed to be broken, so the message is retried on a fresh connection
+_CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError, TimeoutError)
+
+
+@dataclass(frozen=True)
+class OutgoingMessage:
+    """
+    A fully rendered email, ready to be sent.
+    This holds only plain values (no ORM objects), so it can safely be handed to other threads.
+    """
+    to: str
+    body: str
+    subject: str = "Assassins' Guild Update"
+    mimetype: str = "text"
+
+    def as_string(self, from_addr: str) -> str:
+        """
+        :param from_addr: The address the email is sent from.
+        :return: The MIME-encoded message.
+        """
+        message = MIMEMultipart()
+        message['Subject'] = self.subject
+        message['From'] = from_addr
+        message['To'] = self.to
+        message.attach(MIMEText(self.body, self.mimetype))
+        return message.as_string()
+
+
+@dataclass
+class _Connection:
+    smtp: smtplib.SMTP
+    sent: int = 0
+
+
+class SMTPPool:
+    """
+    SMTPPool class
+
+    A thread-safe pool of authenticated SMTP connections.
+    Connections are opened lazily, up to `size` of them, and returned to the pool after each message.
+    A connection is closed and replaced once it has sent `max_messages_per_connection` messages,
+    or if it fails, in which case the message is retried on a new connection.
+    """
+
+    def __init__(self, host: str, port: int = 0, username: Optional[str] = None, password: Optional[str] = None,
+                 starttls: bool = True, size: int = 4, max_messages_per_connection: int = 100,
+                 retries: int = 1, timeout: float = 30, from_addr: Optional[str] = None):
+        """
+        :param host: Hostname of the SMTP server.
+        :param port: Port of the SMTP server.
+        :param username: Username to log in with. If None, no login is attempted.
+        :param password: Password to log in with.
+        :param starttls: Whether to use STARTTLS.
+        :param size: The maximum number of connections to open at once.
+        :param max_messages_per_connection: The number of messages to send on a connection before replacing it.
+        :param retries: How many times to retry a message on a new connection if the connection fails.
+        :param timeout: Socket timeout in seconds.
+        :param from_addr: The address that `send_message` sends from. Defaults to the "from" address in the config.
+        """
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.size = size
+        self.max_messages_per_connection = max_messages_per_connection
+        self.retries = retries
+        self.timeout = timeout
+        self.from_addr = from_addr if from_addr is not None else config["email"]["from"]
+
+        # guards `_idle` and `_open`, and is notified whenever a connection is released or a slot freed
+        self._condition = threading.Condition()
+        self._idle: List[_Connection] = []
+        self._open = 0
+        # number of connections made, which is useful for checking the pool is being reused
+        self.connections_made = 0
+
+    def _connect(self) -> _Connection:
+        smtp = smtplib.SMTP(host=self.host, port=self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+        except BaseException:
+            smtp.close()
+            raise
+        with self._condition:
+            self.connections_made += 1
+        return _Connection(smtp)
+
+    def _acquire(self) -> _Connection:
+        """
+        :return: An idle connection, opening a new one if none are idle and the pool is not full.
+        Blocks until a connection is released, or one is closed and frees its slot, if the pool is full.
+        """
+        with self._condition:
+            while True:
+                if self._idle:
+                    return self._idle.pop()
+                if self._open < self.size:
+                    self._open += 1
+                    break
+                self._condition.wait()
+        try:
+            return self._connect()
+        except BaseException:
+            self._free_slot()
+            raise
+
+    def _free_slot(self):
+        with self._condition:
+            self._open -= 1
+            self._condition.notify()
+
+    def _discard(self, conn: _Connection, polite: bool = True):
+        """
+        Closes a connection and frees its slot in the pool.
+        """
+        try:
+            if polite:
+                conn.smtp.quit()
+            else:
+                conn.smtp.close()
+        except (smtplib.SMTPException, OSError):
+            pass
+        self._free_slot()
+
+    def _release(self, conn: _Connection):
+        if conn.sent >= self.max_messages_per_connection:
+            self._discard(conn)
+        else:
+            with self._condition:
+                self._idle.append(conn)
+                self._condition.notify()
+
+    def send(self, from_addr: str, to_addrs: List[str], msg: str):
+        """
+        Sends an email through a pooled connection, retrying on a new connection if the connection has failed.
+        :param from_addr: The envelope sender.
+        :param to_addrs: The envelope recipients.
+        :param msg: The full message, as a string.
+        """
+        attempt = 0
+        while True:
+            conn = self._acquire()
+            try:
+                conn.smtp.sendmail(from_addr, to_addrs, msg)
+            except _CONNECTION_ERRORS:
+                self._discard(conn, polite=False)
+                attempt += 1
+                if attempt > self.retries:
+                    raise
+                continue
+            except BaseException:
+                # the server rejected this message, but the connection is still usable
+                self._release(conn)
+                raise
+            conn.sent += 1
+            self._release(conn)
+            return
+
+    def send_message(self, message: OutgoingMessage):
+        """
+        Sends an OutgoingMessage from `from_addr`.
+        """
+        self.send(self.from_addr, [message.to], message.as_string(self.from_addr))
+
+    def close(self):
+        """
+        Closes all idle connections.
+        """
+        with self._condition:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._discard(conn)
+
+    def __enter__(self) -> "SMTPPool":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class RateLimiter:
+    """
+    RateLimiter class
+
+    A thread-safe limiter which spaces calls to `wait` at least `1 / rate` seconds apart.
+    """
+
+    def __init__(self, rate: Optional[float] = None):
+        """
+        :param rate: The maximum number of calls per second. If None, `wait` never blocks.
+        """
+        self.interval = 1 / rate if rate else 0
+        self._lock = threading.Lock()
+        self._next = time.monotonic()
+
+    def wait(self):
+        """
+        Blocks until the next call is allowed.
+        """
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next, now)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+_default_transport: Optional[SMTPPool] = None
+_default_transport_lock = threading.Lock()
+
+
+def get_transport() -> SMTPPool:
+    """
+    :return: The SMTPPool configured by the "email" section of the config, creating it on first use.
+    """
+    global _default_transport
+    with _default_transport_lock:
+        if _default_transport is None:
+            email_config = config["email"]
+            _default_transport = SMTPPool(host=email_config["host"],
+                                          port=email_config["port"],
+                                          username=email_config.get("username"),
+                                          password=email_config.get("password"),
+                                          starttls=email_config.get("starttls", True),
+                                          size=email_config.get("pool_size", 4),
+                                          max_messages_per_connection=email_config.get("max_messages_per_connection", 100),
+                                          from_addr=email_config["from"])
+            atexit.register(_default_transport.close)
+        return _default_transport
@@ -0,0 +1,186 @@
+"""
+migrations.py
+
+Versioned schema migrations for the AutoUmpire database.
+
+The version of the schema is stored in the `schema_version` table.
+On startup, `check_schema` reads it with a single query (rather than reflecting every table, as `create_all` does),
+creating the schema from scratch if the database is empty, and warning if the database needs migrating.
+`migrate` (run by the `migrate` command) brings a database up to date by applying each outstanding migration in order.
+
+Databases created before schema versioning are treated as being at version 1, the baseline schema.
+Migrations check what already exists before changing anything,
+since such databases may already have some of the later tables or columns.
+
+To change the schema, change the models and append a migration to `MIGRATIONS` making the same change to existing databases.
+"""
+
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+from warnings import warn
+from sqlalchemy import Table, Column, Integer, select, inspect, text, Engine, Connection
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from .Base import Base
+
+schema_version_table = Table("schema_version", Base.metadata,
+                             Column("version", Integer, nullable=False))
+
+
+class OutdatedSchemaWarning(Warning):
+    """
+    Warning issued when the database's schema is older than the code's, so it needs migrating.
+    """
+
+
+# the girth enforced by target assignment before games had a `min_girth` setting: self-targetting and duplicate targets
+# were forbidden, but two assassins could target each other. Existing games are migrated with this girth, not the
+# configured default, so that migrating does not make their target assignment stricter.
+LEGACY_MIN_GIRTH = 2
+
+
+@dataclass
+class Migration:
+    """
+    A step from version `version - 1` of the schema to version `version`.
+    """
+    version: int
+    description: str
+    apply: Callable[[Connection], None]
+
+
+def _add_column(conn: Connection, table: str, column: str, ddl: str):
+    """
+    Adds a column to a table, unless it already exists.
+    :param ddl: The column definition, e.g. "min_girth INTEGER NOT NULL DEFAULT 2".
+    """
+    if column not in {c["name"] for c in inspect(conn).get_columns(table)}:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {ddl}"))
+
+
+def _create_table(name: str) -> Callable[[Connection], None]:
+    """
+    :return: A migration function creating the table `name` as declared on the models, unless it already exists.
+    """
+    return lambda conn: Base.metadata.tables[name].create(conn, checkfirst=True)
+
+
+def _create_indexes(*names: str) -> Callable[[Connection], None]:
+    """
+    :return: A migration function creating the indexes `names` as declared on the models, unless they already exist.
+    The names are listed explicitly, since later migrations may declare indexes on tables that do not exist yet.
+    """
+    def create(conn: Connection):
+        indexes = {index.name: index for table in Base.metadata.tables.values() for index in table.indexes}
+        for name in names:
+            indexes[name].create(conn, checkfirst=True)
+    return create
+
+
+def _index_event_references(conn: Connection):
+    """
+    Creates the event_references table, then fills it in from every existing event.
+    """
+    from .EventReference import rebuild_references
+    Base.metadata.tables["event_references"].create(conn, checkfirst=True)
+    event_ids = conn.scalars(text("SELECT id FROM events")).all()
+    for i in range(0, len(event_ids), 500):
+        rebuild_references(conn, event_ids[i:i + 500])
+
+
+# the migrations, in order
+MIGRATIONS: List[Migration] = [
+    Migration(2, "Add games.min_girth",
+              lambda conn: _add_column(conn, "games", "min_girth",
+                                       f"min_girth INTEGER NOT NULL DEFAULT {LEGACY_MIN_GIRTH}")),
+    Migration(3, "Add the outbox table", _create_table("outbox")),
+    Migration(4, "Add secondary indexes",
+              _create_indexes("ix_registrations_game_id_email", "ix_registrations_game_id_realname",
+                              "ix_players_game_id", "ix_pseudonyms_owner_id", "ix_events_game_id_datetimestamp",
+                              "ix_reports_event_id", "ix_deaths_event_id", "ix_deaths_victim_id",
+                              "ix_targetting_table_assassin_id", "ix_outbox_status_game_id")),
+    Migration(5, "Add games.targets_dirty",
+              lambda conn: _add_column(conn, "games", "targets_dirty", "targets_dirty BOOLEAN NOT NULL DEFAULT FALSE")),
+    Migration(6, "Add the event_references table, indexing the players mentioned by each event", _index_event_references),
+]
+
+BASELINE_VERSION = 1
+CURRENT_VERSION = MIGRATIONS[-1].version if MIGRATIONS else BASELINE_VERSION
+
+
+def get_version(conn: Connection) -> Optional[int]:
+    """
+    :param conn: A connection which is not in a transaction that must be kept, since it is rolled back on failure.
+    :return: The schema version of the database, or None if it is not versioned (including if it is empty).
+    """
+    try:
+        return conn.scalar(select(schema_version_table.c.version))
+    except (OperationalError, ProgrammingError):
+        # no schema_version table
+        conn.rollback()
+        return None
+
+
+def _set_version(conn: Connection, version: int):
+    conn.execute(schema_version_table.delete())
+    conn.execute(schema_version_table.insert().values(version=version))
+
+
+def _create_schema(conn: Connection):
+    Base.metadata.create_all(conn)
+    _set_version(conn, CURRENT_VERSION)
+
+
+def check_schema(engine: Engine) -> bool:
+    """
+    Checks the database's schema version, with a single query in the usual case.
+    An empty database has the current schema created in it.
+    Issues an OutdatedSchemaWarning if the database needs migrating (see `migrate`).
+    :return: Whether the database is at the current schema version.
+    """
+    with engine.connect() as conn:
+        version = get_version(conn)
+        if version is None:
+            if not inspect(conn).has_table("games"):
+                _create_schema(conn)
+                conn.commit()
+                return True
+            warn(OutdatedSchemaWarning("The database predates schema versioning. "
+                                       "Run the `migrate` command to bring it up to date."))
+        elif version < CURRENT_VERSION:
+            warn(OutdatedSchemaWarning(f"The database schema is at version {version}, but the latest is {CURRENT_VERSION}. "
+                                       f"Run the `migrate` command to bring it up to date."))
+        elif version > CURRENT_VERSION:
+            warn(OutdatedSchemaWarning(f"The database schema is at version {version}, "
+                                       f"which is newer than this version of AutoUmpire ({CURRENT_VERSION})."))
+    return version == CURRENT_VERSION
+
+
+def migrate(engine: Engine) -> List[Migration]:
+    """
+    Brings the database up to the current schema version.
+    An empty database has the current schema created in it, and an unversioned one is migrated from the baseline.
+    The stored version is only updated once every outstanding migration has been applied,
+    and migrations check what already exists, so an interrupted migration can safely be run again.
+    :return: The migrations applied.
+    """
+    applied = []
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        if not inspector.has_table("games"):
+            _create_schema(conn)
+            return applied
+        if inspector.has_table(schema_version_table.name):
+            version = conn.scalar(select(schema_version_table.c.version))
+        else:
+            schema_version_table.create(conn)
+            version = None
+        if version is None:
+            version = BASELINE_VERSION
+
+        for migration in MIGRATIONS:
+            if migration.version > version:
+                migration.apply(conn)
+                applied.append(migration)
+                version = migration.version
+        _set_version(conn, version)
+    return applied
@@ -0,0 +1,183 @@
+"""
+profiling.py
+
+Counts and times the SQL statements run against the database, to find slow queries and N+1 patterns.
+
+Setting `verbose` in `config.json` echoes every statement, which buries a loop of identical queries in pages of SQL.
+A `QueryProfiler` instead hooks the engine's `before_cursor_execute` and `after_cursor_execute` events
+and summarises what ran while it was active: how many statements, how long they spent in the database,
+the slowest statements, and the statements repeated with only their parameters changing.
+
+    with QueryProfiler("viewplayer") as profile:
+        ...
+    print(profile.report())
+"""
+
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import event, Engine
+from . import db
+
+# the number of slowest statements, and of most-repeated fingerprints, kept and reported
+TOP_N = 5
+# the length statements are cut to in reports
+STATEMENT_WIDTH = 160
+
+_whitespace = re.compile(r"\s+")
+_literal = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_parameter_list = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_selected_columns = re.compile(r"^SELECT .+? FROM ")
+
+
+def fingerprint(statement: str) -> str:
+    """
+    Normalises a statement so that executions differing only in their parameters look the same,
+    by collapsing whitespace, replacing literals with ?, and replacing lists of parameters, e.g. `IN (?, ?, ?)`, with (?...).
+    :param statement: The SQL of the statement.
+    :return: The fingerprint of the statement.
+    """
+    statement = _whitespace.sub(" ", statement).strip()
+    statement = _literal.sub("?", statement)
+    return _parameter_list.sub("(?...)", statement)
+
+
+def _shorten(statement: str, width: int = STATEMENT_WIDTH) -> str:
+    statement = _whitespace.sub(" ", statement).strip()
+    if len(statement) > width:
+        # the tables and conditions say more about a statement than the list of columns
+        statement = _selected_columns.sub("SELECT ... FROM ", statement, count=1)
+    return statement if len(statement) <= width else statement[:width - 3] + "..."
+
+
+@dataclass
+class StatementStats:
+    """
+    The executions of statements sharing a fingerprint.
+        fingerprint -   The normalised statement (see `fingerprint`).
+        count       -   The number of executions.
+        elapsed     -   The total time spent executing them, in seconds.
+    """
+    fingerprint: str
+    count: int = 0
+    elapsed: float = 0.0
+
+
+@dataclass
+class Profile:
+    """
+    Summary of the statements run while a QueryProfiler was active.
+        label       -   What was profiled, e.g. the name of a command.
+        statements  -   The number of statements run.
+        db_time     -   The total time spent executing statements, in seconds.
+        elapsed     -   The total time the profiler was active, in seconds.
+        slowest     -   The `TOP_N` slowest executions, as (seconds, statement), slowest first.
+        by_fingerprint  -   The executions grouped by fingerprint.
+    """
+    label: str = ""
+    statements: int = 0
+    db_time: float = 0.0
+    elapsed: float = 0.0
+    slowest: List[Tuple[float, str]] = field(default_factory=list)
+    by_fingerprint: Dict[str, StatementStats] = field(default_factory=dict)
+
+    def repeated(self, min_count: int = 2) -> List[StatementStats]:
+        """
+        :param min_count: The number of executions for a fingerprint to count as repeated. Defaults to 2.
+        :return: The fingerprints executed at least `min_count` times, most executed first.
+        A fingerprint executed once per object in a loop is the mark of an N+1 query.
+        """
+        return sorted((s for s in self.by_fingerprint.values() if s.count >= min_count),
+                      key=lambda s: (s.count, s.elapsed), reverse=True)
+
+    def report(self, top: int = TOP_N) -> str:
+        """
+        :param top: The number of slowest statements and repeated fingerprints to list.
+        :return: A plaintext summary of the profile.
+        """
+        lines = [f"{self.label + ': ' if self.label else ''}{self.statements} quer{'y' if self.statements == 1 else 'ies'}, "
+                 f"{self.db_time * 1000:.1f} ms in the database, {self.elapsed * 1000:.1f} ms in total."]
+        if self.slowest:
+            lines.append("Slowest statements:")
+            lines.extend(f"  {seconds * 1000:8.2f} ms  {_shorten(statement)}" for seconds, statement in self.slowest[:top])
+        repeated = self.repeated()
+        if repeated:
+            lines.append("Repeated statements:")
+            lines.extend(f"  {s.count:6}x {s.elapsed * 1000:8.2f} ms  {_shorten(s.fingerprint)}" for s in repeated[:top])
+        return "\n".join(lines)
+
+
+class QueryProfiler:
+    """
+    QueryProfiler class
+
+    Records the statements run on an engine between `start` and `stop`, or within a `with` block,
+    into a Profile (`profile`).
+    Profilers can be nested, e.g. one per command inside one for a whole batch; each sees every statement.
+    """
+
+    def __init__(self, label: str = "", engine: Optional[Engine] = None, top: int = TOP_N):
+        """
+        :param label: What is being profiled, to head the report.
+        :param engine: The engine to profile. Defaults to the engine in `db`.
+        :param top: The number of slowest statements to keep. Defaults to `TOP_N`.
+        """
+        self.engine = engine if engine is not None else db.engine
+        self.top = top
+        self.profile = Profile(label=label)
+        self._started: Optional[float] = None
+        # the start times of the statements being executed
+        self._start_times: List[float] = []
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self._start_times.append(time.perf_counter())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if not self._start_times:
+            # the statement started before this profiler did
+            return
+        seconds = time.perf_counter() - self._start_times.pop()
+        profile = self.profile
+        profile.statements += 1
+        profile.db_time += seconds
+
+        key = fingerprint(statement)
+        stats = profile.by_fingerprint.get(key)
+        if stats is None:
+            stats = profile.by_fingerprint[key] = StatementStats(key)
+        stats.count += 1
+        stats.elapsed += seconds
+
+        if len(profile.slowest) < self.top or seconds > profile.slowest[-1][0]:
+            profile.slowest.append((seconds, statement))
+            profile.slowest.sort(key=lambda s: s[0], reverse=True)
+            del profile.slowest[self.top:]
+
+    def start(self) -> "QueryProfiler":
+        """
+        Starts recording statements.
+        """
+        event.listen(self.engine, "before_cursor_execute", self._before_execute)
+        event.listen(self.engine, "after_cursor_execute", self._after_execute)
+        self._started = time.perf_counter()
+        return self
+
+    def stop(self) -> Profile:
+        """
+        Stops recording statements.
+        :return: The Profile of the statements recorded.
+        """
+        if self._started is not None:
+            event.remove(self.engine, "before_cursor_execute", self._before_execute)
+            event.remove(self.engine, "after_cursor_execute", self._after_execute)
+            self.profile.elapsed += time.perf_counter() - self._started
+            self._started = None
+        return self.profile
+
+    def __enter__(self) -> Profile:
+        self.start()
+        return self.profile
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
@@ -0,0 +1,79 @@
+"""
+references.py
+
+Parsing of the player references in event headlines and report bodies.
+In these, <@xxx> refers to the pseudonym with id xxx, and <#xxx> to the player who owns that pseudonym.
+
+Each text is split once into a compact tuple of tokens -- literal segments and References -- which is memoised,
+so that rendering a headline or report is a join over its tokens rather than a regex substitution,
+and finding which pseudonyms it references does not re-scan it.
+The cache is keyed on the text itself, so editing a headline or report simply tokenises the new text,
+and nothing needs invalidating.
+"""
+
+import re
+from functools import lru_cache
+from typing import Callable, FrozenSet, NamedTuple, Tuple, Union
+
+# TODO: allow escaping?
+# regex pattern for extracting the id of the pseudonym/player from a reference
+parsing_pattern = re.compile(r"<([@#])(\d+)>")
+
+# the maximum number of texts whose tokens are cached
+CACHE_SIZE = 4096
+
+
+class Reference(NamedTuple):
+    """
+    A reference in a headline or report body.
+        kind            -   "@" for a reference to the pseudonym itself, "#" for a reference to its owner.
+        pseudonym_id    -   The id of the referenced pseudonym.
+    """
+    kind: str
+    pseudonym_id: int
+
+
+Token = Union[str, Reference]
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def tokenise(text: str) -> Tuple[Token, ...]:
+    """
+    Splits `text` into its literal segments and references, in order. Empty segments are left out.
+    :return: A tuple of tokens, each either a str or a Reference.
+    """
+    tokens = []
+    pos = 0
+    for m in parsing_pattern.finditer(text):
+        if m.start() > pos:
+            tokens.append(text[pos:m.start()])
+        tokens.append(Reference(m[1], int(m[2])))
+        pos = m.end()
+    if pos < len(text):
+        tokens.append(text[pos:])
+    return tuple(tokens)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def referenced_ids(text: str) -> FrozenSet[int]:
+    """
+    :return: The ids of the pseudonyms referenced in `text`, whether by <@xxx> or <#xxx>.
+    """
+    return frozenset(t.pseudonym_id for t in tokenise(text) if isinstance(t, Reference))
+
+
+def render(text: str, render_ref: Callable[[Reference], str]) -> str:
+    """
+    Renders `text`, replacing each reference with its rendering.
+    :param render_ref: A function returning the rendering of a Reference.
+    :return: The rendered text.
+    """
+    return "".join(t if isinstance(t, str) else render_ref(t) for t in tokenise(text))
+
+
+def clear_cache():
+    """
+    Empties the caches of tokenised texts.
+    """
+    tokenise.cache_clear()
+    referenced_ids.cache_clear()
@@ -0,0 +1,206 @@
+"""
+static_site.py
+
+Incremental builder for the static site of a game, i.e. the headlines page and one news page per week.
+
+A manifest stored alongside the pages records a content hash for every event,
+covering the event itself, its reports, and the rendered state (e.g. dead or alive) of every pseudonym it references.
+Only pages whose events' hashes have changed are re-rendered and rewritten,
+and the rendered headlines of unchanged events are reused from the manifest,
+so regenerating the site after a kill only renders the handful of events the kill affects.
+"""
+
+import hashlib
+import json
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from itertools import groupby
+from pathlib import Path
+from typing import List, Union, Optional
+from sqlalchemy import select
+from .Event import Event
+from .references import tokenise, Reference
+from .Pseudonym import Pseudonym
+
+MANIFEST_NAME = ".manifest.json"
+# bump this whenever the manifest format or the way pages are built changes, to force a full rebuild
+MANIFEST_VERSION = 1
+
+HEADLINES_PAGE = "headlines.html"
+# templates whose source is included in every page's hash
+PAGE_TEMPLATES = ("headlines.jinja", "news.jinja", "macros.jinja")
+
+
+def news_page_name(week_n: int) -> str:
+    """
+    :return: The filename of the news page for week `week_n`.
+    """
+    return f"news{week_n:02d}.html"
+
+
+@dataclass
+class BuildReport:
+    """
+    Summary of a site build.
+        written         -   Filenames of the pages that were (re)written.
+        unchanged       -   Filenames of the pages that were up to date.
+        removed         -   Filenames of stale pages that were deleted (e.g. for weeks which no longer have events).
+        events_rendered -   The number of event headlines that had to be rendered rather than reused.
+        elapsed         -   Time taken, in seconds.
+    """
+    written: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    events_rendered: int = 0
+    elapsed: float = 0.0
+
+
+def _hash(obj) -> str:
+    return hashlib.sha256(json.dumps(obj, default=str, sort_keys=True).encode()).hexdigest()
+
+
+def _reference_state(event: Event, text: str) -> List:
+    """
+    :return: Everything that affects how the references in `text` are rendered for `event`.
+    """
+    session = event.session
+    state = []
+    for ref in tokenise(text):
+        if not isinstance(ref, Reference):
+            continue
+        p = session.get(Pseudonym, ref.pseudonym_id)
+        if p is None:
+            state.append([ref.kind, ref.pseudonym_id, None])
+            continue
+        entry = [ref.kind, p.id, p.text, p.css_class(event.datetimestamp)]
+        if ref.kind == "#":
+            entry.append([q.text for q in p.owner.pseudonyms])
+            entry.append(p.owner.reg.realname)
+        state.append(entry)
+    return state
+
+
+def event_hash(event: Event) -> str:
+    """
+    :return: A hash of all the inputs to the rendering of `event` on the headlines and news pages.
+    """
+    return _hash([
+        event.id,
+        event.datetimestamp,
+        event.headline,
+        _reference_state(event, event.headline),
+        [[r.id, r.author.text, r.author_css_class(), r.body, _reference_state(event, r.body)] for r in event.reports],
+    ])
+
+
+def affected_pages(game: "Game", player_id: int, since: Optional[datetime] = None) -> List[str]:
+    """
+    Finds the pages of the site on which a player appears, e.g. to see which pages a death affects,
+    with a single query on the reverse index of references (see `EventReference`).
+    :param game: The Game whose site it is.
+    :param player_id: The id of the player.
+    :param since: If given, only events at or after this time count,
+    e.g. the time of a death, since only the player's appearances after that are rendered differently.
+    :return: The filenames of the affected pages, with the headlines page first.
+    """
+    from .EventReference import EventReference
+    stmt = (select(Event.datetimestamp).distinct()
+            .join(EventReference, EventReference.event_id == Event.id)
+            .where(Event.game_id == game.id, EventReference.player_id == player_id))
+    if since is not None:
+        stmt = stmt.where(Event.datetimestamp >= since)
+    timestamps = game.session.scalars(stmt).all()
+    if not timestamps:
+        return []
+    pages = [HEADLINES_PAGE]
+    if game.started is not None:
+        weeks = {game.week_of(t) for t in timestamps}
+        pages.extend(news_page_name(week_n) for week_n in sorted(weeks))
+    return pages
+
+
+def build_site(game: "Game", out_dir: Union[str, Path], force: bool = False) -> BuildReport:
+    """
+    Builds the static site for `game` in `out_dir`, only rewriting pages whose inputs have changed.
+    :param game: The Game to build the site for.
+    :param out_dir: The directory to write the pages (and the manifest) to. It is created if it does not exist.
+    :param force: Whether to rebuild every page regardless of the manifest. Defaults to `False`.
+    :return: A BuildReport of what was done.
+    """
+    from .templates import templates
+    start = time.perf_counter()
+    report = BuildReport()
+    # every page template is needed, so compile them all at once rather than as each page is rendered
+    templates.preload()
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = out_dir / MANIFEST_NAME
+    try:
+        manifest = json.loads(manifest_path.read_text())
+    except (FileNotFoundError, ValueError):
+        manifest = {}
+
+    templates_hash = _hash([templates.env.loader.get_source(templates.env, name)[0] for name in PAGE_TEMPLATES])
+    if force or manifest.get("version") != MANIFEST_VERSION or manifest.get("templates") != templates_hash:
+        manifest = {}
+    old_events = manifest.get("events", {})
+    old_pages = manifest.get("pages", {})
+
+    events = game._load_events_for_render(game.events.select().order_by(Event.datetimestamp))
+
+    # hash every event, reusing the rendered headline of any event whose hash is unchanged
+    new_events = {}
+    headline_html = {}
+    for e in events:
+        h = event_hash(e)
+        old = old_events.get(str(e.id))
+        if old is not None and old["hash"] == h:
+            html = old["headline"]
+        else:
+            html = e.HTML_headline()
+            report.events_rendered += 1
+        new_events[str(e.id)] = {"hash": h, "headline": html}
+        headline_html[e.id] = html
+
+    # work out every page's hash, then render just the ones which have changed
+    pages = {HEADLINES_PAGE: (_hash([templates_hash] + [new_events[str(e.id)]["hash"] for e in events]),
+                              lambda: templates["headlines.jinja"].render(events=events,
+                                                                           headline_html=headline_html))}
+    # news pages are by week of the game, so there are none until it starts
+    if game.started is not None:
+        for week_n, week_events in groupby(events, key=lambda e: e.week()):
+            week_events = list(week_events)
+            pages[news_page_name(week_n)] = (
+                _hash([templates_hash, week_n] + [new_events[str(e.id)]["hash"] for e in week_events]),
+                lambda week_n=week_n, week_events=week_events: templates["news.jinja"].render(events=week_events,
+                                                                                              week_n=week_n)
+            )
+
+    for name, (h, render) in pages.items():
+        path = out_dir / name
+        if old_pages.get(name) == h and path.exists():
+            report.unchanged.append(name)
+            continue
+        path.write_text(render(), encoding="utf-8")
+        report.written.append(name)
+
+    for name in old_pages:
+        if name not in pages:
+            (out_dir / name).unlink(missing_ok=True)
+            report.removed.append(name)
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "templates": templates_hash,
+        "events": new_events,
+        "pages": {name: h for name, (h, render) in pages.items()},
+    }
+    # write to a temporary file first so that an interrupted build never leaves a corrupt manifest
+    tmp_path = manifest_path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(manifest))
+    tmp_path.replace(manifest_path)
+
+    report.elapsed = time.perf_counter() - start
+    return report
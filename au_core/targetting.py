@@ -0,0 +1,346 @@
+"""
+targetting.py
+
+Implements the in-memory target-assignment engine.
+The targetting graph of a game is loaded from the database once,
+the degree constraints are then solved in memory using adjacency sets,
+and finally the new edges are written back with a single bulk insert.
+"""
+
+import random
+from dataclasses import dataclass, field
+from typing import Dict, Set, List, Tuple, Iterable, Optional
+from sqlalchemy import select, insert, delete, or_
+from sqlalchemy.orm import Session
+from .TargRel import TargRel
+from .Assassin import Assassin
+
+# an edge of the targetting graph, as (assassin_id, target_id)
+Edge = Tuple[int, int]
+
+
+@dataclass
+class AssignmentReport:
+    """
+    Summary of a run of the target-assignment engine.
+        new_edges   -   The (assassin_id, target_id) pairs that were added.
+        unfilled    -   The number of targets that could not be assigned without breaking the constraints.
+        rerolls     -   The number of times an earlier choice had to be re-rolled to make room for a stuck assassin.
+    """
+    new_edges: List[Edge] = field(default_factory=list)
+    unfilled: int = 0
+    rerolls: int = 0
+
+    @property
+    def affected(self) -> Set[int]:
+        """
+        :return: The ids of the assassins who were given new targets.
+        """
+        return {a for a, t in self.new_edges}
+
+
+class TargettingGraph:
+    """
+    TargettingGraph class
+
+    An in-memory copy of a game's targetting graph.
+    Nodes are the ids of alive assassins, and the edges are stored as adjacency sets in both directions,
+    so that checking whether an edge exists is a set lookup rather than a database query.
+    Edges to or from assassins that are not nodes (i.e. dead assassins) are ignored,
+    as they do not count towards anyone's targets.
+
+    The girth of the graph is the length of its shortest (directed) cycle.
+    With `min_girth` set to 3, nobody may target one of their own assassins;
+    with 4, additionally no three assassins may target each other in a triangle; and so on.
+    Not every combination of size, number of targets and girth can be satisfied (see `can_fill`).
+    """
+
+    # how many random candidates to try for a target before searching all the remaining candidates
+    RANDOM_TRIES = 8
+    # how many re-rolls to attempt for a stuck assassin before giving up on that target
+    REROLL_TRIES = 32
+
+    def __init__(self, nodes: Iterable[int], edges: Iterable[Edge] = (), min_girth: int = 0):
+        """
+        :param nodes: The ids of the (alive) assassins in the graph.
+        :param edges: The existing (assassin_id, target_id) targetting relations.
+        :param min_girth: The minimum length of a targetting cycle allowed when adding edges.
+        Values of 2 or less only forbid self-targetting and duplicate edges.
+        """
+        self.nodes: Set[int] = set(nodes)
+        self.min_girth = min_girth
+        self.targets: Dict[int, Set[int]] = {n: set() for n in self.nodes}
+        self.assassins: Dict[int, Set[int]] = {n: set() for n in self.nodes}
+        self.new_edges: Set[Edge] = set()
+        for a, t in edges:
+            if a in self.nodes and t in self.nodes:
+                self.targets[a].add(t)
+                self.assassins[t].add(a)
+
+    @classmethod
+    def load(cls, session: Session, game_id: int, min_girth: int = 0) -> "TargettingGraph":
+        """
+        Loads the whole targetting graph of a game using two queries.
+        :param session: The sqlalchemy.orm.Session to load the graph with.
+        :param game_id: The id of the game whose targetting graph to load.
+        :param min_girth: The minimum cycle length to enforce when adding edges.
+        :return: The loaded graph.
+        """
+        nodes = session.scalars(select(Assassin.id).filter_by(game_id=game_id, alive=True))
+        edges = session.execute(select(TargRel.assassin_id, TargRel.target_id)
+                                .join(Assassin, Assassin.id == TargRel.assassin_id)
+                                .where(Assassin.game_id == game_id, Assassin.alive)
+                                )
+        return cls(nodes, edges, min_girth)
+
+    @classmethod
+    def detach(cls, session: Session, victim_ids: Iterable[int],
+               min_girth: int = 0) -> Tuple["TargettingGraph", Set[int], Set[int]]:
+        """
+        Removes some (dead) assassins from the targetting graph in the database,
+        then loads only the part of the graph needed to repair the holes they leave.
+        This is the victims' alive former assassins and targets,
+        the edges determining their number of targets / assassins,
+        and, if `min_girth` requires it, the chains of targets leading on from the former targets.
+        The number of queries depends on `min_girth` but not on the number of players in the game or of victims.
+        :param session: The sqlalchemy.orm.Session to use.
+        :param victim_ids: The ids of the assassins to remove.
+        :param min_girth: The minimum cycle length to enforce when adding edges.
+        :return: A tuple of the loaded graph, the ids of the victims' alive former assassins,
+        and the ids of the victims' alive former targets.
+        """
+        victim_ids = set(victim_ids)
+        assassins = Assassin.__table__
+        hunter = assassins.alias()
+        hunted = assassins.alias()
+
+        def alive_edges(criterion):
+            # edges matching `criterion` where both ends are alive
+            return session.execute(select(TargRel.assassin_id, TargRel.target_id)
+                                   .join(hunter, hunter.c.id == TargRel.assassin_id)
+                                   .join(hunted, hunted.c.id == TargRel.target_id)
+                                   .where(hunter.c.alive, hunted.c.alive, criterion)
+                                   ).all()
+
+        # find the victims' former assassins and targets, then remove the victims' edges
+        touches_victim = or_(TargRel.assassin_id.in_(victim_ids), TargRel.target_id.in_(victim_ids))
+        victim_edges = session.execute(select(TargRel.assassin_id, TargRel.target_id).where(touches_victim)).all()
+        neighbours = {n for edge in victim_edges for n in edge} - victim_ids
+        if victim_edges:
+            session.execute(delete(TargRel).where(touches_victim))
+        alive = set(session.scalars(select(assassins.c.id)
+                                    .where(assassins.c.id.in_(neighbours), assassins.c.alive)))
+        former_assassins = {a for a, t in victim_edges if t in victim_ids} & alive
+        former_targets = {t for a, t in victim_edges if a in victim_ids} & alive
+
+        # the edges which count towards the former assassins' targets and the former targets' assassins
+        edges = alive_edges(or_(TargRel.assassin_id.in_(former_assassins), TargRel.target_id.in_(former_targets)))
+        # chains leading on from the former targets, for checking cycle lengths
+        frontier = set(former_targets)
+        seen = set(frontier)
+        for _ in range(min_girth - 2):
+            if not frontier:
+                break
+            step = alive_edges(TargRel.assassin_id.in_(frontier))
+            edges.extend(step)
+            frontier = {t for a, t in step} - seen
+            seen |= frontier
+
+        nodes = alive | {n for edge in edges for n in edge}
+        for obj in list(session.identity_map.values()):
+            if isinstance(obj, Assassin) and (obj.id in neighbours or obj.id in victim_ids):
+                session.expire(obj, ["targets", "assassins"])
+        return cls(nodes, edges, min_girth), former_assassins, former_targets
+
+    def _reaches(self, src: int, dst: int, max_len: int) -> bool:
+        """
+        Breadth-first search along targetting relations.
+        :return: Whether there is a chain of at most `max_len` targetting relations leading from `src` to `dst`.
+        """
+        frontier = {src}
+        seen = {src}
+        for _ in range(max_len):
+            step = set()
+            for n in frontier:
+                ts = self.targets.get(n, ())
+                if dst in ts:
+                    return True
+                step.update(ts)
+            frontier = step - seen
+            if not frontier:
+                break
+            seen |= frontier
+        return False
+
+    def can_target(self, a: int, t: int) -> bool:
+        """
+        :return: Whether `a` may be given `t` as a target,
+        i.e. this is not self-targetting or a duplicate edge, and would not create a cycle shorter than `min_girth`.
+        """
+        if t == a or t in self.targets[a]:
+            return False
+        # a new edge a -> t closes a cycle of length k+1 for every chain of length k from t back to a
+        return not self._reaches(t, a, self.min_girth - 2)
+
+    def add_edge(self, a: int, t: int):
+        """
+        Makes `a` target `t`, recording the edge so that it is written back by `write`.
+        """
+        self.targets[a].add(t)
+        self.assassins[t].add(a)
+        self.new_edges.add((a, t))
+
+    def remove_edge(self, a: int, t: int):
+        """
+        Undoes `add_edge`. Only edges added since the graph was loaded may be removed.
+        """
+        self.targets[a].discard(t)
+        self.assassins[t].discard(a)
+        self.new_edges.discard((a, t))
+
+    def _choose_target(self, a: int, pool: List[int], rng: random.Random) -> Optional[int]:
+        """
+        Picks a random valid target for `a` from `pool`.
+        A few random candidates are tried first, which almost always succeeds;
+        if these are all invalid then every remaining candidate is checked, so this never spins.
+        :return: The chosen target, or None if no candidate in `pool` is valid.
+        """
+        for _ in range(min(len(pool), self.RANDOM_TRIES)):
+            t = rng.choice(pool)
+            if self.can_target(a, t):
+                return t
+        valid = [t for t in pool if self.can_target(a, t)]
+        return rng.choice(valid) if valid else None
+
+    def _reroll(self, a: int, pool: List[int], report: AssignmentReport, rng: random.Random) -> Optional[int]:
+        """
+        Makes room for `a` when none of the candidates in `pool` are valid targets for it,
+        by re-rolling an edge x -> y added earlier in this run into a -> y and x -> t for some candidate t.
+        This leaves everyone's number of targets and assassins unchanged except for `a` and `t`.
+        At most REROLL_TRIES attempts are made, so this never spins.
+        :return: The candidate `t` that was used up, or None if no re-roll was found.
+        """
+        for _ in range(self.REROLL_TRIES):
+            if not pool or not report.new_edges:
+                return None
+            i = rng.randrange(len(report.new_edges))
+            x, y = report.new_edges[i]
+            t = rng.choice(pool)
+            self.remove_edge(x, y)
+            if self.can_target(a, y):
+                self.add_edge(a, y)
+                if self.can_target(x, t):
+                    self.add_edge(x, t)
+                    report.new_edges[i] = (a, y)
+                    report.new_edges.append((x, t))
+                    report.rerolls += 1
+                    return t
+                self.remove_edge(a, y)
+            self.add_edge(x, y)
+        return None
+
+    @staticmethod
+    def can_fill(n_nodes: int, n_targs: int, min_girth: int) -> bool:
+        """
+        :return: Whether `n_nodes` assassins can each be given `n_targs` targets (and assassins)
+        without self-targetting, duplicate targets, or cycles shorter than `min_girth`.
+        This is possible whenever ceil(n_nodes / n_targs) >= min_girth (see `_assign_circle`),
+        and for up to 5 targets it is known to be possible only then (the Caccetta-Haggkvist bound).
+        """
+        return n_targs == 0 or (n_nodes > n_targs and -(-n_nodes // n_targs) >= min_girth)
+
+    def _assign_circle(self, n_targs: int, rng: random.Random) -> List[Edge]:
+        """
+        Gives every assassin in an empty graph `n_targs` targets, by arranging the assassins in a random circle
+        and making each of them target the next `n_targs` assassins round it.
+        Every targetting cycle then goes all the way round the circle, so the girth is ceil(len(nodes) / n_targs),
+        which is the largest possible.
+        :return: The edges added.
+        """
+        order = sorted(self.nodes)
+        rng.shuffle(order)
+        n = len(order)
+        edges = [(order[i], order[(i + j) % n]) for i in range(n) for j in range(1, n_targs + 1)]
+        for a, t in edges:
+            self.add_edge(a, t)
+        return edges
+
+    def assign(self, n_targs: int, hunters: Optional[Iterable[int]] = None, hunted: Optional[Iterable[int]] = None,
+               rng: Optional[random.Random] = None) -> AssignmentReport:
+        """
+        Gives every assassin in `hunters` `n_targs` targets,
+        and every assassin in `hunted` `n_targs` assassins, as far as the constraints allow.
+        Targets are handed out in rounds, one per assassin per round,
+        each chosen randomly from the assassins who have too few people targetting them.
+        If an assassin gets stuck, i.e. every remaining candidate would break the constraints,
+        a bounded number of re-rolls of earlier choices is attempted before the target is left unfilled.
+        When there is little room to spare, this can leave targets unfilled even though an assignment exists,
+        so if every assassin in an empty graph is to be given targets (e.g. when the game starts)
+        and they could all be filled, the assassins are instead arranged in a circle (see `_assign_circle`).
+        :param n_targs: The number of targets (and assassins) each assassin should have.
+        :param hunters: The ids of the assassins whose targets should be filled. Defaults to all nodes.
+        :param hunted: The ids of the assassins who may be given as targets. Defaults to all nodes.
+        :param rng: The random.Random instance to use. Defaults to the `random` module's global instance.
+        :return: An AssignmentReport of the edges added.
+        """
+        rng = rng if rng is not None else random
+        hunters = self.nodes if hunters is None else set(hunters) & self.nodes
+        hunted = self.nodes if hunted is None else set(hunted) & self.nodes
+        report = AssignmentReport()
+        fresh = hunters == self.nodes and hunted == self.nodes and not any(self.targets.values())
+
+        # candidate targets, i.e. assassins with too few assassins of their own, with an index for O(1) removal
+        in_deficit = {t: n_targs - len(self.assassins[t]) for t in hunted if len(self.assassins[t]) < n_targs}
+        pool = list(in_deficit)
+        position = {t: i for i, t in enumerate(pool)}
+
+        def pool_remove(t: int):
+            # swap the last element into the position of `t`
+            i = position.pop(t)
+            last = pool.pop()
+            if last != t:
+                pool[i] = last
+                position[last] = i
+
+        out_deficit = {a: n_targs - len(self.targets[a]) for a in hunters if len(self.targets[a]) < n_targs}
+        need_targs = list(out_deficit)
+        while need_targs:
+            rng.shuffle(need_targs)
+            for a in need_targs:
+                out_deficit[a] -= 1
+                t = self._choose_target(a, pool, rng)
+                if t is not None:
+                    self.add_edge(a, t)
+                    report.new_edges.append((a, t))
+                else:
+                    t = self._reroll(a, pool, report, rng)
+                    if t is None:
+                        report.unfilled += 1
+                        continue
+                in_deficit[t] -= 1
+                if in_deficit[t] == 0:
+                    pool_remove(t)
+            need_targs = [a for a in need_targs if out_deficit[a] > 0]
+
+        if report.unfilled > 0 and fresh and self.can_fill(len(self.nodes), n_targs, self.min_girth):
+            for a, t in report.new_edges:
+                self.remove_edge(a, t)
+            report = AssignmentReport(new_edges=self._assign_circle(n_targs, rng), rerolls=report.rerolls)
+
+        return report
+
+    def write(self, session: Session):
+        """
+        Writes the new edges to the database with a single bulk insert,
+        and expires the `targets` and `assassins` of any affected Assassin objects already loaded in `session`.
+        :param session: The sqlalchemy.orm.Session to write the edges with.
+        """
+        if not self.new_edges:
+            return
+        session.execute(insert(TargRel), [{"assassin_id": a, "target_id": t} for a, t in self.new_edges])
+
+        touched = {n for edge in self.new_edges for n in edge}
+        for obj in list(session.identity_map.values()):
+            if isinstance(obj, Assassin) and obj.id in touched:
+                session.expire(obj, ["targets", "assassins"])
+        self.new_edges = set()
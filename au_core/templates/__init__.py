@@ -1,12 +1,62 @@
 """
 templates.__init__.py
 
-Configures the Jinja2 environment.
+Configures the Jinja2 environment, and the registry of compiled templates.
+If the `template_cache_dir` config option is set, compiled templates are also cached on disk as bytecode,
+so that they do not have to be recompiled every time the program starts.
 """
 
-from jinja2 import Environment, PackageLoader, select_autoescape
+from pathlib import Path
+from jinja2 import Environment, PackageLoader, FileSystemBytecodeCache, Template, select_autoescape
+from ..config import config
+
+def _bytecode_cache():
+    """
+    :return: A FileSystemBytecodeCache in the `template_cache_dir` directory (relative to au_core), or None if not set.
+    """
+    if not config["template_cache_dir"]:
+        return None
+    directory = (Path(__file__).parent.parent / config["template_cache_dir"]).resolve()
+    directory.mkdir(parents=True, exist_ok=True)
+    return FileSystemBytecodeCache(str(directory))
 
 env = Environment(
     loader=PackageLoader('au_core', 'templates'),
-    autoescape=select_autoescape()
+    autoescape=select_autoescape(),
+    bytecode_cache=_bytecode_cache()
 )
+
+class TemplateRegistry:
+    """
+    Holds the compiled Template objects so that they are loaded once, rather than by calling `env.get_template`
+    (which checks whether the template file has changed) every time something is rendered.
+    """
+
+    def __init__(self, environment: Environment):
+        self.env = environment
+        self._templates = {}
+
+    def __getitem__(self, name: str) -> Template:
+        """
+        :param name: The filename of the template, e.g. "news.jinja"
+        :return: The compiled template, loading it first if necessary.
+        """
+        template = self._templates.get(name)
+        if template is None:
+            template = self._templates[name] = self.env.get_template(name)
+        return template
+
+    def preload(self):
+        """
+        Loads every template up front, e.g. before rendering a whole site.
+        """
+        for name in self.env.list_templates(extensions=["jinja"]):
+            self[name]
+
+    def macros(self):
+        """
+        :return: The module of macros defined in `macros.jinja`, so that they can be called from Python.
+        """
+        return self["macros.jinja"].module
+
+templates = TemplateRegistry(env)
@@ -0,0 +1,135 @@
+"""
+timeline.py
+
+Defines the `DeathTimeline` class, an in-memory index of the deaths in a game.
+This lets `Player.dead_at` be answered with a binary search instead of a query per call,
+which matters because it is called for every pseudonym rendered in headlines and reports.
+"""
+
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Iterable, Tuple
+from sqlalchemy import select, event
+from sqlalchemy.orm import Session
+from .Death import Death
+
+# key under which the timelines are cached in `Session.info`
+_CACHE_KEY = "death_timelines"
+
+
+class DeathTimeline:
+    """
+    DeathTimeline class
+
+    Maps the id of each victim to the intervals (start, expires) during which they were dead, sorted by start,
+    where `start` is the datetimestamp of the death's event and an `expires` of None means the death is permanent.
+    Alongside each list of intervals is the running maximum of `expires`,
+    so whether a player was dead at a given time is a single bisect.
+
+    Timelines are cached per session (see `for_game`), and are thrown away whenever a Death is added, changed or deleted,
+    an Event's datetimestamp changes, or the session rolls back (which may undo deaths the timeline has seen).
+    """
+
+    def __init__(self, deaths: Iterable[Tuple[int, datetime, Optional[datetime]]]):
+        """
+        :param deaths: (victim_id, start, expires) triples.
+        """
+        intervals = defaultdict(list)
+        for victim_id, start, expires in deaths:
+            intervals[victim_id].append((start, expires))
+
+        self._starts: Dict[int, List[datetime]] = {}
+        # _until[v][i] is the latest expiry of the first i+1 intervals of v, or None if one of them never expires
+        self._until: Dict[int, List[Optional[datetime]]] = {}
+        for victim_id, ivs in intervals.items():
+            ivs.sort(key=lambda iv: iv[0])
+            self._starts[victim_id] = [start for start, expires in ivs]
+            until = []
+            latest = ivs[0][1]
+            for start, expires in ivs:
+                if latest is not None:
+                    latest = None if expires is None else max(latest, expires)
+                until.append(latest)
+            self._until[victim_id] = until
+
+    @classmethod
+    def load(cls, session: Session, game_id: int) -> "DeathTimeline":
+        """
+        Builds the timeline of a game with a single query.
+        :param session: The sqlalchemy.orm.Session to query with.
+        :param game_id: The id of the game to build the timeline for.
+        """
+        from .Event import Event
+        return cls(session.execute(select(Death.victim_id, Event.datetimestamp, Death.expires)
+                                   .join(Event, Event.id == Death.event_id)
+                                   .where(Event.game_id == game_id)
+                                   ))
+
+    @classmethod
+    def for_game(cls, session: Session, game_id: int) -> "DeathTimeline":
+        """
+        :return: The timeline of the game cached on `session`, building it first if necessary.
+        """
+        cache = session.info.setdefault(_CACHE_KEY, {})
+        if game_id not in cache:
+            cache[game_id] = cls.load(session, game_id)
+        return cache[game_id]
+
+    @staticmethod
+    def invalidate(session: Optional[Session]):
+        """
+        Throws away the timelines cached on `session`.
+        This is called automatically when Deaths change through the ORM,
+        but must be called by hand after bulk statements that touch the deaths or events tables.
+        """
+        if session is not None:
+            session.info.pop(_CACHE_KEY, None)
+
+    def dead_at(self, victim_id: int, t: datetime) -> bool:
+        """
+        :param victim_id: The id of the Player we are interested in.
+        :param t: The datetime that we are interested in.
+        :return: Whether the Player was dead at time t
+        """
+        starts = self._starts.get(victim_id)
+        if not starts:
+            return False
+        # number of deaths that happened at or before t
+        i = bisect_right(starts, t)
+        if i == 0:
+            return False
+        until = self._until[victim_id][i - 1]
+        return until is None or until > t
+
+
+# invalidation hooks
+
+@event.listens_for(Session, "transient_to_pending")
+def _on_pending(session: Session, obj):
+    if isinstance(obj, Death):
+        DeathTimeline.invalidate(session)
+
+
+@event.listens_for(Session, "persistent_to_deleted")
+def _on_deleted(session: Session, obj):
+    if isinstance(obj, Death):
+        DeathTimeline.invalidate(session)
+
+
+def _on_death_attribute_set(target: Death, value, oldvalue, initiator):
+    DeathTimeline.invalidate(Session.object_session(target))
+
+
+@event.listens_for(Session, "after_rollback")
+def _on_rollback(session: Session):
+    DeathTimeline.invalidate(session)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _on_soft_rollback(session: Session, previous_transaction):
+    DeathTimeline.invalidate(session)
+
+
+for _attr in (Death.victim_id, Death.event_id, Death.expires):
+    event.listen(_attr, "set", _on_death_attribute_set)
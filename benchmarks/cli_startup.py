@@ -0,0 +1,63 @@
+"""
+cli_startup.py
+
+Measures the cold-start cost of the CLI with `python -X importtime`:
+what the shell imports before its prompt appears (au_core, the command registry and `help`),
+compared with importing every command module up front, as the shell used to.
+
+Each measurement runs in a fresh interpreter against a scratch in-memory database.
+Usage: python benchmarks/cli_startup.py [-n REPEATS] [--top N]
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+from statistics import median
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLI_DIR = os.path.join(ROOT, "au_cli")
+
+# what the shell imports before showing its prompt
+STARTUP_IMPORTS = "import au_core, commands, help"
+# the same, plus every command module in the manifest
+EAGER_IMPORTS = STARTUP_IMPORTS + "\nfor m in sorted({e[0] for e in commands.MANIFEST}): __import__(m)"
+
+importtime_line = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def measure(code: str):
+    """
+    Runs `code` in a fresh interpreter with -X importtime.
+    :return: (total import time in seconds, {module: cumulative import time in seconds} for top-level imports)
+    """
+    env = dict(os.environ, AUTOUMPIRE_DB_ADDRESS="sqlite://", AUTOUMPIRE_VERBOSE="0",
+               PYTHONPATH=os.pathsep.join([CLI_DIR, ROOT]))
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          env=env, cwd=ROOT, capture_output=True, text=True, check=True)
+    top_level = {}
+    for m in importtime_line.finditer(proc.stderr):
+        if m[3] == "":
+            top_level[m[4]] = int(m[2]) / 1e6
+    return sum(top_level.values()), top_level
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--repeats", type=int, default=5, help="Number of runs to take the median of.")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest top-level imports to list.")
+    args = parser.parse_args()
+
+    for name, code in (("startup (lazy commands)", STARTUP_IMPORTS), ("all commands imported", EAGER_IMPORTS)):
+        runs = [measure(code) for _ in range(args.repeats)]
+        total = median(t for t, modules in runs)
+        print(f"{name}: {total * 1000:.0f} ms of imports (median of {args.repeats})")
+        modules = runs[-1][1]
+        for module, t in sorted(modules.items(), key=lambda kv: -kv[1])[:args.top]:
+            print(f"    {t * 1000:7.1f} ms  {module}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
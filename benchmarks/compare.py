@@ -0,0 +1,46 @@
+"""
+compare.py
+
+Compares two sets of results written by `suite.py`, e.g. from before and after a change.
+Usage: python benchmarks/compare.py BEFORE.json AFTER.json
+"""
+
+import argparse
+import json
+
+from tabulate import tabulate
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("before", help="The results to compare against.")
+    parser.add_argument("after", help="The new results.")
+    args = parser.parse_args()
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    # results without a generator version predate `au_core.generator`, and are never comparable with those which have one
+    if any(before["meta"].get(key) != after["meta"].get(key) for key in ("generator", "seed", "sizes")):
+        print("Warning: the results are for different synthetic games.")
+
+    rows = []
+    for name in before["results"].keys() | after["results"].keys():
+        b = before["results"].get(name)
+        a = after["results"].get(name)
+        if b is None or a is None:
+            rows.append([name, b and b["seconds"] * 1000, a and a["seconds"] * 1000, None,
+                         b and b["statements"], a and a["statements"]])
+            continue
+        rows.append([name, b["seconds"] * 1000, a["seconds"] * 1000, f"{a['seconds'] / b['seconds']:.2f}x",
+                     b["statements"], a["statements"]])
+    rows.sort(key=lambda row: row[0])
+    print(f"before: {before['meta'].get('commit')}")
+    print(f"after:  {after['meta'].get('commit')}")
+    print(tabulate(rows, headers=["benchmark", "before (ms)", "after (ms)", "ratio", "statements before",
+                                  "statements after"], floatfmt=".1f"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+game_start.py
+
+Times `Game.start` for games of 100, 1 000 and 10 000 assassins,
+and compares how long setting the initial competence deadlines takes with a single bulk UPDATE (as `start` now does)
+against setting them on each loaded Assassin object from a thread pool and flushing (as `start` used to).
+
+The games are created in a scratch in-memory database, so this never touches the database in `config.json`.
+Usage: python benchmarks/game_start.py [-s SIZE [SIZE ...]]
+"""
+
+import argparse
+import concurrent.futures
+import contextlib
+import io
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+# use a scratch database -- this must be set before au_core is imported
+os.environ["AUTOUMPIRE_DB_ADDRESS"] = "sqlite://"
+os.environ["AUTOUMPIRE_VERBOSE"] = "0"
+
+# some nonsense to allow us to import from the above directory
+sys.path.append( os.path.dirname( os.path.dirname( os.path.abspath(__file__) ) ) )
+
+import au_core as au
+from au_core.Player import Player
+from au_core.generator import GeneratorSizes, generate_game
+from sqlalchemy import select, update
+from tabulate import tabulate
+
+SIZES = (100, 1000, 10000)
+
+
+def make_game(session, name: str, n: int) -> au.Game:
+    """
+    :return: A new, committed, unstarted game with `n` assassins (see `au_core.generator`).
+    """
+    game = au.Game(name=name)
+    session.add(game)
+    session.flush()
+    generate_game(game, sizes=GeneratorSizes(players=n, police=0, events=0, deaths=0, reports=0), start=False)
+    session.commit()
+    return game
+
+
+def per_object_deadlines(game: au.Game):
+    """
+    Sets the competence deadlines the way `Game.start` used to: on each loaded Assassin from a thread pool.
+    """
+    session = game.session
+    deadline = datetime.now(timezone.utc) + game.initial_competence
+    assassins = session.scalars(select(au.Assassin).filter_by(game_id=game.id))
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        executor.map(lambda a: setattr(a, "competence_deadline", deadline), assassins)
+    session.flush()
+
+
+def bulk_deadlines(game: au.Game):
+    """
+    Sets the competence deadlines the way `Game.start` does now: with a single UPDATE.
+    """
+    assassins = au.Assassin.__table__
+    deadline = datetime.now(timezone.utc) + game.initial_competence
+    game.session.execute(update(assassins)
+                         .where(assassins.c.id.in_(select(Player.id).where(Player.game_id == game.id)))
+                         .values(competence_deadline=deadline))
+
+
+def timed(f, *args) -> float:
+    start = time.perf_counter()
+    f(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-s", "--sizes", nargs="+", type=int, default=SIZES, help="The numbers of assassins to time.")
+    args = parser.parse_args()
+
+    rows = []
+    with au.db.Session() as session:
+        for n in args.sizes:
+            old = timed(per_object_deadlines, make_game(session, f"Old{n}", n))
+            session.rollback()
+            new = timed(bulk_deadlines, make_game(session, f"New{n}", n))
+            session.rollback()
+
+            game = make_game(session, f"Start{n}", n)
+            def start():
+                # `start` prints the number of re-rolls
+                with contextlib.redirect_stdout(io.StringIO()):
+                    game.start()
+                session.commit()
+            total = timed(start)
+            rows.append([n, f"{old * 1000:.1f}", f"{new * 1000:.1f}", f"{old / new:.0f}x", f"{total * 1000:.1f}"])
+
+    print(tabulate(rows, headers=["assassins", "deadlines per object (ms)", "deadlines bulk UPDATE (ms)", "speedup",
+                                  "whole start + commit (ms)"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+query_plans.py
+
+Shows SQLite's query plan for each of AutoUmpire's hot queries,
+first without any of the secondary indexes declared on the models, then with them,
+so you can check that each query is answered with an index search rather than a full table scan.
+
+The schema is created in a scratch in-memory database, so this never touches the database in `config.json`.
+Usage: python benchmarks/query_plans.py
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+
+# use a scratch database -- this must be set before au_core is imported
+os.environ["AUTOUMPIRE_DB_ADDRESS"] = "sqlite://"
+os.environ["AUTOUMPIRE_VERBOSE"] = "0"
+
+# some nonsense to allow us to import from the above directory
+sys.path.append( os.path.dirname( os.path.dirname( os.path.abspath(__file__) ) ) )
+
+import au_core as au
+from au_core.TargRel import TargRel
+from sqlalchemy import select, and_
+from sqlalchemy.schema import CreateIndex, DropIndex
+from tabulate import tabulate
+
+t = datetime(2026, 1, 5)
+
+# (description, select statement) for each hot query
+HOT_QUERIES = [
+    ("deaths of a player", select(au.Death).where(au.Death.victim_id == 1)),
+    ("death timeline of a game", select(au.Death.victim_id, au.Event.datetimestamp, au.Death.expires)
+        .join(au.Event, au.Event.id == au.Death.event_id).where(au.Event.game_id == 1)),
+    ("events in a week", select(au.Event)
+        .where(and_(au.Event.game_id == 1, t <= au.Event.datetimestamp, au.Event.datetimestamp < t + timedelta(weeks=1)))
+        .order_by(au.Event.datetimestamp)),
+    ("headlines of a game", select(au.Event).where(au.Event.game_id == 1).order_by(au.Event.datetimestamp)),
+    ("reports of events", select(au.Report).where(au.Report.event_id.in_([1, 2, 3]))),
+    ("registrations by email", select(au.Registration).filter_by(game_id=1, email="a@cam.ac.uk")),
+    ("registrations by realname", select(au.Registration).filter_by(game_id=1, realname="A")),
+    ("players of a game", select(au.Player).where(au.Player.game_id == 1)),
+    ("pseudonyms of a player", select(au.Pseudonym).where(au.Pseudonym.owner_id == 1)),
+    ("assassins of a target", select(TargRel.assassin_id).where(TargRel.target_id == 1)),
+    ("targets of an assassin", select(TargRel.target_id).where(TargRel.assassin_id == 1)),
+    ("pending outbox of a game", select(au.Outbox).where(au.Outbox.status == au.OutboxStatus.PENDING,
+                                                         au.Outbox.game_id == 1)),
+]
+
+
+def query_plan(conn, stmt, label: str) -> str:
+    """
+    :param label: A label put in a comment in the SQL, which must differ between schemas,
+    since sqlite3 caches prepared statements by their SQL and does not re-plan a cached EXPLAIN when the schema changes.
+    :return: SQLite's query plan for `stmt`, one step per line.
+    """
+    compiled = stmt.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True})
+    rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN /* {label} */ " + str(compiled))
+    return "\n".join(row[-1] for row in rows)
+
+
+def main():
+    engine = au.db.engine
+    # the secondary indexes, as opposed to primary keys and unique constraints
+    indexes = [index for table in au.Base.metadata.sorted_tables for index in table.indexes]
+
+    with engine.begin() as conn:
+        after = [query_plan(conn, stmt, "with indexes") for name, stmt in HOT_QUERIES]
+        for index in indexes:
+            conn.execute(DropIndex(index))
+        before = [query_plan(conn, stmt, "without indexes") for name, stmt in HOT_QUERIES]
+        for index in indexes:
+            conn.execute(CreateIndex(index))
+
+    print(f"Secondary indexes: {', '.join(index.name for index in indexes)}")
+    print()
+    print(tabulate([[name, b, a] for (name, stmt), b, a in zip(HOT_QUERIES, before, after)],
+                   headers=["query", "plan without indexes", "plan with indexes"], tablefmt="grid"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+suite.py
+
+Times the hot paths of au_core on a synthetic game (see `au_core.generator`), and writes the results as JSON,
+so that runs from different commits can be compared (see `compare.py`).
+
+Everything runs offline, in a scratch in-memory SQLite database, and emails are "sent" through a transport which
+discards them, so this never touches the database in `config.json` or sends any email.
+Each benchmark records its time in seconds, and the number of SQL statements it ran and the time they took
+(see `au_core.profiling`).
+Benchmarks which do not change the game are run `--repeat` times, and the best and median times recorded.
+
+Usage: python benchmarks/suite.py [-o results.json] [--seed SEED] [--players N] [--police P] [--events M] [--refs K]
+                                  [--deaths D] [--reports R] [--weeks W] [--repeat REPEAT]
+"""
+
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from dataclasses import fields, replace
+from datetime import datetime, timezone
+from enum import Enum
+from typing import Callable, Dict
+
+# use a scratch database -- this must be set before au_core is imported
+os.environ["AUTOUMPIRE_DB_ADDRESS"] = "sqlite://"
+os.environ["AUTOUMPIRE_VERBOSE"] = "0"
+
+# some nonsense to allow us to import from the above directory, and from au_cli
+ROOT = os.path.dirname( os.path.dirname( os.path.abspath(__file__) ) )
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "au_cli"))
+
+import sqlalchemy
+import au_core as au
+from au_core.TargRel import TargRel
+from au_core.bulk_import import REGISTRATION_FIELDS, RegistrationImporter
+from au_core.generator import GENERATOR_VERSION, GeneratorSizes, generate_game, registrations
+from au_core.profiling import QueryProfiler
+from sqlalchemy import select, delete
+from load_csv import parse_csv
+
+
+class NullTransport:
+    """
+    A mail transport which discards every message, for timing `send_updates` without a mail server.
+    """
+    size = 4
+
+    def __init__(self):
+        self.sent = 0
+
+    def send_message(self, message):
+        self.sent += 1
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Suite:
+    def __init__(self):
+        self.results: Dict[str, Dict] = {}
+
+    def time(self, name: str, f: Callable[[], None], repeat: int = 1):
+        """
+        Times `f`, running it `repeat` times, and records the result under `name`.
+        """
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            # hide anything printed, e.g. by `Game.start`, and warnings, e.g. of duplicated names in the signups
+            with contextlib.redirect_stdout(io.StringIO()), warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                with QueryProfiler(name) as profile:
+                    f()
+            times.append(time.perf_counter() - start)
+        self.results[name] = {"seconds": statistics.median(times), "best": min(times), "runs": repeat,
+                              "statements": profile.statements, "db_seconds": profile.db_time}
+        print(f"{name:24} {statistics.median(times) * 1000:9.1f} ms {profile.statements:7} statements",
+              file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-o", "--output", help="The file to write the JSON results to. Defaults to stdout.")
+    parser.add_argument("--seed", type=int, default=0, help="The seed for the synthetic game.")
+    for f in fields(GeneratorSizes):
+        parser.add_argument(f"--{f.name}", type=int, default=f.default, help=f"The number of {f.name}.")
+    parser.add_argument("--repeat", type=int, default=5, help="How many times to run each read-only benchmark.")
+    args = parser.parse_args()
+
+    sizes = GeneratorSizes(**{f.name: getattr(args, f.name) for f in fields(GeneratorSizes)})
+    rng = random.Random(args.seed)
+    suite = Suite()
+
+    with tempfile.TemporaryDirectory() as tmp, au.db.Session() as session:
+        # loading a signup sheet into an empty game
+        csv_path = os.path.join(tmp, "signups.csv")
+        with open(csv_path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=REGISTRATION_FIELDS)
+            writer.writeheader()
+            for reg in registrations(rng, sizes.players, sizes.police):
+                writer.writerow({f: v.value if isinstance(v, Enum) else v
+                                 for f, v in ((f, getattr(reg, f)) for f in REGISTRATION_FIELDS)})
+        csv_game = au.Game(name="CSV")
+        session.add(csv_game)
+        session.commit()
+        result = None
+        def parse():
+            nonlocal result
+            result = parse_csv(csv_path, csv_game)
+        suite.time("parse_csv", parse)
+        def load():
+            RegistrationImporter(csv_game).insert(result.accepted)
+            session.commit()
+        suite.time("load_csv", load)
+
+        # generating a whole game
+        generated = au.Game(name="Generated")
+        session.add(generated)
+        session.commit()
+        def generate():
+            generate_game(generated, args.seed, sizes)
+            session.commit()
+        suite.time("generate_game", generate)
+
+        # the game the other benchmarks run on: players only at first, then events once it has started
+        game = au.Game(name="Benchmark")
+        session.add(game)
+        session.flush()
+        generate_game(game, args.seed, replace(sizes, events=0, deaths=0, reports=0), start=False)
+        session.commit()
+
+        def start():
+            game.start(rng)
+            session.commit()
+        suite.time("start", start)
+
+        def assign_targets():
+            game.assign_targets(rng)
+            session.commit()
+        def clear_targets():
+            session.execute(delete(TargRel))
+            session.commit()
+        clear_targets()
+        suite.time("assign_targets", assign_targets)
+
+        generate_game(game, args.seed, replace(sizes, players=0, police=0))
+        session.commit()
+
+        def single_kill():
+            victim = session.scalar(select(au.Assassin).filter_by(game_id=game.id, alive=True).limit(1))
+            game.mark_dead(victim)
+            game.reassign_targets(rng)
+            session.commit()
+        suite.time("single_kill", single_kill)
+
+        game_id = game.id
+        def in_fresh_session(f: Callable[[au.Game], None]) -> Callable[[], None]:
+            # render from a cold session each time, as the CLI does
+            def run():
+                with au.db.Session() as s:
+                    f(s.get(au.Game, game_id))
+            return run
+        suite.time("generate_headlines", in_fresh_session(lambda g: g.generate_headlines()), args.repeat)
+        suite.time("generate_news_page", in_fresh_session(lambda g: g.generate_news_page(1)), args.repeat)
+
+        transport = NullTransport()
+        def send_updates():
+            game.queue_updates("Benchmark update")
+            game.dispatch_updates(transport=transport)
+        suite.time("send_updates", send_updates)
+
+    output = {
+        "meta": {
+            "commit": git_commit(),
+            "time": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "sqlalchemy": sqlalchemy.__version__,
+            "platform": platform.platform(),
+            "generator": GENERATOR_VERSION,
+            "seed": args.seed,
+            "sizes": vars(sizes),
+        },
+        "results": suite.results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(output, f, indent=2)
+    else:
+        json.dump(output, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+"""
+conftest.py
+
+Points au_core at a scratch in-memory database before any test imports it,
+so that the tests never touch the database in `config.json`.
+"""
+
+import os
+import sys
+
+os.environ["AUTOUMPIRE_DB_ADDRESS"] = "sqlite://"
+os.environ["AUTOUMPIRE_VERBOSE"] = "0"
+
+# some nonsense to allow us to import from the above directory
+sys.path.append( os.path.dirname( os.path.dirname( os.path.abspath(__file__) ) ) )
@@ -0,0 +1,124 @@
+"""
+test_bulk_import.py
+
+Tests of importing many registrations at once with the RegistrationImporter.
+"""
+
+import pytest
+
+import au_core as au
+from au_core.bulk_import import RegistrationImporter
+from au_core.enums import College, RegType, WaterStatus
+from au_core.Police import Police
+from au_core.profiling import QueryProfiler
+from au_core.Pseudonym import Pseudonym
+from au_core.Registration import DuplicateWarning
+
+
+def row(i: int, **overrides) -> dict:
+    values = {"realname": f"player {i}",
+              "email": f"player{i}@cam.ac.uk",
+              "initial_pseudonym": f"Pseudonym {i}",
+              "college": College.CHRISTS.value,
+              "address": f"{i} Court",
+              "water": WaterStatus.FULL.value,
+              "notes": "",
+              "type": (RegType.POLICE if i % 3 == 0 else RegType.FULL).value}
+    return values | overrides
+
+
+def reasons(result) -> dict:
+    return {r.index: r.reason for r in result.rejected}
+
+
+def test_inserted_players_match_their_rows():
+    with au.db.Session() as session:
+        game = au.create_game_w_session(session, "Import")
+        # interleave the types, so that a mix-up between registrations and players would show
+        rows = [row(i) for i in range(60)]
+        result = RegistrationImporter(game).import_rows(rows)
+        session.commit()
+        assert not result.rejected
+        assert len(result.player_ids) == len(rows) == len(set(result.player_ids))
+        for r, player_id in zip(rows, result.player_ids):
+            player = session.get(au.Player, player_id)
+            assert player.reg.initial_pseudonym == r["initial_pseudonym"]
+            assert player.reg.email == r["email"]
+            assert player.reg.realname == r["realname"].title()
+            assert isinstance(player, Police if r["type"] == RegType.POLICE.value else au.Assassin)
+            assert [p.text for p in player.pseudonyms] == [r["initial_pseudonym"]]
+
+
+def test_rejection_reasons():
+    with au.db.Session() as session:
+        game = au.create_game_w_session(session, "Rejections")
+        player_ids = RegistrationImporter(game).import_rows([row(i) for i in range(3)]).player_ids
+        # a pseudonym which is taken, but not as anyone's initial pseudonym
+        session.add(Pseudonym(owner_id=player_ids[0], game_id=game.id, text="Later Pseudonym"))
+        session.commit()
+
+        # a fresh importer only knows what is in the database
+        rows = [row(10),
+                row(11, email="player0@cam.ac.uk"),  # already in the database
+                row(12, email="player10@cam.ac.uk"),  # earlier in the file
+                row(13, initial_pseudonym="Pseudonym 1"),  # already in the database
+                row(14, initial_pseudonym="Pseudonym 10"),  # earlier in the file
+                row(15, initial_pseudonym="Later Pseudonym"),
+                row(16, initial_pseudonym=""),
+                row(17, college="Hogwarts"),
+                row(18, email="not an email")]
+        result = RegistrationImporter(game).import_rows(rows, first_index=1)
+        session.commit()
+        assert reasons(result) == {2: "player0@cam.ac.uk is already registered",
+                                   3: "player10@cam.ac.uk is already registered",
+                                   4: "Pseudonym 1 is already an initial pseudonym",
+                                   5: "Pseudonym 10 is already an initial pseudonym",
+                                   6: "Later Pseudonym is already an initial pseudonym",
+                                   7: "Empty initial_pseudonym",
+                                   8: "'Hogwarts' is not a valid College",
+                                   9: "An email address must have an @-sign."}
+        assert all(r.row is rows[r.index - 1] for r in result.rejected)
+        assert [r.initial_pseudonym for r in result.accepted] == ["Pseudonym 10"]
+        assert len(session.scalars(game.players.select()).all()) == 4
+
+
+def test_duplicates_between_batches_are_rejected():
+    with au.db.Session() as session:
+        game = au.create_game_w_session(session, "Batches")
+        importer = RegistrationImporter(game)
+        importer.validate([row(0), row(1)])
+        # nothing has been inserted, but the importer remembers what it accepted
+        result = importer.validate([row(2, email="player0@cam.ac.uk"), row(3, initial_pseudonym="Pseudonym 1")],
+                                   first_index=2)
+        assert reasons(result) == {2: "player0@cam.ac.uk is already registered",
+                                   3: "Pseudonym 1 is already an initial pseudonym"}
+
+
+def test_duplicate_emails_and_names_only_warn_when_allowed():
+    with au.db.Session() as session:
+        game = au.create_game_w_session(session, "Warnings")
+        RegistrationImporter(game).import_rows([row(0)])
+        session.commit()
+        with pytest.warns(DuplicateWarning) as warnings:
+            result = RegistrationImporter(game, enforce_unique_email=False).import_rows(
+                [row(1, email="player0@cam.ac.uk", realname="Player 0")])
+        assert not result.rejected and len(result.player_ids) == 1
+        assert {str(w.message) for w in warnings} == {"player0@cam.ac.uk is also the email of another registration",
+                                                      "Player 0 is also the name of another registration"}
+
+
+@pytest.mark.parametrize("n_rows", [10, 200])
+def test_validation_queries_do_not_grow_with_the_rows(n_rows):
+    with au.db.Session() as session:
+        game = au.create_game_w_session(session, f"Queries {n_rows}")
+        RegistrationImporter(game).import_rows([row(i) for i in range(0, 2 * n_rows, 2)])
+        session.commit()
+        rows = [row(i) for i in range(n_rows, 2 * n_rows)]
+        session.refresh(game)
+        with QueryProfiler() as profile:
+            result = RegistrationImporter(game).validate(rows)
+        # one IN query each for emails, initial pseudonyms, other pseudonyms and real names
+        assert profile.statements == 4
+        assert all("IN (?...)" in s.fingerprint for s in profile.by_fingerprint.values())
+        # the even rows from n_rows on are already in the database
+        assert len(result.rejected) == (n_rows + 1) // 2
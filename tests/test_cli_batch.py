@@ -0,0 +1,66 @@
+"""
+test_cli_batch.py
+
+Tests running scripts of commands through the CLI in batch mode (see `au_cli.__main__.run_batch`).
+The CLI is run in a subprocess, against a scratch SQLite database.
+"""
+
+import os
+import sqlite3
+import subprocess
+import sys
+
+ROOT = os.path.dirname( os.path.dirname( os.path.abspath(__file__) ) )
+
+
+def run_batch(tmp_path, script: str, *args: str) -> (subprocess.CompletedProcess, set):
+    """
+    Runs `script` through the CLI in batch mode.
+    :return: The finished process, and the names of the games in the database afterwards.
+    """
+    db_path = tmp_path / "batch.db"
+    script_path = tmp_path / "script.txt"
+    script_path.write_text(script)
+    env = dict(os.environ, AUTOUMPIRE_DB_ADDRESS=f"sqlite:///{db_path}", AUTOUMPIRE_VERBOSE="0", PYTHONPATH=ROOT)
+    result = subprocess.run([sys.executable, "au_cli", "--batch", str(script_path), *args],
+                            cwd=ROOT, env=env, capture_output=True, text=True, timeout=60)
+    with sqlite3.connect(db_path) as conn:
+        games = {name for name, in conn.execute("SELECT name FROM games")}
+    return result, games
+
+
+def test_batch_commits_at_the_end(tmp_path):
+    result, games = run_batch(tmp_path, "switchgame Alpha\n\n# a comment\nswitchgame Beta\n")
+    assert result.returncode == 0, result.stderr
+    assert "Ran 2 command(s)." in result.stdout
+    assert games == {"Alpha", "Beta"}
+
+
+def test_quit_ends_the_batch(tmp_path):
+    result, games = run_batch(tmp_path, "switchgame Alpha\nquit\nswitchgame Beta\n")
+    assert result.returncode == 0, result.stderr
+    assert games == {"Alpha"}
+
+
+def test_failure_rolls_back_the_batch(tmp_path):
+    # `switchgame` with no arguments asks which game to load, which cannot be answered in batch mode
+    result, games = run_batch(tmp_path, "switchgame Alpha\nswitchgame\nswitchgame Beta\n")
+    assert result.returncode == 1
+    assert "Error on line 2: switchgame" in result.stderr
+    assert "BatchInputError" in result.stderr
+    assert "Rolled back the 1 command(s) since the last commit." in result.stderr
+    assert games == set()
+
+
+def test_failure_keeps_what_was_committed(tmp_path):
+    result, games = run_batch(tmp_path, "switchgame Alpha\nswitchgame\nswitchgame Beta\n", "--commit-every", "1")
+    assert result.returncode == 1
+    assert "Rolled back the 0 command(s) since the last commit." in result.stderr
+    assert games == {"Alpha"}
+
+
+def test_unknown_command_rolls_back(tmp_path):
+    result, games = run_batch(tmp_path, "switchgame Alpha\nnosuchcommand\n")
+    assert result.returncode == 1
+    assert "InvalidCommandError" in result.stderr
+    assert games == set()
@@ -0,0 +1,25 @@
+"""
+test_commands.py
+
+Tests that the manifest of lazily-imported commands (see `au_cli.commands.MANIFEST`) agrees with the commands' modules.
+"""
+
+import os
+import sys
+
+import pytest
+
+# the CLI modules import each other as top-level modules
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "au_cli"))
+import commands
+
+
+@pytest.mark.parametrize("module, primary_name, aliases, description", commands.MANIFEST,
+                         ids=[entry[1] for entry in commands.MANIFEST])
+def test_manifest_matches_the_registered_command(module, primary_name, aliases, description):
+    # `help` lists the manifest's descriptions without importing anything, so every command needs one
+    assert description
+    cmd = commands.lookup(primary_name)
+    assert cmd.module is None and cmd.primary_name == primary_name
+    assert cmd.description == description
+    assert set(cmd.aliases) == set(aliases) | {primary_name}
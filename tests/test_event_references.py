@@ -0,0 +1,125 @@
+"""
+test_event_references.py
+
+Tests that the event_references index (see `au_core.EventReference`) follows the events and reports it indexes,
+and that it is filled in when migrating a database from before it existed.
+"""
+
+from datetime import datetime, timezone, timedelta
+
+from sqlalchemy import create_engine, select, insert
+
+import au_core as au
+from au_core import migrations
+from au_core.Base import Base
+from au_core.EventReference import EventReference, mentions_of, rebuild_references
+from au_core.Report import Report
+from au_core.enums import ReferenceKind
+from au_core.generator import GeneratorSizes, generate_game
+
+START = datetime(2020, 1, 20, 12, tzinfo=timezone.utc)
+
+
+def players_and_pseudonyms(session, name: str, n: int = 5):
+    game = au.create_game_w_session(session, name)
+    generate_game(game, sizes=GeneratorSizes(players=n, police=0, events=0, deaths=0, reports=0))
+    session.commit()
+    players = session.scalars(game.players.select().order_by(au.Player.id)).all()
+    return game, players, [p.pseudonyms[0].id for p in players]
+
+
+def mentions(session, player) -> list:
+    return [(e.id, kinds, n) for e, kinds, n in mentions_of(session, player.id)]
+
+
+def index_rows(session, event_ids) -> set:
+    return {tuple(row) for row in session.execute(
+        select(EventReference.event_id, EventReference.report_id, EventReference.kind,
+               EventReference.pseudonym_id, EventReference.player_id)
+        .where(EventReference.event_id.in_(event_ids)))}
+
+
+def test_mentions_follow_edits():
+    with au.db.Session() as session:
+        game, (a, b, c, *_), (pa, pb, pc, *_) = players_and_pseudonyms(session, "Mentions")
+        first = au.Event(headline=f"<@{pa}> killed <#{pb}>", datetimestamp=START, game=game)
+        second = au.Event(headline=f"<@{pa}> and <@{pa}> met", datetimestamp=START + timedelta(days=1), game=game)
+        session.add_all([first, second])
+        session.commit()
+        assert mentions(session, a) == [(first.id, {ReferenceKind.PSEUDONYM}, 1), (second.id, {ReferenceKind.PSEUDONYM}, 1)]
+        assert mentions(session, b) == [(first.id, {ReferenceKind.PLAYER}, 1)]
+        assert mentions(session, c) == []
+
+        # a report adds its references and its author
+        report = Report(event=first, body=f"I saw <@{pc}>", author_id=pb)
+        session.add(report)
+        session.commit()
+        assert mentions(session, b) == [(first.id, {ReferenceKind.PLAYER, ReferenceKind.AUTHOR}, 2)]
+        assert mentions(session, c) == [(first.id, {ReferenceKind.PSEUDONYM}, 1)]
+
+        # a second pseudonym of the same player counts as a mention of them
+        new_pseudonym = au.Pseudonym(owner_id=c.id, game_id=game.id, text="Charlie's other name")
+        session.add(new_pseudonym)
+        session.flush()
+        second.headline = f"<@{pa}> met <@{new_pseudonym.id}>"
+        session.commit()
+        assert mentions(session, a) == [(first.id, {ReferenceKind.PSEUDONYM}, 1), (second.id, {ReferenceKind.PSEUDONYM}, 1)]
+        assert mentions(session, c) == [(first.id, {ReferenceKind.PSEUDONYM}, 1), (second.id, {ReferenceKind.PSEUDONYM}, 1)]
+
+        # editing a report, then moving it to another event
+        report.body = "I saw nothing"
+        session.commit()
+        assert mentions(session, c) == [(second.id, {ReferenceKind.PSEUDONYM}, 1)]
+        report.event = second
+        session.commit()
+        assert mentions(session, b) == [(first.id, {ReferenceKind.PLAYER}, 1), (second.id, {ReferenceKind.AUTHOR}, 1)]
+
+        # deleting the report, then the event
+        session.delete(report)
+        session.commit()
+        assert mentions(session, b) == [(first.id, {ReferenceKind.PLAYER}, 1)]
+        session.delete(first)
+        session.commit()
+        assert mentions(session, b) == []
+        assert index_rows(session, [first.id]) == set()
+
+
+def test_index_matches_a_rebuild():
+    with au.db.Session() as session:
+        game = au.create_game_w_session(session, "Rebuild")
+        generate_game(game, sizes=GeneratorSizes(players=20, police=2, events=40, deaths=8, reports=30))
+        session.commit()
+        event_ids = session.scalars(select(au.Event.id).filter_by(game_id=game.id)).all()
+        indexed = index_rows(session, event_ids)
+        assert indexed
+        rebuild_references(session.connection(), event_ids)
+        assert index_rows(session, event_ids) == indexed
+
+
+def test_migrate_from_before_the_index(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'unindexed.db'}")
+    tables = Base.metadata.tables
+    with engine.begin() as conn:
+        Base.metadata.create_all(conn, tables=[t for t in Base.metadata.sorted_tables if t.name != "event_references"])
+        migrations._set_version(conn, migrations.CURRENT_VERSION - 1)
+        # written with Core statements, which are not indexed as they are inserted
+        conn.execute(insert(tables["games"]).values(id=1, name="Lent 2020", live=True, started=START, n_targs=2,
+                                                   initial_competence=timedelta(days=7), locale="en_GB",
+                                                   min_girth=3, targets_dirty=False))
+        for i, name in ((1, "Alpha"), (2, "Bravo")):
+            conn.execute(insert(tables["registrations"]).values(
+                id=i, realname=name, college="CHRISTS", address=f"{i} Court", water="FULL", notes="",
+                email=f"{name.lower()}@cam.ac.uk", initial_pseudonym=name, type="FULL", game_id=1))
+            conn.execute(insert(tables["players"]).values(id=i, type="assassin", reg_id=i, game_id=1))
+            conn.execute(insert(tables["assassins"]).values(id=i, alive=True))
+            conn.execute(insert(tables["pseudonyms"]).values(id=i, game_id=1, text=name, colour="DEFAULT", owner_id=i))
+        conn.execute(insert(tables["events"]).values(id=1, headline="<@1> killed <#2>", datetimestamp=START, game_id=1))
+        conn.execute(insert(tables["reports"]).values(id=1, body="I saw <@1>", event_id=1, author_id=2,
+                                                     datetimestamp=START))
+
+    assert [m.version for m in migrations.migrate(engine)] == [migrations.CURRENT_VERSION]
+    with engine.connect() as conn:
+        assert set(conn.execute(select(EventReference.report_id, EventReference.kind,
+                                       EventReference.pseudonym_id, EventReference.player_id))) == {
+            (None, ReferenceKind.PSEUDONYM, 1, 1), (None, ReferenceKind.PLAYER, 2, 2),
+            (1, ReferenceKind.PSEUDONYM, 1, 1), (1, ReferenceKind.AUTHOR, 2, 2)}
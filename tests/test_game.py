@@ -0,0 +1,112 @@
+"""
+test_game.py
+
+Tests of the Game class.
+"""
+
+import random
+
+import pytest
+from sqlalchemy import insert, select
+
+import au_core as au
+from au_core.TargRel import TargRel
+from au_core.generator import GeneratorSizes, generate_game
+from au_core.targetting import TargettingGraph
+from test_targetting import girth
+
+
+def test_weeks_agree():
+    with au.db.Session() as session:
+        game = au.create_game_w_session(session, "Weeks")
+        generate_game(game, sizes=GeneratorSizes(players=10, police=1, events=60, deaths=5, reports=0, weeks=4))
+        session.commit()
+        events = session.scalars(game.events.select()).all()
+        weeks = {e.week() for e in events}
+        assert weeks == {1, 2, 3, 4}
+        for week_n in weeks:
+            start, end = game.week_bounds(week_n)
+            assert game.week_of(start) == week_n
+            assert {e.id for e in game.events_in_week(week_n)} == {e.id for e in events if e.week() == week_n}
+
+
+def started_game(session, name: str, n: int, seed: int = 0, n_targs: int = 3, min_girth: int = 3) -> au.Game:
+    game = au.create_game_w_session(session, name)
+    game.n_targs = n_targs
+    game.min_girth = min_girth
+    generate_game(game, seed, GeneratorSizes(players=n, police=0, events=0, deaths=0, reports=0))
+    session.commit()
+    return game
+
+
+def game_edges(session, game: au.Game) -> set:
+    return {tuple(edge) for edge in session.execute(select(TargRel.assassin_id, TargRel.target_id)
+                                                    .join(au.Assassin, au.Assassin.id == TargRel.assassin_id)
+                                                    .where(au.Assassin.game_id == game.id))}
+
+
+def check_survivors(session, game: au.Game):
+    # every alive assassin has a full set of targets and assassins, and no cycle is too short
+    graph = TargettingGraph.load(session, game.id, game.min_girth)
+    assert all(len(graph.targets[n]) == game.n_targs and len(graph.assassins[n]) == game.n_targs for n in graph.nodes)
+    assert girth(graph) >= game.min_girth
+
+
+@pytest.mark.parametrize("n_victims", [1, 3])
+def test_kills_are_repaired_locally(n_victims):
+    for seed in range(5):
+        with au.db.Session() as session:
+            game = started_game(session, f"Kills {n_victims} {seed}", 40, seed)
+            rng = random.Random(seed)
+            before = game_edges(session, game)
+            victims = rng.sample(session.scalars(select(au.Assassin).filter_by(game_id=game.id)).all(), n_victims)
+            victim_ids = {v.id for v in victims}
+            for victim in victims:
+                game.mark_dead(victim)
+            assert game.targets_dirty
+
+            report = game.reassign_targets(rng)
+            after = game_edges(session, game)
+            assert not game.targets_dirty
+            assert report.unfilled == 0
+
+            # the victims' edges are removed, and the only edges added are from their assassins to their targets
+            removed = before - after
+            added = after - before
+            assert removed == {(a, t) for a, t in before if a in victim_ids or t in victim_ids}
+            former_assassins = {a for a, t in removed if t in victim_ids} - victim_ids
+            former_targets = {t for a, t in removed if a in victim_ids} - victim_ids
+            assert added == set(report.new_edges)
+            assert all(a in former_assassins and t in former_targets for a, t in added)
+            check_survivors(session, game)
+
+
+def test_reassign_does_nothing_unless_someone_died():
+    with au.db.Session() as session:
+        game = started_game(session, "No deaths", 20)
+        before = game_edges(session, game)
+        assert game.reassign_targets().new_edges == []
+        assert game_edges(session, game) == before
+
+
+def test_reassign_falls_back_to_reassigning_everyone(monkeypatch):
+    with au.db.Session() as session:
+        game = au.create_game_w_session(session, "Triangles")
+        game.n_targs = 1
+        game.min_girth = 3
+        generate_game(game, sizes=GeneratorSizes(players=6, police=0, events=0, deaths=0, reports=0), start=False)
+        session.commit()
+        # two triangles: when 1 dies, 0 can only be given 2, which would make 0 and 2 target each other
+        ids = session.scalars(select(au.Assassin.id).filter_by(game_id=game.id).order_by(au.Assassin.id)).all()
+        session.execute(insert(TargRel), [{"assassin_id": ids[a], "target_id": ids[t]}
+                                          for a, t in [(0, 1), (1, 2), (2, 0), (3, 4), (4, 5), (5, 3)]])
+        calls = []
+        reassign_all_targets = au.Game.reassign_all_targets
+        monkeypatch.setattr(au.Game, "reassign_all_targets",
+                            lambda self, rng=None: calls.append(self) or reassign_all_targets(self, rng))
+
+        report = game.repair_targets_after(session.get(au.Assassin, ids[1]))
+        assert calls == [game]
+        assert report.unfilled == 0
+        assert all(ids[1] not in edge for edge in game_edges(session, game))
+        check_survivors(session, game)
@@ -0,0 +1,91 @@
+"""
+test_load_csv.py
+
+Tests loading registrations from a CSV file a chunk at a time (see `au_cli.load_csv.stream_csv`).
+"""
+
+import builtins
+import csv
+import os
+import sys
+
+import pytest
+
+import au_core as au
+from test_bulk_import import row
+
+# the CLI modules import each other as top-level modules
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "au_cli"))
+import load_csv
+
+N_ROWS = 25
+CHUNK_SIZE = 10
+# the indices of the bad rows, in three different chunks, and the reasons they are rejected
+BAD_ROWS = {3: "An email address must have an @-sign.",
+            12: "player1@cam.ac.uk is already registered",  # a duplicate of a row in the first chunk
+            21: "'Hogwarts' is not a valid College"}
+
+
+def write_csv(path) -> list:
+    rows = [row(i) for i in range(N_ROWS)]
+    rows[3]["email"] = "not an email"
+    rows[12]["email"] = "player1@cam.ac.uk"
+    rows[21]["college"] = "Hogwarts"
+    with open(path, "w", newline="") as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=load_csv.required_headings)
+        writer.writeheader()
+        writer.writerows(rows)
+    return rows
+
+
+def n_players(game_name: str) -> int:
+    with au.db.Session() as session:
+        game = session.scalar(au.Game.select().filter_by(name=game_name))
+        return len(session.scalars(game.players.select()).all())
+
+
+def test_stream_csv_saves(tmp_path, capsys):
+    path = tmp_path / "signups.csv"
+    rows = write_csv(path)
+    with au.db.Session() as session:
+        game = au.create_game_w_session(session, "Stream")
+        session.commit()
+        load_csv.stream_csv(game, str(path), save=True, chunk_size=CHUNK_SIZE)
+
+    assert n_players("Stream") == N_ROWS - len(BAD_ROWS)
+    out = capsys.readouterr().out
+    assert "Processed 10 rows: 9 accepted, 1 rejected." in out
+    assert "Processed 25 rows: 22 accepted, 3 rejected." in out
+
+    with open(load_csv.rejected_path(str(path)), newline="") as rejectedfile:
+        rejected = list(csv.reader(rejectedfile))
+    assert rejected[0] == ["line", "reason"] + load_csv.required_headings
+    # line numbers count the headings as line 1
+    assert rejected[1:] == [[str(i + 2), reason] + [rows[i][h] for h in load_csv.required_headings]
+                            for i, reason in BAD_ROWS.items()]
+
+
+@pytest.mark.parametrize("answer, saved", [("Y", True), ("n", False)])
+def test_stream_csv_asks_before_saving(tmp_path, monkeypatch, answer, saved):
+    path = tmp_path / "signups.csv"
+    write_csv(path)
+    monkeypatch.setattr(builtins, "input", lambda prompt="": answer)
+    with au.db.Session() as session:
+        game = au.create_game_w_session(session, f"Confirm {answer}")
+        session.commit()
+        load_csv.stream_csv(game, str(path), chunk_size=CHUNK_SIZE)
+    assert n_players(f"Confirm {answer}") == (N_ROWS - len(BAD_ROWS) if saved else 0)
+
+
+def test_stream_csv_removes_empty_rejected_file(tmp_path):
+    path = tmp_path / "signups.csv"
+    with open(path, "w", newline="") as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=load_csv.required_headings)
+        writer.writeheader()
+        writer.writerows(row(i) for i in range(5))
+    with au.db.Session() as session:
+        game = au.create_game_w_session(session, "Clean")
+        session.commit()
+        load_csv.stream_csv(game, str(path), save=True, chunk_size=CHUNK_SIZE)
+    assert n_players("Clean") == 5
+    assert not load_csv.rejected_path(str(path)).exists()
@@ -0,0 +1,95 @@
+"""
+test_mail.py
+
+Tests the SMTP connection pool against a fake SMTP server.
+"""
+
+import smtplib
+import threading
+import time
+
+import pytest
+
+from au_core import mail
+from au_core.mail import SMTPPool, OutgoingMessage
+
+
+class FakeSMTP:
+    """
+    Stands in for smtplib.SMTP, recording what is sent instead of connecting anywhere.
+    """
+    sent = []
+    # how long each message takes to send
+    delay = 0.0
+    # recipients the server rejects
+    refused = set()
+    # a recipient which, when sent to, raises `crash_on[1]` as if the sender had been killed
+    crash_on = None
+    _lock = threading.Lock()
+
+    def __init__(self, host=None, port=0, timeout=None):
+        pass
+
+    def starttls(self):
+        pass
+
+    def login(self, username, password):
+        pass
+
+    def sendmail(self, from_addr, to_addrs, msg):
+        time.sleep(self.delay)
+        if self.crash_on is not None and self.crash_on[0] in to_addrs:
+            raise self.crash_on[1]
+        refused = {to: (550, b"No such user") for to in to_addrs if to in self.refused}
+        if refused:
+            raise smtplib.SMTPRecipientsRefused(refused)
+        with self._lock:
+            self.sent.append((from_addr, to_addrs, msg))
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def fake_smtp(monkeypatch):
+    FakeSMTP.sent = []
+    FakeSMTP.delay = 0.0
+    FakeSMTP.refused = set()
+    FakeSMTP.crash_on = None
+    monkeypatch.setattr(smtplib, "SMTP", FakeSMTP)
+
+
+def test_waiter_wakes_when_a_retired_connection_frees_its_slot():
+    # with one connection which is retired after every message, the second sender waits for a slot, not a connection
+    FakeSMTP.delay = 0.2
+    pool = SMTPPool("localhost", size=1, max_messages_per_connection=1, from_addr="umpire@cam.ac.uk")
+    senders = [threading.Thread(target=pool.send_message, args=(OutgoingMessage(to=f"{i}@cam.ac.uk", body="Hi"),),
+                                daemon=True)
+               for i in range(2)]
+    for t in senders:
+        t.start()
+    for t in senders:
+        t.join(timeout=5)
+    assert not any(t.is_alive() for t in senders)
+    assert len(FakeSMTP.sent) == 2
+    assert pool.connections_made == 2
+
+
+def test_connections_are_reused():
+    pool = SMTPPool("localhost", size=2, from_addr="umpire@cam.ac.uk")
+    for i in range(10):
+        pool.send_message(OutgoingMessage(to=f"{i}@cam.ac.uk", body="Hi"))
+    assert len(FakeSMTP.sent) == 10
+    assert pool.connections_made == 1
+
+
+def test_sends_from_the_configured_address(monkeypatch):
+    monkeypatch.setitem(mail.config, "email", {"from": "umpire@cam.ac.uk"})
+    pool = SMTPPool("localhost")
+    pool.send_message(OutgoingMessage(to="a@cam.ac.uk", body="Hi"))
+    (from_addr, to_addrs, msg), = FakeSMTP.sent
+    assert from_addr == "umpire@cam.ac.uk"
+    assert "From: umpire@cam.ac.uk" in msg
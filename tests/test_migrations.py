@@ -0,0 +1,105 @@
+"""
+test_migrations.py
+
+Tests that a database with the baseline schema (version 1) is migrated all the way to the current version.
+"""
+
+from sqlalchemy import create_engine, inspect, text
+
+import au_core  # registers every model on Base.metadata
+from au_core import migrations
+from au_core.Base import Base
+
+# the schema as created by `create_all` before schema versioning, i.e. version 1
+BASELINE_SCHEMA = [
+    """CREATE TABLE games (
+        id INTEGER NOT NULL, name VARCHAR NOT NULL, live BOOLEAN NOT NULL, started DATETIME,
+        n_targs INTEGER NOT NULL, initial_competence DATETIME NOT NULL, locale VARCHAR NOT NULL,
+        PRIMARY KEY (id), UNIQUE (name))""",
+    """CREATE TABLE registrations (
+        id INTEGER NOT NULL, realname VARCHAR NOT NULL, college VARCHAR(10) NOT NULL, address VARCHAR NOT NULL,
+        water VARCHAR(4) NOT NULL, notes VARCHAR NOT NULL, email VARCHAR NOT NULL, initial_pseudonym VARCHAR NOT NULL,
+        type VARCHAR(6) NOT NULL, game_id INTEGER,
+        PRIMARY KEY (id), UNIQUE (game_id, initial_pseudonym),
+        FOREIGN KEY(game_id) REFERENCES games (id) ON DELETE CASCADE)""",
+    """CREATE TABLE events (
+        id INTEGER NOT NULL, headline VARCHAR NOT NULL, datetimestamp DATETIME NOT NULL, game_id INTEGER,
+        PRIMARY KEY (id), FOREIGN KEY(game_id) REFERENCES games (id) ON DELETE CASCADE)""",
+    """CREATE TABLE players (
+        id INTEGER NOT NULL, type VARCHAR NOT NULL, reg_id INTEGER NOT NULL, game_id INTEGER NOT NULL,
+        PRIMARY KEY (id), FOREIGN KEY(reg_id) REFERENCES registrations (id),
+        FOREIGN KEY(game_id) REFERENCES games (id) ON DELETE CASCADE)""",
+    """CREATE TABLE deaths (
+        id INTEGER NOT NULL, event_id INTEGER NOT NULL, killer_id INTEGER NOT NULL, victim_id INTEGER NOT NULL,
+        expires DATETIME, licit BOOLEAN NOT NULL,
+        PRIMARY KEY (id), FOREIGN KEY(event_id) REFERENCES events (id) ON DELETE CASCADE,
+        FOREIGN KEY(killer_id) REFERENCES players (id), FOREIGN KEY(victim_id) REFERENCES players (id))""",
+    """CREATE TABLE assassins (
+        id INTEGER NOT NULL, alive BOOLEAN NOT NULL, competence_deadline DATETIME,
+        PRIMARY KEY (id), FOREIGN KEY(id) REFERENCES players (id))""",
+    """CREATE TABLE police (
+        id INTEGER NOT NULL, rank VARCHAR NOT NULL, PRIMARY KEY (id), FOREIGN KEY(id) REFERENCES players (id))""",
+    """CREATE TABLE pseudonyms (
+        id INTEGER NOT NULL, game_id INTEGER NOT NULL, text VARCHAR NOT NULL, colour VARCHAR(7) NOT NULL,
+        owner_id INTEGER NOT NULL,
+        PRIMARY KEY (id), UNIQUE (game_id, text),
+        FOREIGN KEY(game_id, owner_id) REFERENCES players (game_id, id) ON DELETE CASCADE,
+        FOREIGN KEY(owner_id) REFERENCES players (id) ON DELETE CASCADE)""",
+    """CREATE TABLE targetting_table (
+        target_id INTEGER NOT NULL, assassin_id INTEGER NOT NULL, PRIMARY KEY (target_id, assassin_id),
+        FOREIGN KEY(target_id) REFERENCES assassins (id) ON DELETE CASCADE,
+        FOREIGN KEY(assassin_id) REFERENCES assassins (id) ON DELETE CASCADE)""",
+    """CREATE TABLE reports (
+        id INTEGER NOT NULL, body VARCHAR NOT NULL, event_id INTEGER, author_id INTEGER,
+        datetimestamp DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL,
+        PRIMARY KEY (id), FOREIGN KEY(event_id) REFERENCES events (id) ON DELETE CASCADE,
+        FOREIGN KEY(author_id) REFERENCES pseudonyms (id))""",
+]
+
+BASELINE_DATA = [
+    "INSERT INTO games VALUES (1, 'Lent 2020', 1, '2020-01-20 12:00:00', 2, '1970-01-08 00:00:00', 'en_GB')",
+    "INSERT INTO registrations VALUES (1, 'A', 'TRIN', '1 Trinity Street', 'FULL', '', 'a@cam.ac.uk', 'Alpha', 'FULL', 1)",
+    "INSERT INTO registrations VALUES (2, 'B', 'KINGS', '1 King''s Parade', 'FULL', '', 'b@cam.ac.uk', 'Bravo', 'FULL', 1)",
+    "INSERT INTO players VALUES (1, 'assassin', 1, 1)",
+    "INSERT INTO players VALUES (2, 'assassin', 2, 1)",
+    "INSERT INTO assassins VALUES (1, 1, NULL)",
+    "INSERT INTO assassins VALUES (2, 0, NULL)",
+    "INSERT INTO pseudonyms VALUES (1, 1, 'Alpha', 'DEFAULT', 1)",
+    "INSERT INTO pseudonyms VALUES (2, 1, 'Bravo', 'DEFAULT', 2)",
+    "INSERT INTO events VALUES (1, '<@1> killed <#2>', '2020-01-21 12:00:00', 1)",
+    "INSERT INTO reports VALUES (1, 'I saw <@1>', 1, 2, '2020-01-21 13:00:00')",
+]
+
+
+def baseline_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'baseline.db'}")
+    with engine.begin() as conn:
+        for statement in BASELINE_SCHEMA + BASELINE_DATA:
+            conn.execute(text(statement))
+    return engine
+
+
+def test_migrate_from_baseline(tmp_path):
+    engine = baseline_engine(tmp_path)
+
+    applied = migrations.migrate(engine)
+    assert [m.version for m in applied] == list(range(migrations.BASELINE_VERSION + 1, migrations.CURRENT_VERSION + 1))
+    with engine.connect() as conn:
+        assert migrations.get_version(conn) == migrations.CURRENT_VERSION
+
+        # every table, column and index on the models now exists
+        inspector = inspect(conn)
+        for table in Base.metadata.sorted_tables:
+            assert inspector.has_table(table.name), table.name
+            assert {c.name for c in table.columns} <= {c["name"] for c in inspector.get_columns(table.name)}, table.name
+            assert {i.name for i in table.indexes} <= {i["name"] for i in inspector.get_indexes(table.name)}, table.name
+
+        # the existing data is kept, and the new columns and tables filled in
+        # existing games keep the targetting rules they had, which only forbade self-targetting and duplicates
+        assert conn.execute(text("SELECT min_girth, targets_dirty FROM games")).one() == (migrations.LEGACY_MIN_GIRTH, False)
+        assert set(conn.execute(text("SELECT report_id, kind, pseudonym_id, player_id FROM event_references"))) == {
+            (None, "PSEUDONYM", 1, 1), (None, "PLAYER", 2, 2), (1, "PSEUDONYM", 1, 1), (1, "AUTHOR", 2, 2)}
+
+    assert migrations.check_schema(engine)
+    # migrating an up-to-date database does nothing
+    assert migrations.migrate(engine) == []
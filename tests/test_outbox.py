@@ -0,0 +1,150 @@
+"""
+test_outbox.py
+
+Tests of queueing emails in the outbox and dispatching them, against the fake SMTP server from test_mail.
+"""
+
+from datetime import datetime, timezone, timedelta
+
+import pytest
+from sqlalchemy import select, func
+
+import au_core as au
+from au_core.Outbox import Outbox
+from au_core.enums import OutboxStatus
+from au_core.mail import SMTPPool, OutgoingMessage
+from test_game import started_game
+# importing the autouse fixture applies it to these tests too
+from test_mail import FakeSMTP, fake_smtp
+
+
+class Crash(BaseException):
+    """
+    Stands in for the dispatcher being killed partway through a batch.
+    """
+
+
+def messages(n: int, first: int = 0) -> list:
+    return [OutgoingMessage(to=f"{i}@cam.ac.uk", body=f"Hi {i}", subject="Update") for i in range(first, first + n)]
+
+
+def pool() -> SMTPPool:
+    return SMTPPool("localhost", size=2, from_addr="umpire@cam.ac.uk")
+
+
+def recipients() -> list:
+    return [to for from_addr, (to,), msg in FakeSMTP.sent]
+
+
+def count(session, **criteria) -> int:
+    return session.scalar(select(func.count()).select_from(Outbox).filter_by(**criteria))
+
+
+def as_utc(t: datetime) -> datetime:
+    # SQLite does not keep the timezone
+    return t if t.tzinfo is not None else t.replace(tzinfo=timezone.utc)
+
+
+def test_enqueue_is_idempotent():
+    with au.db.Session() as session:
+        game = au.create_game_w_session(session, "Idempotent")
+        session.commit()
+        # repeated messages within one call are only enqueued once
+        assert len(Outbox.enqueue(session, game.id, messages(5) + messages(2), "start")) == 5
+        session.commit()
+        assert [e.recipient for e in Outbox.enqueue(session, game.id, messages(6), "start")] == ["5@cam.ac.uk"]
+        session.commit()
+        assert count(session, game_id=game.id) == 6
+        # the same messages for a different cause are different emails
+        assert len(Outbox.enqueue(session, game.id, messages(6), "event:1")) == 6
+        session.commit()
+        assert count(session, game_id=game.id) == 12
+
+
+def test_queued_updates_are_idempotent():
+    with au.db.Session() as session:
+        game = started_game(session, "Updates", 10)
+        assert len(game.queue_updates("Hello", cause="start")) == 10
+        session.commit()
+        assert game.queue_updates("Hello", cause="start") == []
+        session.commit()
+        game.dispatch_updates(transport=pool())
+        assert game.queue_updates("Hello", cause="start") == []
+        assert len(FakeSMTP.sent) == 10
+
+
+def test_failed_sends_back_off_then_fail():
+    FakeSMTP.refused = {"3@cam.ac.uk"}
+    retry_delay = timedelta(minutes=1)
+    with au.db.Session() as session:
+        game = au.create_game_w_session(session, "Backoff")
+        session.commit()
+        Outbox.enqueue(session, game.id, messages(5), "start")
+        session.commit()
+        entry = session.scalar(select(Outbox).filter_by(game_id=game.id, recipient="3@cam.ac.uk"))
+
+        for attempt in range(1, 3):
+            before = datetime.now(timezone.utc)
+            report = game.dispatch_updates(transport=pool(), max_attempts=3, retry_delay=retry_delay)
+            after = datetime.now(timezone.utc)
+            assert (report.sent, report.retried, report.failed, report.backlog) == (4 if attempt == 1 else 0, 1, 0, 1)
+            assert entry.status == OutboxStatus.PENDING and entry.attempts == attempt
+            assert "SMTPRecipientsRefused" in entry.last_error
+            # the delay doubles with every attempt
+            delay = retry_delay * 2 ** (attempt - 1)
+            assert before + delay <= as_utc(entry.next_attempt) <= after + delay
+
+            # nothing is due until the delay has passed
+            report = game.dispatch_updates(transport=pool(), max_attempts=3, retry_delay=retry_delay)
+            assert (report.sent, report.retried, report.failed, report.backlog) == (0, 0, 0, 1)
+            entry.next_attempt = datetime.now(timezone.utc) - timedelta(seconds=1)
+            session.commit()
+
+        report = game.dispatch_updates(transport=pool(), max_attempts=3, retry_delay=retry_delay)
+        assert (report.sent, report.retried, report.failed, report.backlog) == (0, 0, 1, 0)
+        assert entry.status == OutboxStatus.FAILED and entry.attempts == 3
+        assert sorted(recipients()) == [f"{i}@cam.ac.uk" for i in (0, 1, 2, 4)]
+
+
+def test_crash_only_resends_the_unfinished_batch():
+    batch_size = 4
+    FakeSMTP.crash_on = ("6@cam.ac.uk", Crash())
+    with au.db.Session() as session:
+        game = au.create_game_w_session(session, "Crash")
+        session.commit()
+        Outbox.enqueue(session, game.id, messages(10), "start")
+        session.commit()
+        game_id = game.id
+        with pytest.raises(Crash):
+            game.dispatch_updates(transport=pool(), batch_size=batch_size)
+        session.rollback()
+        assert "6@cam.ac.uk" not in recipients()
+
+    FakeSMTP.crash_on = None
+    with au.db.Session() as session:
+        # the first batch was committed, so only the second and third batches are sent
+        assert count(session, game_id=game_id, status=OutboxStatus.SENT) == batch_size
+        report = session.get(au.Game, game_id).dispatch_updates(transport=pool(), batch_size=batch_size)
+        assert (report.sent, report.backlog) == (10 - batch_size, 0)
+    # the messages of the first batch were sent once, and the rest at least once
+    sent = recipients()
+    assert all(sent.count(f"{i}@cam.ac.uk") == 1 for i in range(batch_size))
+    assert all(sent.count(f"{i}@cam.ac.uk") >= 1 for i in range(batch_size, 10))
+
+
+def test_backlog_counts_what_is_left():
+    with au.db.Session() as session:
+        game = au.create_game_w_session(session, "Backlog")
+        other = au.create_game_w_session(session, "Other backlog")
+        session.commit()
+        Outbox.enqueue(session, game.id, messages(12), "start")
+        Outbox.enqueue(session, other.id, messages(3, first=100), "start")
+        session.commit()
+
+        report = game.dispatch_updates(transport=pool(), batch_size=4, limit=5)
+        assert (report.sent, report.backlog) == (5, 7)
+        report = game.dispatch_updates(transport=pool(), batch_size=4)
+        assert (report.sent, report.backlog) == (7, 0)
+        # the other game's messages are neither sent nor counted
+        assert count(session, game_id=other.id, status=OutboxStatus.PENDING) == 3
+        assert sorted(recipients()) == sorted(m.to for m in messages(12))
@@ -0,0 +1,56 @@
+"""
+test_profiling.py
+
+Tests of counting and fingerprinting the statements run against the database (see `au_core.profiling`).
+"""
+
+from sqlalchemy import select
+
+import au_core as au
+from au_core.profiling import QueryProfiler, fingerprint
+
+
+def test_fingerprint_ignores_parameters():
+    assert fingerprint("SELECT *\n  FROM games WHERE id = 12") == fingerprint("SELECT * FROM games WHERE id = 3")
+    assert fingerprint("SELECT * FROM games WHERE name = 'it''s'") == "SELECT * FROM games WHERE name = ?"
+    assert fingerprint("SELECT * FROM games WHERE id IN (?, ?, ?)") == \
+        fingerprint("SELECT * FROM games WHERE id IN (?)") == "SELECT * FROM games WHERE id IN (?...)"
+
+
+def test_repeated_selects_share_a_fingerprint():
+    n = 7
+    with au.db.Session() as session:
+        game = au.create_game_w_session(session, "Profiled")
+        session.commit()
+        game_id = game.id
+        with QueryProfiler("loop") as profile:
+            for _ in range(n):
+                session.execute(select(au.Game.name).where(au.Game.id == game_id)).one()
+            session.execute(select(au.Game.name).where(au.Game.id.in_([game_id, game_id + 1, game_id + 2]))).all()
+            session.execute(select(au.Game.name).where(au.Game.id.in_([game_id]))).all()
+
+    assert profile.statements == n + 2
+    by_id, in_list = profile.repeated()
+    assert by_id.count == n and "WHERE games.id = ?" in by_id.fingerprint
+    # IN lists of any length collapse to the same fingerprint
+    assert in_list.count == 2 and "IN (?...)" in in_list.fingerprint
+    assert f"{n}x" in profile.report()
+
+
+def test_nested_profilers_each_see_every_statement():
+    with au.db.Session() as session:
+        with QueryProfiler("outer") as outer:
+            session.execute(select(au.Game.id)).all()
+            inner_profiler = QueryProfiler("inner")
+            with inner_profiler as inner:
+                session.execute(select(au.Game.name)).all()
+                session.execute(select(au.Game.name)).all()
+            session.execute(select(au.Game.id)).all()
+        # a stopped profiler records nothing more
+        session.execute(select(au.Game.id)).all()
+        inner_profiler.stop()
+
+    assert (outer.statements, inner.statements) == (4, 2)
+    assert [s.count for s in outer.repeated()] == [2, 2]
+    assert [s.count for s in inner.repeated()] == [2]
+    assert inner.elapsed <= outer.elapsed
@@ -0,0 +1,85 @@
+"""
+test_references.py
+
+Tests of parsing the references in headlines and report bodies (see `au_core.references`).
+"""
+
+from datetime import datetime, timezone, timedelta
+
+import pytest
+
+import au_core as au
+from au_core.Death import Death
+from au_core.generator import GeneratorSizes, generate_game
+from au_core.references import Reference, tokenise, referenced_ids, render, clear_cache
+
+START = datetime(2020, 1, 20, 12, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize("text, tokens", [
+    ("", ()),
+    ("Nothing happened", ("Nothing happened",)),
+    ("<@1> killed <#23>", (Reference("@", 1), " killed ", Reference("#", 23))),
+    ("<@1><#2>", (Reference("@", 1), Reference("#", 2))),
+    ("Before <@1> after", ("Before ", Reference("@", 1), " after")),
+    ("x<#007>y", ("x", Reference("#", 7), "y")),
+    # none of these are references
+    ("<@x> <@> <!3> <@4 @5> <# 6>", ("<@x> <@> <!3> <@4 @5> <# 6>",)),
+])
+def test_tokenise(text, tokens):
+    assert tokenise(text) == tokens
+
+
+def test_referenced_ids():
+    assert referenced_ids("") == frozenset()
+    assert referenced_ids("<@1> and <#1> saw <@2>, but not <@x>") == frozenset({1, 2})
+
+
+def test_render_replaces_each_reference():
+    text = "<@1> killed <#23>, as <@1> had planned"
+    assert render(text, lambda r: f"<{r.kind}{r.pseudonym_id}>") == text
+    assert render(text, lambda r: f"[{r.pseudonym_id}]") == "[1] killed [23], as [1] had planned"
+
+
+def test_cache_is_keyed_on_the_text():
+    clear_cache()
+    text = "<@1> killed <#2>"
+    # an equal but distinct string, as when two events have the same headline
+    same_text = "".join(["<@1> killed ", "<#2>"])
+    assert tokenise(text) is tokenise(same_text)
+    assert tokenise.cache_info().hits == 1
+    clear_cache()
+    assert tokenise.cache_info().currsize == 0
+
+
+def test_events_sharing_a_headline_render_for_their_own_time():
+    with au.db.Session() as session:
+        game = au.create_game_w_session(session, "Shared headline")
+        generate_game(game, sizes=GeneratorSizes(players=5, police=0, events=0, deaths=0, reports=0))
+        session.commit()
+        killer, victim = session.scalars(au.Assassin.select().filter_by(game_id=game.id).order_by(au.Assassin.id)
+                                         .limit(2))
+        headline = f"<@{killer.pseudonyms[0].id}> was seen with <@{victim.pseudonyms[0].id}>"
+        before = au.Event(headline=headline, datetimestamp=START, game=game)
+        kill = au.Event(headline="A kill", datetimestamp=START + timedelta(days=1), game=game)
+        after = au.Event(headline=headline, datetimestamp=START + timedelta(days=2), game=game)
+        session.add_all([before, kill, after])
+        session.flush()
+        session.add(Death(event_id=kill.id, killer_id=killer.id, victim_id=victim.id, licit=True))
+        session.commit()
+
+        # the tokens are shared, but resolving them depends on the event
+        before_parts, after_parts = before.headline_parts(), after.headline_parts()
+        assert [p.pseudonym for p in before_parts if not isinstance(p, str)] == \
+            [p.pseudonym for p in after_parts if not isinstance(p, str)]
+        assert before_parts[-1].css_class != "colourdead1"
+        assert after_parts[-1].css_class == "colourdead1"
+        assert "colourdead1" not in before.HTML_headline()
+        assert "colourdead1" in after.HTML_headline()
+        assert before.plaintext_headline() == after.plaintext_headline()
+
+        # editing one of them only changes that one
+        after.headline = f"<@{victim.pseudonyms[0].id}> was avenged"
+        session.commit()
+        assert after.plaintext_headline() == f"{victim.pseudonyms[0].text} was avenged"
+        assert before.plaintext_headline() == f"{killer.pseudonyms[0].text} was seen with {victim.pseudonyms[0].text}"
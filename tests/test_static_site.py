@@ -0,0 +1,62 @@
+"""
+test_static_site.py
+
+Tests building the static site of a game.
+"""
+
+from datetime import datetime, timezone
+
+import au_core as au
+from au_core.generator import GeneratorSizes, generate_game
+from au_core.static_site import HEADLINES_PAGE, news_page_name
+
+
+def test_unstarted_game_builds_only_headlines(tmp_path):
+    with au.db.Session() as session:
+        game = au.create_game_w_session(session, "Unstarted")
+        generate_game(game, sizes=GeneratorSizes(players=4, police=1, events=5, deaths=0, reports=2), start=False)
+        session.commit()
+        assert game.started is None
+
+        report = game.build_site(tmp_path)
+        assert report.written == [HEADLINES_PAGE]
+        assert (tmp_path / HEADLINES_PAGE).exists()
+
+
+def test_references_render_through_the_macros():
+    with au.db.Session() as session:
+        game = au.create_game_w_session(session, "Rendering")
+        generate_game(game, sizes=GeneratorSizes(players=2, police=0, events=0, deaths=0, reports=0), start=False)
+        session.commit()
+        alpha, bravo = session.scalars(au.Pseudonym.select().filter_by(game_id=game.id).order_by(au.Pseudonym.id))
+        event = au.Event(game=game, headline=f"{alpha.reference()} & <#{bravo.id}>",
+                         datetimestamp=datetime(2024, 1, 15, tzinfo=timezone.utc))
+        session.add(event)
+        session.flush()
+
+        kind, pseudonym, css_class = event.headline_parts()[2]
+        assert (kind, pseudonym, css_class) == ("#", bravo, bravo.colour.value)
+        assert event.HTML_headline() == (
+            f'<span class="{alpha.colour.value}">{alpha.text}</span> & '
+            f'<span class="colourdead1">{bravo.text}</span> '
+            f'(<span class="{bravo.colour.value}">{bravo.owner.reg.realname}</span>)')
+
+
+def test_events_before_the_start_are_in_week_1(tmp_path):
+    with au.db.Session() as session:
+        game = au.create_game_w_session(session, "Early events")
+        generate_game(game, sizes=GeneratorSizes(players=2, police=0, events=0, deaths=0, reports=0), start=False)
+        game.started = datetime(2024, 1, 15, 12, tzinfo=timezone.utc)
+        # the game starts at noon, so the second of these is on the first day but before the start
+        early = [au.Event(game=game, headline=f"Before the start {i}",
+                          datetimestamp=datetime(2024, 1, day, tzinfo=timezone.utc))
+                 for i, day in enumerate((1, 15))]
+        later = au.Event(game=game, headline="In week 2", datetimestamp=datetime(2024, 1, 22, tzinfo=timezone.utc))
+        session.add_all(early + [later])
+        session.commit()
+
+        assert [e.week() for e in early + [later]] == [1, 1, 2]
+        assert {e.id for e in game.events_in_week(1)} == {e.id for e in early}
+        report = game.build_site(tmp_path)
+        assert sorted(report.written) == sorted([HEADLINES_PAGE, news_page_name(1), news_page_name(2)])
+        assert all(e.headline in (tmp_path / news_page_name(1)).read_text() for e in early)
@@ -0,0 +1,129 @@
+"""
+test_targetting.py
+
+Tests the in-memory target-assignment engine.
+"""
+
+import random
+from collections import Counter
+
+import pytest
+
+from au_core.targetting import TargettingGraph
+
+
+def girth(graph: TargettingGraph) -> float:
+    """
+    :return: The length of the shortest targetting cycle in `graph`, or infinity if there is none.
+    """
+    shortest = float("inf")
+    for start in graph.nodes:
+        frontier, seen, length = {start}, {start}, 0
+        while frontier and length < shortest:
+            length += 1
+            step = set().union(*(graph.targets[n] for n in frontier))
+            if start in step:
+                shortest = length
+                break
+            frontier = step - seen
+            seen |= frontier
+    return shortest
+
+
+def check_constraints(graph: TargettingGraph, report, n_targs: int, existing=()):
+    # no self-targetting, and no edge added twice or added on top of an existing one
+    assert all(a != t for a, t in report.new_edges)
+    counts = Counter(report.new_edges)
+    assert max(counts.values(), default=1) == 1
+    assert not set(report.new_edges) & set(existing)
+    assert girth(graph) >= graph.min_girth
+    # nobody has more targets or assassins than they should
+    assert all(len(graph.targets[n]) <= n_targs and len(graph.assassins[n]) <= n_targs for n in graph.nodes)
+
+
+@pytest.mark.parametrize("min_girth", [2, 3, 4, 5])
+@pytest.mark.parametrize("n", [7, 10, 13, 20, 50])
+def test_assign_fills_everyone_whenever_possible(n, min_girth):
+    n_targs = 3
+    for seed in range(20):
+        graph = TargettingGraph(range(n), min_girth=min_girth)
+        report = graph.assign(n_targs, rng=random.Random(seed))
+        check_constraints(graph, report, n_targs)
+        if TargettingGraph.can_fill(n, n_targs, min_girth):
+            assert report.unfilled == 0
+            assert all(len(graph.targets[x]) == n_targs and len(graph.assassins[x]) == n_targs for x in graph.nodes)
+        else:
+            assert report.unfilled > 0
+
+
+@pytest.mark.parametrize("min_girth", [0, 2, 3, 4])
+@pytest.mark.parametrize("n", [1, 2, 3, 4])
+def test_assign_stops_and_reports_unfilled_targets_on_small_games(n, min_girth):
+    n_targs = 3
+    for seed in range(20):
+        graph = TargettingGraph(range(n), min_girth=min_girth)
+        report = graph.assign(n_targs, rng=random.Random(seed))
+        check_constraints(graph, report, n_targs)
+        # every target asked for is either assigned or counted as unfilled
+        assert len(report.new_edges) + report.unfilled == n * n_targs
+        assert (report.unfilled == 0) == TargettingGraph.can_fill(n, n_targs, min_girth)
+
+
+def test_can_fill():
+    assert TargettingGraph.can_fill(4, 3, 2)
+    assert not TargettingGraph.can_fill(3, 3, 2)
+    assert TargettingGraph.can_fill(7, 3, 3)
+    assert not TargettingGraph.can_fill(6, 3, 3)
+    assert TargettingGraph.can_fill(10, 3, 4)
+    assert not TargettingGraph.can_fill(9, 3, 4)
+
+
+def test_assign_tops_up_an_existing_graph():
+    # a circle of 30 assassins each targetting the next, on top of which everyone needs two more targets
+    n, n_targs = 30, 3
+    existing = [(i, (i + 1) % n) for i in range(n)]
+    for seed in range(20):
+        graph = TargettingGraph(range(n), existing, min_girth=4)
+        report = graph.assign(n_targs, rng=random.Random(seed))
+        check_constraints(graph, report, n_targs, existing)
+        assert report.unfilled == 0
+        assert len(report.new_edges) == 2 * n
+        assert all(t in graph.targets[a] for a, t in existing)
+
+
+def test_assign_only_touches_hunters_and_hunted():
+    n, n_targs = 30, 3
+    graph = TargettingGraph(range(n), min_girth=3)
+    graph.assign(n_targs, rng=random.Random(0))
+    # take away some edges, and refill only the assassins who lost them
+    removed = [(a, t) for a in range(5) for t in list(graph.targets[a])[:1]]
+    for a, t in removed:
+        graph.targets[a].discard(t)
+        graph.assassins[t].discard(a)
+    hunters = {a for a, t in removed}
+    hunted = {t for a, t in removed}
+    report = graph.assign(n_targs, hunters=hunters, hunted=hunted, rng=random.Random(1))
+    assert {a for a, t in report.new_edges} <= hunters
+    assert {t for a, t in report.new_edges} <= hunted
+    check_constraints(graph, report, n_targs)
+
+
+def test_dead_assassins_are_ignored():
+    # edges to assassins who are not nodes, i.e. dead, do not count towards anyone's targets
+    graph = TargettingGraph(range(10), [(0, 99), (99, 1)], min_girth=3)
+    assert graph.targets[0] == set()
+    assert graph.assassins[1] == set()
+    assert 99 not in graph.nodes
+
+
+def test_can_target():
+    graph = TargettingGraph(range(4), [(0, 1), (1, 2)], min_girth=4)
+    assert not graph.can_target(0, 0)   # self-targetting
+    assert not graph.can_target(0, 1)   # duplicate
+    assert not graph.can_target(1, 0)   # 2-cycle
+    assert not graph.can_target(2, 0)   # 3-cycle
+    assert graph.can_target(2, 3)
+    graph.min_girth = 3
+    assert graph.can_target(2, 0)
+    graph.min_girth = 2
+    assert graph.can_target(1, 0)
@@ -0,0 +1,29 @@
+"""
+test_timeline.py
+
+Tests that the DeathTimeline cached on a session stays in step with the deaths in the database.
+"""
+
+from datetime import timedelta
+
+import au_core as au
+from au_core.Death import Death
+from au_core.generator import GeneratorSizes, generate_game
+
+
+def test_rollback_forgets_flushed_deaths():
+    with au.db.Session() as session:
+        game = au.create_game_w_session(session, "Timeline")
+        sizes = GeneratorSizes(players=2, police=0, events=1, refs=0, deaths=0, reports=0, weeks=1)
+        generate_game(game, sizes=sizes, start=False)
+        session.commit()
+        killer, victim = session.scalars(au.Assassin.select().filter_by(game_id=game.id).order_by(au.Assassin.id))
+        event = session.scalar(au.Event.select().filter_by(game_id=game.id))
+        after = event.datetimestamp + timedelta(minutes=1)
+
+        session.add(Death(event_id=event.id, killer_id=killer.id, victim_id=victim.id, licit=True))
+        session.flush()
+        assert victim.dead_at(after)
+
+        session.rollback()
+        assert not victim.dead_at(after)